@@ -0,0 +1,195 @@
+import asyncio, collections, itertools, math, os, threading, time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from canUsbTransport import FrameDecoder
+
+RxFrame = Tuple[int, int, bytes]
+
+
+class IdStats:
+    """ Receive statistics of one CAN id: count, last data and the period between frames """
+    __slots__ = ('count', 'data', 'last_ns', 'period_n', 'period_mean_ns', 'period_m2_ns')
+
+    def __init__(self):
+        self.count = 0
+        self.data = b''
+        self.last_ns = 0
+        self.period_n = 0
+        self.period_mean_ns = 0.0
+        self.period_m2_ns = 0.0
+
+    def update(self, ts_ns: int, data: bytes, count: int = 1) -> None:
+        """ Account `count` frames read together at ts_ns, `data` being the last of them
+
+        The frames of one read share its timestamp, so the time since the previous read is split evenly
+        over them instead of recording a period of 0 for each repeat. The period mean and variance are
+        updated incrementally (Welford, merging the `count` equal periods as one batch).
+        """
+        if self.count:
+            period = (ts_ns - self.last_ns) / count
+            n = self.period_n + count
+            delta = period - self.period_mean_ns
+            self.period_mean_ns += delta * count / n
+            self.period_m2_ns += delta * delta * self.period_n * count / n
+            self.period_n = n
+        self.count += count
+        self.data = data
+        self.last_ns = ts_ns
+
+    def stats(self) -> Dict[str, Any]:
+        """ count, data, age_ms, period_ms (mean) and jitter_ms (standard deviation of the period) """
+        jitter = math.sqrt(self.period_m2_ns / self.period_n) if self.period_n else 0.0
+        return {'count': self.count, 'data': self.data, 'age_ms': (time.perf_counter_ns() - self.last_ns) / 1e6,
+                'period_ms': self.period_mean_ns / 1e6, 'jitter_ms': jitter / 1e6}
+
+
+class RxPipeline:
+    """ Receive path of the adapter on its own thread and asyncio event loop
+
+    The port is read in large chunks straight into the decoder buffer as soon as it becomes readable (a
+    reader callback on POSIX, a worker thread doing blocking reads elsewhere). Decoded frames go into a
+    bounded ring buffer, dropping the oldest when full, and update the per-id statistics once per chunk
+    under one lock, so readers (e.g. the GUI) can poll get_stats()/get_frames() at their own rate.
+
+    The adapter does not timestamp frames, so all frames of one chunk get the time the chunk was read;
+    periods and jitter are accurate to the read latency, which stays small as long as the loop keeps up.
+    An id seen several times in one chunk gets the time since its previous chunk split evenly over those
+    frames (see IdStats.update), so a backlog drained in one read does not show up as periods of 0.
+    """
+    __CHUNK_SIZE = 65536
+    __RING_SIZE = 100000
+    __THREAD_NAME = 'can-rx-pipeline'
+
+    def __init__(self, port: Any, ring_size: int = __RING_SIZE, chunk_size: int = __CHUNK_SIZE):
+        """ port: serial port (pyserial or a file opened unbuffered) with fileno() or read() """
+        self.__port = port
+        self.__decoder = FrameDecoder(chunk_size)
+        self.__ring: Deque[RxFrame] = collections.deque(maxlen=ring_size)
+        self.__ids: Dict[int, IdStats] = {}
+        self.__lock = threading.Lock()
+        self.__frames_total = 0
+        self.__bytes_total = 0
+        self.__chunks = 0
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__stop_event: Optional[asyncio.Event] = None
+        self.__thread = None
+
+    def __process(self, size: int) -> None:
+        """ Decode `size` bytes just read into the decoder buffer """
+        ts_ns = time.perf_counter_ns()
+        frames = self.__decoder.commit(size)
+        with self.__lock:
+            self.__bytes_total += size
+            self.__chunks += 1
+            if not frames:
+                return
+            self.__frames_total += len(frames)
+            ring = self.__ring
+            chunk: Dict[int, List[Any]] = {}
+            for can_id, data in frames:
+                ring.append((ts_ns, can_id, data))
+                seen = chunk.get(can_id)
+                if seen is None:
+                    chunk[can_id] = [1, data]
+                else:
+                    seen[0] += 1
+                    seen[1] = data
+            ids = self.__ids
+            for can_id, (count, data) in chunk.items():
+                stats = ids.get(can_id)
+                if stats is None:
+                    stats = ids[can_id] = IdStats()
+                stats.update(ts_ns, data, count)
+
+    def __on_readable(self, fd: int) -> None:
+        try:
+            size = os.readv(fd, [self.__decoder.buffer()])
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f'RX pipeline: read failed: {e}')
+            self.__stop_event.set()
+            return
+        if size:
+            self.__process(size)
+
+    def __read_blocking(self) -> int:
+        """ Worker thread read for ports without a pollable descriptor; waits for at least one byte """
+        if hasattr(self.__port, 'in_waiting'):
+            size = max(1, self.__port.in_waiting)
+            chunk = self.__port.read(min(size, len(self.__decoder.buffer())))
+        else:
+            chunk = self.__port.read(1)
+        if not chunk:
+            return 0
+        buffer = self.__decoder.buffer()
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    async def run(self) -> None:
+        """ Receive until stop() """
+        loop = asyncio.get_running_loop()
+        self.__loop, self.__stop_event = loop, asyncio.Event()
+        if os.name == 'posix' and hasattr(self.__port, 'fileno'):
+            fd = self.__port.fileno()
+            os.set_blocking(fd, False)
+            loop.add_reader(fd, self.__on_readable, fd)
+            await self.__stop_event.wait()
+            loop.remove_reader(fd)
+            return
+        while not self.__stop_event.is_set():
+            size = await loop.run_in_executor(None, self.__read_blocking)
+            if size:
+                self.__process(size)
+            else:
+                """ Port opened without a read timeout """
+                await asyncio.sleep(0.001)
+
+    """ ============================================= Class interface ============================================= """
+
+    def start(self) -> None:
+        """ Run the pipeline on its own thread """
+        if self.__thread is not None:
+            return
+        self.__thread = threading.Thread(target=asyncio.run, args=(self.run(),), name=self.__THREAD_NAME,
+                                         daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        if self.__thread is None:
+            return
+        while self.__loop is None and self.__thread.is_alive():
+            time.sleep(0.001)
+        if self.__loop is not None and not self.__loop.is_closed():
+            try:
+                self.__loop.call_soon_threadsafe(self.__stop_event.set)
+            except RuntimeError:
+                pass
+        self.__thread.join(timeout=2)
+        self.__thread = None
+        self.__loop = None
+
+    def reset(self) -> None:
+        """ Forget received frames and statistics """
+        with self.__lock:
+            self.__ring.clear()
+            self.__ids.clear()
+            self.__frames_total = self.__bytes_total = self.__chunks = 0
+
+    def get_stats(self) -> Dict[int, Dict[str, Any]]:
+        """ {can_id: IdStats.stats()} """
+        with self.__lock:
+            return {can_id: stats.stats() for can_id, stats in self.__ids.items()}
+
+    def get_frames(self, count: Optional[int] = None) -> List[RxFrame]:
+        """ The last `count` (default: all buffered) received frames as (perf_counter_ns, can_id, data) """
+        with self.__lock:
+            if count is None or count >= len(self.__ring):
+                return list(self.__ring)
+            return list(itertools.islice(reversed(self.__ring), count))[::-1]
+
+    def get_totals(self) -> Dict[str, int]:
+        """ Frames and bytes received, reads done, frames dropped from the ring and decoder errors """
+        with self.__lock:
+            return {'frames': self.__frames_total, 'bytes': self.__bytes_total, 'chunks': self.__chunks,
+                    'dropped': self.__frames_total - len(self.__ring), 'errors': self.__decoder.errors}
@@ -0,0 +1,367 @@
+import os, select, sys, threading, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import serial
+    SERIAL_AVAILABLE = True
+except Exception:
+    serial = None
+    SERIAL_AVAILABLE = False
+
+""" Waveshare USB-CAN-A serial protocol, see canusb.c
+
+Data frame:    0xAA, info, id (2 bytes standard / 4 bytes extended, LSB first), data (DLC bytes), 0x55
+               info = 0xC0 | 0x20 (extended) | 0x10 (remote) | DLC
+Settings frame: 0xAA 0x55, 17 bytes of settings, checksum (sum of the settings bytes & 0xFF); always 20 bytes
+"""
+TTY_BAUD_RATE_DEFAULT = 2000000
+FRAME_START, FRAME_END, CMD_FRAME_TYPE = 0xAA, 0x55, 0x55
+CMD_FRAME_LEN = 20
+INFO_DATA, INFO_EXTENDED, INFO_REMOTE, INFO_DLC_MASK = 0xC0, 0x20, 0x10, 0x0F
+STD_ID_MAX, EXT_ID_MAX = 0x7FF, 0x1FFFFFFF
+
+CAN_SPEEDS = {1000000: 0x01, 800000: 0x02, 500000: 0x03, 400000: 0x04, 250000: 0x05, 200000: 0x06,
+              125000: 0x07, 100000: 0x08, 50000: 0x09, 20000: 0x0A, 10000: 0x0B, 5000: 0x0C}
+MODE_NORMAL, MODE_LOOPBACK, MODE_SILENT, MODE_LOOPBACK_SILENT = 0x00, 0x01, 0x02, 0x03
+FRAME_TYPE_STANDARD, FRAME_TYPE_EXTENDED = 0x01, 0x02
+
+Frame = Tuple[int, bytes]
+
+
+def encode_frame(can_id: int, data: bytes, extended: Optional[bool] = None) -> bytes:
+    """ Serial data frame of (can_id, data); ids above 0x7FF are sent extended unless `extended` says otherwise """
+    dlc = len(data)
+    if dlc > 8:
+        raise ValueError(f'CAN data is {dlc} bytes, at most 8 fit in a frame')
+    if extended is None:
+        extended = can_id > STD_ID_MAX
+    if extended:
+        if not 0 <= can_id <= EXT_ID_MAX:
+            raise ValueError(f'Extended CAN id 0x{can_id:X} out of range')
+        return bytes((FRAME_START, INFO_DATA | INFO_EXTENDED | dlc, can_id & 0xFF, (can_id >> 8) & 0xFF,
+                      (can_id >> 16) & 0xFF, can_id >> 24)) + data + b'\x55'
+    if not 0 <= can_id <= STD_ID_MAX:
+        raise ValueError(f'Standard CAN id 0x{can_id:X} out of range')
+    return bytes((FRAME_START, INFO_DATA | dlc, can_id & 0xFF, can_id >> 8)) + data + b'\x55'
+
+
+def parse_can_id(msg_id: str) -> Tuple[int, bool]:
+    """ (can_id, extended) of an id string such as '0x510'; as in canusb.c, 8 hex digits make an extended
+    frame even when the value fits in 11 bits ('0x00000123'), and values above 0x7FF need one anyway """
+    digits = str(msg_id).strip()
+    if digits[:2].lower() == '0x':
+        digits = digits[2:]
+    can_id = int(digits, 16)
+    return can_id, len(digits) == 8 or can_id > STD_ID_MAX
+
+
+def encode_frames(frames: Iterable[Frame]) -> bytes:
+    """ Serial data frames of all (can_id, data) frames back to back, ready for one write() """
+    return b''.join([encode_frame(can_id, data) for can_id, data in frames])
+
+
+class CompiledFrame:
+    """ A data frame encoded once for the adapter; `wire` is written as is """
+    __slots__ = ('can_id', 'data', 'extended', 'wire', 'bus_bits')
+
+    def __init__(self, can_id: int, data: bytes, extended: Optional[bool] = None):
+        self.can_id = can_id
+        self.data = bytes(data)
+        self.extended = can_id > STD_ID_MAX if extended is None else extended
+        self.wire = encode_frame(can_id, self.data, self.extended)
+        self.bus_bits = frame_bits(can_id, len(self.data), self.extended)
+
+
+def checksum(data: bytes) -> int:
+    return sum(data) & 0xFF
+
+
+def settings_frame(speed: int = 500000, mode: int = MODE_NORMAL, frame_type: int = FRAME_TYPE_EXTENDED) -> bytes:
+    """ Settings command frame for a standard CAN speed in bit/s; filter and mask are left open """
+    if speed not in CAN_SPEEDS:
+        raise ValueError(f'Unsupported CAN speed {speed}, supported: {sorted(CAN_SPEEDS)}')
+    settings = bytes((0x12, CAN_SPEEDS[speed], frame_type, 0, 0, 0, 0, 0, 0, 0, 0, mode, 0x01, 0, 0, 0, 0))
+    return bytes((FRAME_START, CMD_FRAME_TYPE)) + settings + bytes((checksum(settings),))
+
+
+def frame_bits(can_id: int, dlc: int, extended: Optional[bool] = None) -> int:
+    """ Bits a data frame takes on the bus, including the 3 bit interframe space, without bit stuffing """
+    if extended is None:
+        extended = can_id > STD_ID_MAX
+    return (67 if extended else 47) + 8 * dlc
+
+
+class FrameDecoder:
+    """ Splits the serial byte stream of the adapter into data frames and settings frames
+
+    Bytes are read straight into a fixed buffer (buffer()/commit()) and decoded in place; only the data of
+    each frame is copied out, and the tail of an incomplete frame (< 20 bytes) is moved to the front for the
+    next read. Bytes before a frame start (0xAA) are skipped to resynchronise; settings frames with a bad
+    checksum and unknown frame types are counted in `errors`.
+    """
+    __BUF_SIZE = 65536
+
+    def __init__(self, size: int = __BUF_SIZE):
+        self.__buf = bytearray(max(size, CMD_FRAME_LEN))
+        self.__view = memoryview(self.__buf)
+        self.__len = 0
+        self.commands = []
+        self.errors = 0
+
+    def buffer(self) -> memoryview:
+        """ Free part of the buffer to read into, e.g. with readinto() or os.readv() """
+        return self.__view[self.__len:]
+
+    def commit(self, size: int) -> List[Frame]:
+        """ Data frames (can_id, data) completed by the `size` bytes just read into buffer() """
+        self.__len += size
+        buf, view = self.__buf, self.__view
+        frames = []
+        pos, end = 0, self.__len
+        while pos < end:
+            if buf[pos] != FRAME_START:
+                start = buf.find(FRAME_START, pos, end)
+                pos = end if start < 0 else start
+                continue
+            if end - pos < 2:
+                break
+            info = buf[pos + 1]
+            if info == CMD_FRAME_TYPE:
+                if end - pos < CMD_FRAME_LEN:
+                    break
+                cmd = view[pos:pos + CMD_FRAME_LEN].tobytes()
+                if checksum(cmd[2:19]) == cmd[19]:
+                    self.commands.append(cmd)
+                else:
+                    self.errors += 1
+                pos += CMD_FRAME_LEN
+            elif info & INFO_DATA == INFO_DATA:
+                id_len = 4 if info & INFO_EXTENDED else 2
+                frame_len = 3 + id_len + (info & INFO_DLC_MASK)
+                if end - pos < frame_len:
+                    break
+                if frame_len > 15 or buf[pos + frame_len - 1] != FRAME_END:
+                    self.errors += 1
+                    pos += 1
+                    continue
+                data_pos = pos + 2 + id_len
+                frames.append((int.from_bytes(view[pos + 2:data_pos], 'little'),
+                               view[data_pos:pos + frame_len - 1].tobytes()))
+                pos += frame_len
+            else:
+                self.errors += 1
+                pos += 1
+        self.__len = end - pos
+        if pos and self.__len:
+            buf[:self.__len] = view[pos:end].tobytes()
+        return frames
+
+    def feed(self, chunk: bytes) -> List[Frame]:
+        """ Data frames (can_id, data) completed by `chunk`; settings frames are appended to `commands` """
+        frames = []
+        chunk = memoryview(chunk)
+        while chunk:
+            free = self.buffer()
+            size = min(len(free), len(chunk))
+            free[:size] = chunk[:size]
+            frames += self.commit(size)
+            chunk = chunk[size:]
+        return frames
+
+
+class UsbCanA:
+    """ Waveshare USB-CAN-A adapter on a serial port
+
+    `ser` is anything with write()/read()/close(), normally a pyserial port from UsbCanA.open().
+    send_frames() encodes all frames due in one scheduler tick into a single buffer and writes it with one
+    write() call, so a tick costs one system call (and one USB transfer) instead of one per frame.
+    """
+
+    def __init__(self, ser: Any):
+        self.__ser = ser
+        self.__lock = threading.Lock()
+        self.__decoder = FrameDecoder()
+        self.__frames_sent = 0
+        self.__bytes_sent = 0
+        self.__writes = 0
+        self.__bus_bits = 0
+
+    @classmethod
+    def open(cls, port: str, baudrate: int = TTY_BAUD_RATE_DEFAULT) -> 'UsbCanA':
+        """ Open the adapter on `port` (e.g. /dev/ttyUSB0, COM3 or any pyserial URL such as loop://) """
+        if not SERIAL_AVAILABLE:
+            raise RuntimeError('pyserial is not installed; pip install pyserial')
+        """ 8 data bits, 2 stop bits, as set up by canusb.c """
+        return cls(serial.serial_for_url(port, baudrate=baudrate, stopbits=serial.STOPBITS_TWO, timeout=0,
+                                         write_timeout=1))
+
+    def __write(self, buf: bytes) -> None:
+        view = memoryview(buf)
+        while view:
+            written = self.__ser.write(view)
+            if written is None:
+                written = len(view)
+            view = view[written:]
+        self.__writes += 1
+        self.__bytes_sent += len(buf)
+
+    """ ============================================= Class interface ============================================= """
+
+    def configure(self, speed: int = 500000, mode: int = MODE_NORMAL, frame_type: int = FRAME_TYPE_EXTENDED) -> None:
+        """ Set the CAN speed (bit/s) and mode of the adapter """
+        with self.__lock:
+            self.__write(settings_frame(speed, mode, frame_type))
+
+    def send_frames(self, frames: List[Frame]) -> None:
+        """ Transmit a batch of (can_id, data) frames with one write() """
+        if not frames:
+            return
+        buf = encode_frames(frames)
+        with self.__lock:
+            self.__write(buf)
+            self.__frames_sent += len(frames)
+            self.__bus_bits += sum(frame_bits(can_id, len(data)) for can_id, data in frames)
+
+    def send_compiled(self, frames: List[CompiledFrame]) -> None:
+        """ Transmit a batch of pre-encoded frames with one write(); nothing is encoded here """
+        if not frames:
+            return
+        buf = b''.join([frame.wire for frame in frames])
+        with self.__lock:
+            self.__write(buf)
+            self.__frames_sent += len(frames)
+            self.__bus_bits += sum([frame.bus_bits for frame in frames])
+
+    def send(self, can_id: int, data: bytes) -> None:
+        self.send_frames([(can_id, data)])
+
+    def read_frames(self, size: int = 4096) -> List[Frame]:
+        """ Data frames received since the last call; does not block when the port was opened by open() """
+        return self.__decoder.feed(self.__ser.read(size) or b'')
+
+    def get_port(self) -> Any:
+        """ The underlying serial port, e.g. for an RxPipeline """
+        return self.__ser
+
+    def close(self) -> None:
+        self.__ser.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """ Frames, serial bytes and write() calls sent, and the bus bits they take (without stuffing) """
+        return {'frames': self.__frames_sent, 'bytes': self.__bytes_sent, 'writes': self.__writes,
+                'bus_bits': self.__bus_bits}
+
+
+class FakeUsbCanA:
+    """ Pseudo-terminal standing in for a USB-CAN-A adapter (POSIX only)
+
+    Open `port` like a real adapter. Every data frame written to it is decoded and kept in `frames`, settings
+    frames in `commands`; with echo set, data frames are sent back like an adapter in loopback mode.
+    """
+    __READ_SIZE = 65536
+
+    def __init__(self, echo: bool = False, keep_frames: bool = True):
+        import tty
+        self.__master, self.__slave = os.openpty()
+        tty.setraw(self.__slave)
+        self.port = os.ttyname(self.__slave)
+        self.echo = echo
+        self.keep_frames = keep_frames
+        self.frames = []
+        self.frame_count = 0
+        self.byte_count = 0
+        self.__decoder = FrameDecoder()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='fake-usb-can-a', daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        while self.__running:
+            ready, _, _ = select.select([self.__master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                chunk = os.read(self.__master, self.__READ_SIZE)
+            except OSError:
+                return
+            self.byte_count += len(chunk)
+            frames = self.__decoder.feed(chunk)
+            self.frame_count += len(frames)
+            if self.keep_frames:
+                self.frames.extend(frames)
+            if self.echo and frames:
+                os.write(self.__master, encode_frames(frames))
+
+    @property
+    def commands(self) -> List[bytes]:
+        return self.__decoder.commands
+
+    @property
+    def errors(self) -> int:
+        return self.__decoder.errors
+
+    def wait_bytes(self, byte_count: int, timeout: float = 5.0) -> bool:
+        """ Wait until `byte_count` bytes in total have arrived """
+        deadline = time.monotonic() + timeout
+        while self.byte_count < byte_count and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return self.byte_count >= byte_count
+
+    def close(self) -> None:
+        self.__running = False
+        self.__thread.join()
+        os.close(self.__master)
+        os.close(self.__slave)
+
+
+def bus_load_test(adapter: UsbCanA, can_speed: int, seconds: float, tick_ms: float = 1.0) -> Dict[str, float]:
+    """ Send 8 byte extended frames at full bus load for `seconds`, one batch per tick; returns the achieved load """
+    frame = (0x10FF0021, bytes(range(8)))
+    frames_per_s = can_speed / frame_bits(frame[0], len(frame[1]))
+    start = time.perf_counter()
+    sent, busy = 0, 0.0
+    while True:
+        now = time.perf_counter()
+        if now - start >= seconds:
+            break
+        due = int((now - start) * frames_per_s) - sent
+        if due > 0:
+            t0 = time.perf_counter()
+            adapter.send_frames([frame] * due)
+            busy += time.perf_counter() - t0
+            sent += due
+        time.sleep(tick_ms / 1000)
+    elapsed = time.perf_counter() - start
+    return {'frames': sent, 'frames_per_s': sent / elapsed, 'bus_load': sent / elapsed / frames_per_s,
+            'cpu_share': busy / elapsed}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Waveshare USB-CAN-A transport: full bus load send test')
+    parser.add_argument('port', nargs='?', help='serial port of the adapter; a fake pty adapter when omitted')
+    parser.add_argument('--speed', type=int, default=500000, help='CAN speed in bit/s (default: 500000)')
+    parser.add_argument('--baudrate', type=int, default=TTY_BAUD_RATE_DEFAULT, help='serial baud rate')
+    parser.add_argument('--seconds', type=float, default=3.0, help='test duration (default: 3)')
+    args = parser.parse_args()
+
+    fake = None
+    try:
+        if args.port:
+            adapter = UsbCanA.open(args.port, args.baudrate)
+        else:
+            fake = FakeUsbCanA(keep_frames=False)
+            adapter = UsbCanA.open(fake.port) if SERIAL_AVAILABLE else UsbCanA(open(fake.port, 'r+b', buffering=0))
+        adapter.configure(args.speed)
+        result = bus_load_test(adapter, args.speed, args.seconds)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    stats = adapter.get_stats()
+    print(f"{result['frames']} frames, {result['frames_per_s']:.0f} frames/s = {result['bus_load']:.1%} bus load "
+          f"at {args.speed} bit/s, {stats['writes']} writes, {result['cpu_share']:.1%} of the time in send_frames")
+    if fake is not None:
+        fake.wait_bytes(stats['bytes'])
+        print(f'Fake adapter received {fake.frame_count} frames, {len(fake.commands)} settings, {fake.errors} errors')
+        adapter.close()
+        fake.close()
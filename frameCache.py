@@ -0,0 +1,40 @@
+from typing import Any, Callable, Dict
+
+from canUsbTransport import CompiledFrame, parse_can_id
+
+
+def compile_msg(msg_id: str, payload: str) -> CompiledFrame:
+    """ Frame of a db message, e.g. ('0x510', '0x40 0x10'); an 8 hex digit id is sent extended """
+    can_id, extended = parse_can_id(msg_id)
+    return CompiledFrame(can_id, bytes(int(val, 16) for val in str(payload).split()), extended)
+
+
+class FrameCache:
+    """ Compiled frames of the db messages by message key
+
+    A message is parsed and encoded the first time its frame is needed; after that every send reuses the
+    same CompiledFrame until invalidate() is called for that message (it was modified or deleted).
+    """
+
+    def __init__(self, get_msg_h: Callable[[int], Dict[str, Any]]):
+        """ get_msg_h(key) returns the fields (id, payload, ...) of a db message """
+        self.__get_msg_h = get_msg_h
+        self.__frames: Dict[int, CompiledFrame] = {}
+
+    """ ============================================= Class interface ============================================= """
+
+    def get(self, key: int) -> CompiledFrame:
+        frame = self.__frames.get(key)
+        if frame is None:
+            msg = self.__get_msg_h(key)
+            frame = self.__frames[key] = compile_msg(msg['id'], msg['payload'])
+        return frame
+
+    def invalidate(self, key: int) -> None:
+        self.__frames.pop(key, None)
+
+    def clear(self) -> None:
+        self.__frames.clear()
+
+    def __len__(self) -> int:
+        return len(self.__frames)
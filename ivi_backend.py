@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Matplotlib backend selection for the IVI log plot scripts.
+
+The scripts import matplotlib.pyplot only once a figure is actually drawn, so
+runs that only print stats never pay for it. When figures are only written to
+files, the non-interactive Agg backend is selected before pyplot loads, which
+skips probing for and importing a GUI toolkit.
+"""
+
+import os
+import sys
+
+HEADLESS_BACKEND = 'Agg'
+
+
+def use_headless_backend(force: bool = False) -> None:
+    """Select Agg for the pyplot import to come.
+    A backend chosen through MPLBACKEND is respected unless `force` is set, and
+    nothing changes once pyplot is loaded (e.g. by an interactive session).
+    """
+    if not force and (os.environ.get('MPLBACKEND') or 'matplotlib.pyplot' in sys.modules):
+        return
+    import matplotlib
+    matplotlib.use(HEADLESS_BACKEND, force=True)
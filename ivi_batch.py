@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Batch mode for the IVI log plot scripts.
+
+Takes directories and/or glob patterns of logs, parses every log once for IMU,
+probe and UBX-NAV-PVAT records, and renders the figures of all three scripts
+headless (Agg) into an output directory:
+  <log>_accel.png, <log>_gyro.png   linear_ivi_sensor
+  <log>_acceleration.png            linear_ivi_acceleration
+  <log>_pitchrollyaw.png            linear_veh_pitchrollyaw
+Logs are handed to a process pool, largest first, so the total time is bound by
+the number of cores rather than the number of files. The min/max/mean stats the
+scripts print are collected into one summary CSV.
+"""
+
+import csv
+import glob
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ivi_backend import HEADLESS_BACKEND, use_headless_backend
+from ivi_decimate import DECIMATE_DEFAULT, DECIMATE_METHODS
+from ivi_log_cache import CACHE_DIR, scan_log_cached
+from ivi_log_engine import (PVAT_FIELDS, ImuSink, ProbeSink, PvatSink, parse_field_spec, scan_log,
+                            unique_field_specs)
+
+BATCH_PATTERN = '*.log*'
+SUMMARY_COLUMNS = ('log', 'stream', 'series', 'samples', 'min', 'max', 'mean')
+BATCH_DPI = 150
+
+
+def find_logs(paths: list, pattern: str = BATCH_PATTERN) -> list:
+    """Log files named by `paths`: files, directories (files matching `pattern`) or glob patterns."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(path, pattern))
+        elif os.path.isfile(path):
+            matches = [path]
+        else:
+            matches = glob.glob(path, recursive=True)
+        found.extend(sorted(m for m in matches if os.path.isfile(m)))
+    return list(dict.fromkeys(found))
+
+
+def output_stem(logfile: str) -> str:
+    """Log file name without its log and compression extensions."""
+    name = os.path.basename(logfile)
+    for ext in ('.gz', '.xz', '.zst', '.log', '.txt'):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return name
+
+
+def output_stems(logs: list) -> dict:
+    """Figure file stem per log; logs sharing a file name (e.g. run1/logcat.log,
+    run2/logcat.log) are told apart by their path below the common directory,
+    logs of one directory sharing a stem (a.log, a.log.gz) by their full file
+    name, and anything still clashing by a numeric suffix."""
+    def disambiguate(stems: dict, rename) -> dict:
+        counts = {}
+        for stem in stems.values():
+            counts[stem] = counts.get(stem, 0) + 1
+        return {logfile: rename(logfile, stem) if counts[stem] > 1 else stem
+                for logfile, stem in stems.items()}
+
+    common = os.path.commonpath([os.path.abspath(os.path.dirname(logfile)) for logfile in logs]) if logs else ''
+
+    def with_dir(logfile, stem):
+        relative = os.path.relpath(os.path.dirname(os.path.abspath(logfile)), common)
+        return stem if relative == os.curdir else relative.replace(os.sep, '_') + '_' + stem
+
+    stems = disambiguate({logfile: output_stem(logfile) for logfile in logs}, with_dir)
+    stems = disambiguate(stems, lambda logfile, stem: with_dir(logfile, os.path.basename(logfile)))
+    taken = set()
+    for logfile, stem in stems.items():
+        unique, n = stem, 1
+        while unique in taken:
+            n += 1
+            unique = f"{stem}_{n}"
+        taken.add(unique)
+        stems[logfile] = unique
+    return stems
+
+
+def _init_worker() -> None:
+    os.environ['MPLBACKEND'] = HEADLESS_BACKEND
+    use_headless_backend(force=True)
+
+
+def process_log(task) -> tuple:
+    """Parse one log and save its figures as <stem>_<figure>.png; returns (logfile, summary rows, saved paths, seconds)."""
+    logfile, stem, options = task
+    # Imported here so they pick up the Agg backend selected by _init_worker
+    import matplotlib.pyplot as plt
+    import linear_ivi_acceleration
+    import linear_ivi_sensor
+    import linear_veh_pitchrollyaw
+
+    started = time.perf_counter()
+    probe_indices = (linear_ivi_acceleration.FIELD_INDEX, linear_ivi_acceleration.ACCEL_FIELD_INDEX,
+                     linear_ivi_acceleration.SPEED_FIELD_INDEX, linear_ivi_acceleration.ALTITUDE_FIELD_INDEX)
+    imu, probe, pvat = ImuSink(), ProbeSink(list(probe_indices)), PvatSink(options['pvat_fields'])
+    if options['cache_dir']:
+        scan_log_cached(logfile, [imu, probe, pvat], cache_dir=options['cache_dir'])
+    else:
+        scan_log(logfile, [imu, probe, pvat])
+
+    log_name = os.path.basename(logfile)
+    method = options['decimate']
+    rows = []
+    figures = {}
+
+    accel, gyro = imu.result()
+    for name, data in (("Accelerometer (Sensor 1)", accel), ("Gyroscope (Sensor 4)", gyro)):
+        rows.extend(linear_ivi_sensor.stats_rows(name, data))
+    figures.update(linear_ivi_sensor.plot_figures(accel, gyro, f"IVI Sensor Data — {log_name}", method))
+
+    results = probe.result()
+    if any(len(vals) for _, vals in results.values()):
+        rows.extend(linear_ivi_acceleration.stats_rows(results, *probe_indices))
+        figures['acceleration'] = linear_ivi_acceleration.plot_figure(
+            results, *probe_indices, f"Linear Acceleration — {log_name}", method)
+
+    timestamps, *columns = pvat.result()
+    if len(timestamps):
+        names = [parse_field_spec(spec)[0] for spec in options['pvat_fields']]
+        rows.extend(linear_veh_pitchrollyaw.stats_rows(names, columns))
+        figures['pitchrollyaw'] = linear_veh_pitchrollyaw.plot_figure(
+            timestamps, columns, names, f"Vehicle Pitch/Roll/Yaw (UBX-NAV-PVAT) — {log_name}", method)
+
+    saved = []
+    for name, fig in figures.items():
+        path = f"{stem}_{name}.png"
+        fig.savefig(path, dpi=BATCH_DPI)
+        plt.close(fig)
+        saved.append(path)
+    return logfile, rows, saved, time.perf_counter() - started
+
+
+def run_batch(logs: list, output_dir: str, jobs: int = 0, options: dict = None):
+    """Process logs in a pool of `jobs` workers (0 = all cores).
+    Returns ({logfile: (rows, saved paths)}, {logfile: error message}).
+    """
+    options = {'cache_dir': None, 'decimate': DECIMATE_DEFAULT, 'pvat_fields': list(PVAT_FIELDS), **(options or {})}
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    # Largest first, so one big log started last does not leave the other cores idle
+    ordered = sorted(logs, key=os.path.getsize, reverse=True)
+    stems = output_stems(logs)
+    done, failed = {}, {}
+    with ProcessPoolExecutor(max_workers=min(jobs, len(logs)) or 1, initializer=_init_worker) as pool:
+        futures = {pool.submit(process_log, (logfile, os.path.join(output_dir, stems[logfile]), options)): logfile
+                   for logfile in ordered}
+        for future in as_completed(futures):
+            logfile = futures[future]
+            try:
+                _, rows, saved, seconds = future.result()
+            except Exception as e:
+                failed[logfile] = f"{type(e).__name__}: {e}"
+                print(f"  FAILED {logfile}: {failed[logfile]}", file=sys.stderr)
+                continue
+            done[logfile] = (rows, saved)
+            print(f"  {logfile}: {len(saved)} figures in {seconds:.1f} s")
+    return done, failed
+
+
+def write_summary(path: str, logs: list, done: dict) -> None:
+    """One CSV row per (log, stream, series) with samples, min, max and mean, in input order."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_COLUMNS)
+        for logfile in logs:
+            if logfile not in done:
+                continue
+            for stream, series, n, vmin, vmax, mean in done[logfile][0]:
+                writer.writerow((logfile, stream, series, n, f"{vmin:.6f}", f"{vmax:.6f}", f"{mean:.6f}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parse and plot a whole directory or glob of IVI logs concurrently, without a display."
+    )
+    parser.add_argument('paths', nargs='+', help="Log files, directories or glob patterns (e.g. 'campaign/**/*.log')")
+    parser.add_argument(
+        '--pattern', default=BATCH_PATTERN,
+        help=f"File name pattern of logs inside directories (default: {BATCH_PATTERN})"
+    )
+    parser.add_argument(
+        '--output-dir', default='plots',
+        help="Directory for the figures and the summary CSV (default: plots)"
+    )
+    parser.add_argument(
+        '--summary', default=None,
+        help="Summary CSV path (default: <output-dir>/summary.csv)"
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=0,
+        help="Logs processed in parallel (0 = all cores, default: 0)"
+    )
+    parser.add_argument(
+        '--fields', nargs='+', default=list(PVAT_FIELDS),
+        help=f"UBX-NAV-PVAT keys to plot, as name or name:int (default: {' '.join(PVAT_FIELDS)})"
+    )
+    parser.add_argument(
+        '--decimate', choices=DECIMATE_METHODS, default=DECIMATE_DEFAULT,
+        help=f"Reduce each series to ~2 points per pixel before plotting (default: {DECIMATE_DEFAULT})"
+    )
+    parser.add_argument(
+        '--cache-dir', default=CACHE_DIR,
+        help=f"Directory for cached parse results (default: {CACHE_DIR})"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="Always parse the logs from scratch and do not write the cache"
+    )
+    args = parser.parse_args()
+
+    try:
+        args.fields = unique_field_specs(args.fields)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    logs = find_logs(args.paths, args.pattern)
+    if not logs:
+        print("No log files found.", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Processing {len(logs)} logs into {args.output_dir} ...")
+    started = time.perf_counter()
+    options = {'cache_dir': None if args.no_cache else args.cache_dir, 'decimate': args.decimate,
+               'pvat_fields': args.fields}
+    done, failed = run_batch(logs, args.output_dir, jobs=args.jobs, options=options)
+
+    summary = args.summary or os.path.join(args.output_dir, 'summary.csv')
+    write_summary(summary, logs, done)
+    print(f"Processed {len(done)} of {len(logs)} logs in {time.perf_counter() - started:.1f} s")
+    print(f"Summary saved to {summary}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
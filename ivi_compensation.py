@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Offline IMU bias compensation, a vectorised port of IMUBiasRemover from
+IMUCompensationtests.cpp.
+
+On target, every (gyro, accel) pair updates an exponential moving average of
+the bias while the vehicle stands still (speed below 0.05 m/s), and the current
+bias is subtracted from the readings. The accelerometer is first rid of gravity
+using the vehicle attitude (roll/pitch/heading) turned into a quaternion; as in
+feedMeUBX_NAV_ATT, an attitude is only taken when its roll, pitch and heading
+accuracies are all below 2.2 degrees, otherwise the previous one holds.
+Here the same algorithm runs over whole columns: the streams are put on one
+clock by ivi_merge.common_clock (probe UTC, PVAT GPS time, the IMU boot clock
+anchored to its neighbours in the log), the speed (probe field 4) and the
+attitude (UBX-NAV-PVAT vehRoll/vehPitch/vehHeading) are held onto the IMU
+samples with ivi_merge.align, and the speed-gated EMA recursion is evaluated
+block by block with cumulative sums (ivi_dsp.recursive_filter), so only one
+Python step per block remains.
+Accelerometer (Sensor 1) and gyroscope (Sensor 4) are separate streams in the
+log, so each keeps its own bias, updated once per sample of its stream.
+"""
+
+import numpy as np
+
+from ivi_dsp import recursive_filter
+from ivi_merge import align, common_clock
+
+# IMUBiasRemover learning rate and stationary speed threshold (m/s)
+ALPHA = 0.01
+STATIC_SPEED_THRESHOLD = 0.05
+
+# feedMeUBX_NAV_ATT: attitudes are used only when accRoll/accPitch/accHeading (deg) are all below this
+ATTITUDE_ACCURACY_MAX = 2.2
+# UBX-NAV-PVAT attitude fields and their accuracies, in compensate() order
+ATTITUDE_FIELDS = ('vehRoll', 'vehPitch', 'vehHeading')
+ATTITUDE_ACCURACY_FIELDS = ('accRoll', 'accPitch', 'accHeading')
+
+# Standard gravity (m/s²), removed from the accelerometer along the attitude
+G = 9.80665
+
+
+def ema(values: np.ndarray, alpha: float = ALPHA) -> np.ndarray:
+    """b[i] = (1 - alpha) * b[i-1] + alpha * values[i] with b[-1] = 0, along the first axis."""
+    return recursive_filter(values, 1.0 - alpha, alpha)
+
+
+def gated_ema(values: np.ndarray, gate: np.ndarray, alpha: float = ALPHA) -> np.ndarray:
+    """Bias after each sample when only samples with gate set update the EMA; it holds in between."""
+    values = np.asarray(values, dtype=np.float64)
+    updated = ema(values[gate], alpha)
+    last = np.cumsum(gate) - 1
+    bias = np.zeros_like(values)
+    seen = last >= 0
+    bias[seen] = updated[last[seen]]
+    return bias
+
+
+def attitude_quaternions(roll_deg: np.ndarray, pitch_deg: np.ndarray, yaw_deg: np.ndarray) -> tuple:
+    """(w, x, y, z) columns of the roll/pitch/yaw attitudes (degrees), as toQuaternion()."""
+    cr, sr = np.cos(np.radians(roll_deg) * 0.5), np.sin(np.radians(roll_deg) * 0.5)
+    cp, sp = np.cos(np.radians(pitch_deg) * 0.5), np.sin(np.radians(pitch_deg) * 0.5)
+    cy, sy = np.cos(np.radians(yaw_deg) * 0.5), np.sin(np.radians(yaw_deg) * 0.5)
+    return (cr * cp * cy + sr * sp * sy,
+            sr * cp * cy - cr * sp * sy,
+            cr * sp * cy + sr * cp * sy,
+            cr * cp * sy - sr * sp * cy)
+
+
+def expected_gravity(w: np.ndarray, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """(n, 3) gravity in the sensor frame for each attitude quaternion, as getLinearAcceleration()."""
+    return np.column_stack((2.0 * (x * z - w * y) * G,
+                            2.0 * (y * z + w * x) * G,
+                            (w * w - x * x - y * y + z * z) * G))
+
+
+def _compensate_stream(data: dict, values: np.ndarray, stationary: np.ndarray) -> dict:
+    gate = stationary & np.isfinite(values).all(axis=1)
+    corrected = values - gated_ema(values, gate)
+    return {**data, 'x': corrected[:, 0], 'y': corrected[:, 1], 'z': corrected[:, 2]}
+
+
+def compensate(accel: dict, gyro: dict, speed_times: np.ndarray, speed: np.ndarray,
+               attitude_times: np.ndarray = None, attitude: tuple = None, offsets: dict = None,
+               attitude_accuracy: tuple = None, positions: dict = None) -> tuple:
+    """Bias-corrected (accel, gyro) like ImuSink.result(), from the raw ones.
+    speed_times/speed are probe field 0 (epoch s) and the speed field (m/s); attitude_times
+    and attitude = (roll, pitch, heading) in degrees are UBX-NAV-PVAT iTOW (ms) and fields,
+    attitude_accuracy = (accRoll, accPitch, accHeading) in degrees their accuracies: attitudes
+    not all below ATTITUDE_ACCURACY_MAX are skipped, the previous one holds.
+    Without attitude, gravity is not removed and the accelerometer bias absorbs it at rest.
+    The streams are put on one clock by ivi_merge.common_clock(); positions = {stream: byte
+    offsets} (accel, gyro, probe, pvat, see OffsetSink) anchor the IMU boot clock, offsets =
+    {stream: seconds} are a manual correction on top.
+    """
+    times = {'accel': accel['time'], 'gyro': gyro['time'], 'probe': speed_times}
+    if attitude is not None:
+        times['pvat'] = attitude_times
+    seconds, _ = common_clock(times, positions, offsets)
+    attitude_ok = None
+    if attitude is not None:
+        attitude_ok = np.ones(len(attitude_times), dtype=bool)
+        if attitude_accuracy is not None:
+            attitude_ok = (np.column_stack(attitude_accuracy) < ATTITUDE_ACCURACY_MAX).all(axis=1)
+    results = []
+    for name, data, remove_gravity in (('accel', accel, True), ('gyro', gyro, False)):
+        imu_s = seconds[name]
+        values = np.column_stack((data['x'], data['y'], data['z'])).astype(np.float64)
+        if remove_gravity and attitude_ok is not None and attitude_ok.any():
+            held = align(seconds['pvat'][attitude_ok], np.column_stack(attitude)[attitude_ok], imu_s,
+                         'previous', np.inf)
+            gravity = expected_gravity(*attitude_quaternions(*held.T))
+            # Before the first attitude there is nothing to remove
+            values = values - np.nan_to_num(gravity)
+        stationary = align(seconds['probe'], speed, imu_s, 'previous', np.inf) < STATIC_SPEED_THRESHOLD
+        results.append(_compensate_stream(data, values, stationary))
+    return tuple(results)
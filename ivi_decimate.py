@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Decimation of long sample series before plotting.
+
+A 10M-sample series drawn into an 1800-pixel-wide axis is mostly overdraw.
+These reducers keep roughly two points per horizontal pixel while preserving
+what the eye needs: min/max keeps every bin's extremes (braking spikes stay
+visible), LTTB (Largest-Triangle-Three-Buckets) keeps the visually most
+significant point per bucket.
+"""
+
+import numpy as np
+
+DECIMATE_METHODS = ('none', 'minmax', 'lttb')
+DECIMATE_DEFAULT = 'minmax'
+
+
+def plot_points(figwidth: float, dpi: float) -> int:
+    """About two points per horizontal pixel of a figure `figwidth` inches wide."""
+    return 2 * int(figwidth * dpi)
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int):
+    """Keep the minimum and maximum of each of n_out/2 equal bins, in original order."""
+    n = len(y)
+    if n <= n_out or n_out < 2:
+        return x, y
+    bins = n_out // 2
+    size = -(-n // bins)
+    full = n // size * size
+    starts = np.arange(0, full, size)
+    blocks = y[:full].reshape(-1, size)
+    picks = [starts + blocks.argmin(axis=1), starts + blocks.argmax(axis=1)]
+    if full < n:
+        rest = y[full:]
+        picks.append(np.array([full + rest.argmin(), full + rest.argmax()]))
+    idx = np.unique(np.concatenate(picks))
+    return x[idx], y[idx]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int):
+    """Largest-Triangle-Three-Buckets: keep the point per bucket that spans the
+    largest triangle with the previous pick and the next bucket's average."""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+    xf = np.asarray(x, dtype=np.float64)
+    yf = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            cx, cy = xf[nlo:nhi].mean(), yf[nlo:nhi].mean()
+        else:
+            cx, cy = xf[-1], yf[-1]
+        ax, ay = xf[a], yf[a]
+        area = np.abs((ax - cx) * (yf[lo:hi] - ay) - (ax - xf[lo:hi]) * (cy - ay))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return x[idx], y[idx]
+
+
+def decimate(x: np.ndarray, y: np.ndarray, method: str, n_out: int):
+    """Reduce (x, y) to about n_out points with the given method ('none' keeps all)."""
+    if method == 'minmax':
+        return minmax(x, y, n_out)
+    if method == 'lttb':
+        return lttb(x, y, n_out)
+    if method == 'none':
+        return x, y
+    raise ValueError(f"Unknown decimation method: {method}")
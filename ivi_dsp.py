@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Chunked signal processing of IVI sensor columns.
+
+Every stage keeps the state it needs between chunks (filter memory, the tail
+of a moving-average window, an unfinished resampling block or spectrogram
+segment), so a series can be processed DSP_CHUNK samples at a time, or batch
+by batch while exporting, with the same result as in one piece:
+  ma:N               moving average over the last N samples
+  lowpass:HZ[:K]     first-order RC low-pass at HZ, cascaded K times
+  highpass:HZ[:K]    first-order RC high-pass (input minus low-pass), cascaded K times
+Resampling keeps the mean of every block of N samples. Spectrograms are Welch
+estimates: Hann-windowed segments overlapping by half, whose power spectral
+densities are averaged into at most SPECTROGRAM_COLUMNS time columns.
+"""
+
+import math
+
+import numpy as np
+
+# Samples per chunk when a whole column is processed piecewise
+DSP_CHUNK = 1 << 20
+
+FILTER_KINDS = ('ma', 'lowpass', 'highpass')
+
+# Samples per block of the vectorised recursion, the largest decay**-block allowed, and the
+# shortest block worth it (faster decays are summed over their few non-negligible taps instead)
+RECURSION_BLOCK = 512
+RECURSION_MAX_GROWTH = 1e6
+RECURSION_MIN_BLOCK = 16
+
+SPECTROGRAM_NPERSEG = 256
+SPECTROGRAM_COLUMNS = 1000
+
+
+def recursive_filter(values: np.ndarray, decay: float, gain: float, initial=0.0) -> np.ndarray:
+    """y[t] = decay * y[t-1] + gain * values[t] with y[-1] = initial, along the first axis.
+    Within a block, y[t] = gain * d**t * cumsum(values[j] * d**-j) + d**(t+1) * y_start with
+    d = decay; the block starts are carried in one pass over the blocks. Blocks are cut
+    short enough that d**-block stays below RECURSION_MAX_GROWTH; when that would make them
+    shorter than RECURSION_MIN_BLOCK, see _short_recursion().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if not n or decay <= 0.0:
+        return gain * values
+    block = RECURSION_BLOCK
+    if decay < 1.0:
+        block = min(block, int(math.log(RECURSION_MAX_GROWTH) / -math.log(decay)))
+        if block < RECURSION_MIN_BLOCK:
+            return _short_recursion(values, decay, gain, initial)
+    n_blocks = -(-n // block)
+    padded = np.zeros((n_blocks * block,) + values.shape[1:])
+    padded[:n] = values
+    blocks = padded.reshape((n_blocks, block) + values.shape[1:])
+    shape = (1, block) + (1,) * (values.ndim - 1)
+    j = np.arange(block, dtype=np.float64).reshape(shape)
+    local = gain * decay ** j * np.cumsum(blocks * decay ** -j, axis=1)
+
+    starts = np.empty((n_blocks,) + values.shape[1:])
+    carry = np.broadcast_to(np.asarray(initial, dtype=np.float64), values.shape[1:]).copy()
+    block_decay = decay ** block
+    for b in range(n_blocks):
+        starts[b] = carry
+        carry = local[b, -1] + block_decay * carry
+    out = local + decay ** (j + 1) * starts[:, None]
+    return out.reshape((n_blocks * block,) + values.shape[1:])[:n]
+
+
+def _short_recursion(values: np.ndarray, decay: float, gain: float, initial) -> np.ndarray:
+    """recursive_filter() for a fast decay: d**k falls below the float64 resolution within a
+    few dozen samples, so y is the sum of that many shifted copies of the values (the taps
+    beyond underflow to nothing) plus the decaying initial state.
+    """
+    n = len(values)
+    taps = min(n, max(1, math.ceil(math.log(np.finfo(np.float64).eps) / math.log(decay))))
+    out = values.copy()
+    weight = 1.0
+    for k in range(1, taps):
+        weight *= decay
+        out[k:] += weight * values[:-k]
+    out *= gain
+    powers = decay ** np.arange(1, taps + 1, dtype=np.float64).reshape((taps,) + (1,) * (values.ndim - 1))
+    out[:taps] += powers * np.asarray(initial, dtype=np.float64)
+    return out
+
+
+def _fill_gaps(values: np.ndarray, previous) -> np.ndarray:
+    """Values with each NaN/Inf replaced by the last finite value before it (or `previous`,
+    or 0 at the very start), so one bad sample cannot poison a running sum or filter state.
+    """
+    finite = np.isfinite(values)
+    if finite.all():
+        return values
+    filled = np.where(finite, values, np.nan)
+    first = np.where(np.isfinite(previous), previous, 0.0) if previous is not None else 0.0
+    index = np.where(finite, np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1)), -1)
+    index = np.maximum.accumulate(index, axis=0)
+    if values.ndim > 1:
+        held = np.take_along_axis(filled, np.maximum(index, 0), axis=0)
+    else:
+        held = filled[np.maximum(index, 0)]
+    return np.where(index >= 0, held, first)
+
+
+class MovingAverage:
+    """Causal moving average over the last `n` samples (fewer at the very start)."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.tail = None
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return values
+        values = _fill_gaps(values, self.tail[-1] if self.tail is not None and len(self.tail) else None)
+        buf = values if self.tail is None else np.concatenate((self.tail, values))
+        k = len(buf) - len(values)
+        sums = np.concatenate((np.zeros((1,) + values.shape[1:]), np.cumsum(buf, axis=0)))
+        end = np.arange(k + 1, len(buf) + 1)
+        start = np.maximum(end - self.n, 0)
+        counts = (end - start).reshape((-1,) + (1,) * (values.ndim - 1))
+        self.tail = buf[max(0, len(buf) - (self.n - 1)):] if self.n > 1 else buf[:0]
+        return (sums[end] - sums[start]) / counts
+
+
+class LowPass:
+    """First-order RC low-pass at `cutoff` Hz for samples at `fs` Hz, starting from the first sample."""
+
+    def __init__(self, cutoff: float, fs: float):
+        if not fs > 0:
+            raise ValueError("Cannot tell the sample rate from the timestamps, pass --fs")
+        rc = 1.0 / (2 * math.pi * cutoff)
+        self.alpha = (1.0 / fs) / (rc + 1.0 / fs)
+        self.state = None
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return values
+        values = _fill_gaps(values, self.state)
+        if self.state is None:
+            self.state = values[0]
+        out = recursive_filter(values, 1.0 - self.alpha, self.alpha, self.state)
+        self.state = out[-1]
+        return out
+
+
+class HighPass:
+    """First-order high-pass at `cutoff` Hz: the input minus its RC low-pass."""
+
+    def __init__(self, cutoff: float, fs: float):
+        self.lowpass = LowPass(cutoff, fs)
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        return values - self.lowpass.process(values)
+
+
+class Resample:
+    """Mean of every block of `factor` samples; an unfinished block waits for the next chunk."""
+
+    def __init__(self, factor: int):
+        self.factor = factor
+        self.tail = None
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        buf = values if self.tail is None else np.concatenate((self.tail, values))
+        whole = len(buf) // self.factor * self.factor
+        self.tail = buf[whole:]
+        return buf[:whole].reshape((-1, self.factor) + buf.shape[1:]).mean(axis=1)
+
+
+def parse_filter_spec(spec: str):
+    """Split "ma:N", "lowpass:HZ[:K]" or "highpass:HZ[:K]" into (kind, value, order).
+    Raises ValueError on a bad spec.
+    """
+    parts = spec.split(':')
+    kind = parts[0]
+    try:
+        if kind == 'ma' and len(parts) == 2 and int(parts[1]) >= 1:
+            return kind, int(parts[1]), 1
+        if kind in ('lowpass', 'highpass') and len(parts) in (2, 3) and float(parts[1]) > 0:
+            order = int(parts[2]) if len(parts) == 3 else 1
+            if order >= 1:
+                return kind, float(parts[1]), order
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid filter '{spec}', expected ma:N, lowpass:HZ[:ORDER] or highpass:HZ[:ORDER]")
+
+
+class Pipeline:
+    """Filters applied in order, then optional resampling, to one series processed chunk by chunk."""
+
+    def __init__(self, specs: list, fs: float, resample: int = 1):
+        self.stages = []
+        for kind, value, order in map(parse_filter_spec, specs):
+            for _ in range(order):
+                if kind == 'ma':
+                    self.stages.append(MovingAverage(value))
+                elif kind == 'lowpass':
+                    self.stages.append(LowPass(value, fs))
+                else:
+                    self.stages.append(HighPass(value, fs))
+        if resample > 1:
+            self.stages.append(Resample(resample))
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        for stage in self.stages:
+            values = stage.process(values)
+        return values
+
+
+def apply_chunked(stage, values: np.ndarray, chunk: int = DSP_CHUNK) -> np.ndarray:
+    """Run a whole column through a stage (or Pipeline) `chunk` samples at a time."""
+    values = np.asarray(values, dtype=np.float64)
+    parts = [stage.process(values[i:i + chunk]) for i in range(0, len(values), chunk)]
+    return np.concatenate(parts) if parts else values.copy()
+
+
+def sample_rate(seconds: np.ndarray) -> float:
+    """Sample rate (Hz) of a timestamp column in seconds: from the median step, or from the
+    overall span when timestamps are coarser than the samples (e.g. whole seconds). NaN if unknown.
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    seconds = seconds[np.isfinite(seconds)]
+    if len(seconds) < 2:
+        return math.nan
+    steps = np.diff(seconds)
+    step = np.median(steps[steps >= 0]) if (steps >= 0).any() else 0.0
+    if step > 0:
+        return 1.0 / step
+    span = seconds[-1] - seconds[0]
+    return (len(seconds) - 1) / span if span > 0 else math.nan
+
+
+class Spectrogram:
+    """Welch spectrogram of a 1-D series fed chunk by chunk.
+    Segments of `nperseg` samples overlap by half; the PSDs of `average` consecutive
+    segments are averaged into one time column.
+    """
+
+    def __init__(self, fs: float, nperseg: int = SPECTROGRAM_NPERSEG, average: int = 1):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.step = max(1, nperseg // 2)
+        self.average = max(1, average)
+        self.window = np.hanning(nperseg)
+        self.scale = 1.0 / (fs * (self.window ** 2).sum())
+        self.tail = np.empty(0)
+        self.consumed = 0
+        self.pending = []
+        self.columns = []
+        self.times = []
+
+    def process(self, values: np.ndarray) -> None:
+        buf = np.concatenate((self.tail, np.asarray(values, dtype=np.float64)))
+        if len(buf) < self.nperseg:
+            self.tail = buf
+            return
+        segments = np.lib.stride_tricks.sliding_window_view(buf, self.nperseg)[::self.step]
+        # Non-finite samples would spread over the whole segment; treat them as silence
+        segments = np.nan_to_num(segments - np.nanmean(segments, axis=1, keepdims=True), nan=0.0,
+                                 posinf=0.0, neginf=0.0)
+        psd = np.abs(np.fft.rfft(segments * self.window, axis=1)) ** 2 * self.scale
+        psd[:, 1:-1 if self.nperseg % 2 == 0 else None] *= 2
+        starts = self.consumed + np.arange(len(segments)) * self.step
+        self.pending.extend(zip(starts, psd))
+        while len(self.pending) >= self.average:
+            group, self.pending = self.pending[:self.average], self.pending[self.average:]
+            self.columns.append(np.mean([p for _, p in group], axis=0))
+            self.times.append((group[0][0] + group[-1][0] + self.nperseg) / 2 / self.fs)
+        used = len(segments) * self.step
+        self.tail = buf[used:]
+        self.consumed += used
+
+    def result(self):
+        """(times in s from the first sample, frequencies in Hz, PSD of shape (times, frequencies))."""
+        freqs = np.fft.rfftfreq(self.nperseg, 1.0 / self.fs)
+        if not self.columns:
+            return np.empty(0), freqs, np.empty((0, len(freqs)))
+        return np.array(self.times), freqs, np.array(self.columns)
+
+
+def welch_spectrogram(values: np.ndarray, fs: float, nperseg: int = SPECTROGRAM_NPERSEG,
+                      max_columns: int = SPECTROGRAM_COLUMNS):
+    """Spectrogram.result() of a whole column, averaged down to at most `max_columns` time columns."""
+    segments = max(0, (len(values) - nperseg) // max(1, nperseg // 2) + 1)
+    spectrogram = Spectrogram(fs, nperseg, average=-(-segments // max_columns))
+    for i in range(0, len(values), DSP_CHUNK):
+        spectrogram.process(values[i:i + DSP_CHUNK])
+    return spectrogram.result()
+
+
+def spectrogram_figure(series: list, fs: float, title: str, nperseg: int = SPECTROGRAM_NPERSEG):
+    """One Welch spectrogram panel per (label, values) series sampled at `fs` Hz."""
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(len(series), 1, figsize=(12, 2.6 * len(series) + 1), sharex=True)
+    axes = np.atleast_1d(axes)
+    for ax, (label, values) in zip(axes, series):
+        times, freqs, psd = welch_spectrogram(values, fs, nperseg)
+        if len(times):
+            mesh = ax.pcolormesh(times, freqs, 10 * np.log10(psd.T + 1e-20), shading='nearest', cmap='viridis')
+            fig.colorbar(mesh, ax=ax, label="dB/Hz")
+        ax.set_ylabel(f"{label}\nHz")
+    axes[0].set_title(title)
+    axes[-1].set_xlabel("Time (s)")
+    fig.tight_layout()
+    return fig
+
+
+class TableFilter:
+    """Adds a filtered copy, <column>_filtered, of each signal column to export batches.
+    Rows are split by `group` (e.g. sensor_id), each group with its own pipelines, and put
+    back in their original order. The sample rate of a group is taken from its first batch's
+    `time_column` (seconds per unit `time_scale`) unless `fs` is given. With resample > 1
+    every column of the table is reduced to block means (the group column is kept as is),
+    each mean taking the place of the row that completed its block.
+    """
+
+    def __init__(self, specs: list, signal_columns: list, time_column: str, time_scale: float,
+                 resample: int = 1, fs: float = None, group: str = None):
+        self.specs = specs
+        self.signal_columns = signal_columns
+        self.time_column = time_column
+        self.time_scale = time_scale
+        self.resample = resample
+        self.fs = fs
+        self.group = group
+        self.pipelines = {}
+        self.resamplers = {}
+
+    def _filter(self, key, columns: dict) -> dict:
+        if not len(columns[self.time_column]):
+            # Empty batches still carry every column, with the types later batches will have
+            out = dict(columns)
+            if self.specs:
+                out.update({f'{name}_filtered': np.empty(0) for name in self.signal_columns})
+            if self.resample > 1:
+                out = {name: values if name == self.group else values.astype(np.float64)
+                       for name, values in out.items()}
+            return out
+        if key not in self.pipelines:
+            fs = self.fs or sample_rate(columns[self.time_column] * self.time_scale)
+            self.pipelines[key] = {name: Pipeline(self.specs, fs) for name in self.signal_columns}
+        out = dict(columns)
+        if self.specs:
+            for name in self.signal_columns:
+                out[f'{name}_filtered'] = self.pipelines[key][name].process(columns[name])
+        if self.resample > 1:
+            for name, values in list(out.items()):
+                if name == self.group:
+                    continue
+                resampler = self.resamplers.setdefault((key, name), Resample(self.resample))
+                out[name] = resampler.process(values)
+            if self.group is not None:
+                out[self.group] = np.full(len(out[self.time_column]), key, dtype=columns[self.group].dtype)
+        return out
+
+    def _rows(self, key, rows: np.ndarray, count: int) -> np.ndarray:
+        """Batch row each of the `count` output rows of a group was completed by."""
+        if self.resample == 1:
+            return rows
+        # The last output row ends where the group's unfinished block starts
+        pending = len(self.resamplers[(key, self.time_column)].tail)
+        return rows[len(rows) - pending - 1 - self.resample * np.arange(count)[::-1]]
+
+    def __call__(self, columns: dict) -> dict:
+        if self.group is None:
+            return self._filter(None, columns)
+        parts, positions = [], []
+        for key in np.unique(columns[self.group]):
+            rows = np.flatnonzero(columns[self.group] == key)
+            part = self._filter(key, {name: values[rows] for name, values in columns.items()})
+            parts.append(part)
+            positions.append(self._rows(key, rows, len(part[self.time_column])))
+        if not parts:
+            return self._filter(None, columns)
+        # Groups are filtered apart but written back in log order
+        order = np.argsort(np.concatenate(positions), kind='stable')
+        return {name: np.concatenate([part[name] for part in parts])[order] for name in parts[0]}
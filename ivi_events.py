@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Event detection over IVI log streams, with a persistent index of where each
+event sits in the log.
+
+Rules are checked over whole parsed columns at once, never sample by sample:
+  [name=]stream.series[:abs][:slope]<op><value>[@seconds]
+e.g. hard_braking=probe.7<-3@0.3, gyro.z:abs>1.5, pvat.vehPitch:slope:abs>10.
+The series is probe field <index>, accel/gyro x|y|z or a UBX-NAV-PVAT key;
+:abs and :slope (per second) apply in order; a run of consecutive samples
+meeting the condition for at least `seconds` is one event.
+
+While parsing, the byte offset of every sample's log line is kept, so the
+index stores each event's timestamp, sample index and byte offset, plus the
+byte range of the samples within --pad seconds around it. A zoomed plot or a
+dump of the raw lines around an event then reads only those bytes instead of
+scanning the log again. For compressed logs, offsets count decompressed bytes.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import argparse
+
+import numpy as np
+
+from ivi_dsp import sample_rate
+from ivi_log_cache import CACHE_DIR
+from ivi_log_engine import (ImuSink, OffsetSink, ProbeSink, PvatSink, ScanStats, compression_of,
+                            iter_decompressed_blocks, iter_range_blocks, scan_blocks, scan_log, to_numpy)
+from ivi_merge import stream_seconds
+
+EVENTS_VERSION = 1
+HASH_WINDOW = 64 * 1024
+
+# Rules used when none are given
+DEFAULT_RULES = (
+    'hard_braking=probe.7<-3@0.3',
+    'gyro_spike=gyro.z:abs>1.5',
+    'pitch_jump=pvat.vehPitch:slope:abs>10',
+)
+
+# Seconds of samples kept around each event for the zoomed plot
+EVENT_PAD = 5.0
+
+# Raw lines shown before and after an event by --dump
+DUMP_CONTEXT = 20
+
+# Record type of each stream a rule can name
+STREAM_KINDS = {'accel': 'imu', 'gyro': 'imu', 'probe': 'probe', 'pvat': 'pvat'}
+
+RULE_PATTERN = re.compile(r'^(?:(?P<name>\w+)=)?(?P<stream>\w+)\.(?P<series>\w+)(?P<modifiers>(?::(?:abs|slope))*)'
+                          r'\s*(?P<op>[<>])\s*(?P<value>[^@\s]+)(?:@(?P<duration>\S+))?$')
+
+EVENT_COLUMNS = ('rule', 'stream', 'sample', 'end_sample', 'time', 'end_time', 'duration_s', 'peak', 'offset',
+                 'window_sample', 'window_offset', 'window_end_offset')
+
+
+class Rule:
+    """A threshold rule on one series, optionally on its absolute value and/or slope, with a minimum duration."""
+
+    def __init__(self, spec: str):
+        m = RULE_PATTERN.match(spec.strip())
+        if not m or m.group('stream') not in STREAM_KINDS:
+            raise ValueError(f"Invalid rule '{spec}', expected [name=]<{'|'.join(STREAM_KINDS)}>.series"
+                             f"[:abs][:slope]<op><value>[@seconds]")
+        self.spec = spec.strip()
+        self.stream = m.group('stream')
+        self.series = m.group('series')
+        if self.stream == 'probe':
+            if not self.series.isdigit():
+                raise ValueError(f"Invalid rule '{spec}', probe series are zero-based field indices")
+            self.series = int(self.series)
+        elif self.stream in ('accel', 'gyro') and self.series not in ('x', 'y', 'z'):
+            raise ValueError(f"Invalid rule '{spec}', {self.stream} series are x, y or z")
+        self.modifiers = [mod for mod in m.group('modifiers').split(':') if mod]
+        self.op = m.group('op')
+        try:
+            self.value = float(m.group('value'))
+            self.min_duration = float(m.group('duration') or 0.0)
+        except ValueError:
+            raise ValueError(f"Invalid rule '{spec}', threshold and duration must be numbers") from None
+        self.name = m.group('name') or self.spec
+
+    def measure(self, seconds: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """The quantity compared with the threshold: the series after :abs/:slope in order."""
+        values = np.asarray(values, dtype=np.float64)
+        for mod in self.modifiers:
+            if mod == 'abs':
+                values = np.abs(values)
+            else:
+                slope = np.full(len(values), np.nan)
+                if len(values) > 1:
+                    dt = np.diff(seconds)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        slope[1:] = np.where(dt > 0, np.diff(values) / dt, np.nan)
+                values = slope
+        return values
+
+    def detect(self, seconds: np.ndarray, values: np.ndarray):
+        """(starts, ends, peaks) of the runs meeting the rule: first and last sample index, and the
+        extreme measured value of each run.
+        """
+        measured = self.measure(seconds, values)
+        with np.errstate(invalid='ignore'):
+            mask = measured > self.value if self.op == '>' else measured < self.value
+        starts, ends = find_runs(mask)
+        if self.min_duration > 0:
+            with np.errstate(invalid='ignore'):
+                keep = seconds[ends] - seconds[starts] >= self.min_duration
+            starts, ends = starts[keep], ends[keep]
+        if not len(starts):
+            return starts, ends, np.empty(0)
+        reduce = np.maximum if self.op == '>' else np.minimum
+        # reduceat over [start, end + 1) pairs; the odd entries span the gaps and are dropped
+        bounds = np.column_stack((starts, ends + 1)).ravel()
+        peaks = reduce.reduceat(np.append(measured, 0.0), bounds)[::2]
+        return starts, ends, peaks
+
+
+def parse_rules(specs: list) -> list:
+    """Rules of the specs; raises ValueError on an invalid spec or a rule name given twice."""
+    rules = [Rule(spec) for spec in specs]
+    names = [rule.name for rule in rules]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate rule name(s): {', '.join(duplicates)}; give each rule its own name=")
+    return rules
+
+
+def find_runs(mask: np.ndarray):
+    """(starts, ends) index arrays of the runs of True in a boolean array, ends inclusive."""
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+def event_seconds(times: np.ndarray, kind: str) -> np.ndarray:
+    """Seconds since the first sample; evenly spaced at the stream's sample rate when the
+    timestamps are coarser than the samples (e.g. whole seconds) or some are missing, so slopes
+    and durations hold. Without any usable timestamps, one sample counts as one second.
+    """
+    seconds = stream_seconds(times, kind)
+    steps = np.diff(seconds)
+    missing = not np.isfinite(seconds).all()
+    if missing or (len(steps) and (steps <= 0).any()):
+        fs = sample_rate(seconds)
+        if fs > 0:
+            return np.arange(len(seconds)) / fs
+        if missing:
+            return np.arange(len(seconds), dtype=np.float64)
+    return seconds
+
+
+def rule_sinks(rules: list) -> list:
+    """Engine sinks for the streams and fields the rules need, each wrapped in an OffsetSink."""
+    streams = {rule.stream for rule in rules}
+    sinks = []
+    if streams & {'accel', 'gyro'}:
+        sinks.append(ImuSink())
+    probe_fields = [rule.series for rule in rules if rule.stream == 'probe']
+    if probe_fields:
+        sinks.append(ProbeSink(probe_fields))
+    pvat_fields = [rule.series for rule in rules if rule.stream == 'pvat']
+    if pvat_fields:
+        sinks.append(PvatSink(list(dict.fromkeys(pvat_fields))))
+    return [OffsetSink(sink) for sink in sinks]
+
+
+def _sink_config(sinks: list) -> dict:
+    """What the zoomed plot needs to parse the same rows again: probe fields and PVAT specs."""
+    config = {}
+    for sink in sinks:
+        if sink.KIND == 'probe':
+            config['probe_fields'] = sink.sink.field_indices
+        elif sink.KIND == 'pvat':
+            config['pvat_fields'] = sink.sink.specs()
+    return config
+
+
+def _stream_sink(stream: str, config: dict):
+    if stream == 'probe':
+        return ProbeSink(config['probe_fields'])
+    if stream == 'pvat':
+        return PvatSink(config['pvat_fields'])
+    return ImuSink()
+
+
+def _monotonic(seconds: np.ndarray) -> np.ndarray:
+    return np.maximum.accumulate(np.where(np.isnan(seconds), -np.inf, seconds))
+
+
+def detect_events(sinks: list, rules: list, pad: float = EVENT_PAD) -> dict:
+    """Event index columns (see EVENT_COLUMNS), ordered by position in the log, from parsed OffsetSinks."""
+    streams = {}
+    for sink in sinks:
+        for name, data in sink.streams().items():
+            streams[name] = (sink.KIND, data)
+    parts = []
+    for rule in rules:
+        kind, data = streams[rule.stream]
+        times = to_numpy(data['time'])
+        seconds = event_seconds(times, kind)
+        starts, ends, peaks = rule.detect(seconds, to_numpy(data[rule.series]))
+        offsets = to_numpy(data['offset'])
+        mono = _monotonic(seconds)
+        lo = np.minimum(np.searchsorted(mono, seconds[starts] - pad, side='left'), starts)
+        hi = np.searchsorted(mono, seconds[ends] + pad, side='right')
+        # Offset of the first line past the window, -1 up to the end of the log
+        window_end = np.where(hi < len(offsets), offsets[np.minimum(hi, len(offsets) - 1)], -1)
+        parts.append({
+            'rule': np.full(len(starts), rule.name),
+            'stream': np.full(len(starts), rule.stream),
+            'sample': starts,
+            'end_sample': ends,
+            'time': times[starts],
+            'end_time': times[ends],
+            'duration_s': seconds[ends] - seconds[starts],
+            'peak': peaks,
+            'offset': offsets[starts],
+            'window_sample': lo,
+            'window_offset': offsets[lo] if len(lo) else lo,
+            'window_end_offset': window_end,
+        })
+    if not parts:
+        return {name: np.empty(0) for name in EVENT_COLUMNS}
+    events = {name: np.concatenate([part[name] for part in parts]) for name in EVENT_COLUMNS}
+    order = np.argsort(events['offset'], kind='stable')
+    return {name: values[order] for name, values in events.items()}
+
+
+def events_path(filepath: str, cache_dir: str) -> str:
+    name = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest() + '.events.npz'
+    return os.path.join(cache_dir, name)
+
+
+def _log_meta(filepath: str) -> dict:
+    st = os.stat(filepath)
+    with open(filepath, 'rb') as f:
+        head_hash = hashlib.sha1(f.read(HASH_WINDOW)).hexdigest()
+    return {'version': EVENTS_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'head_hash': head_hash}
+
+
+def save_events(path: str, events: dict, meta: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez(path + '.temp.npz', meta=np.array(json.dumps(meta)), **events)
+    os.replace(path + '.temp.npz', path)
+
+
+def load_events(path: str, filepath: str):
+    """(events, meta) of an index that is still valid for the log, or None."""
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            events = {name: npz[name] for name in EVENT_COLUMNS}
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(meta.get(key) != value for key, value in _log_meta(filepath).items()):
+        return None
+    return events, meta
+
+
+def build_events(filepath: str, rules: list, pad: float = EVENT_PAD, jobs: int = 1, path: str = None,
+                 stats: ScanStats = None):
+    """Scan the log, detect events and, with `path` set, store the index there. Returns (events, meta)."""
+    meta = _log_meta(filepath)
+    sinks = rule_sinks(rules)
+    scan_log(filepath, sinks, jobs=jobs, stats=stats)
+    events = detect_events(sinks, rules, pad)
+    meta.update({'rules': [rule.spec for rule in rules], 'pad': pad, **_sink_config(sinks)})
+    if path:
+        try:
+            save_events(path, events, meta)
+        except OSError as e:
+            print(f"Warning: could not write event index {path}: {e}", file=sys.stderr)
+    return events, meta
+
+
+def iter_log_range(filepath: str, start: int, end: int = -1):
+    """Yield newline-aligned blocks of the log bytes [start, end), end -1 meaning the end of the log.
+    Compressed logs are decompressed from the beginning, but only the range is yielded.
+    """
+    compression = compression_of(filepath)
+    if not compression:
+        with open(filepath, 'rb') as f:
+            yield from iter_range_blocks(f, start, os.path.getsize(filepath) if end < 0 else end)
+        return
+    pos = 0
+    for block in iter_decompressed_blocks(filepath, compression):
+        lo, hi = max(start - pos, 0), len(block) if end < 0 else min(end - pos, len(block))
+        pos += len(block)
+        if lo < hi:
+            yield block[lo:hi]
+        if 0 <= end <= pos:
+            return
+
+
+def raw_lines(filepath: str, offset: int, context: int = DUMP_CONTEXT) -> tuple:
+    """(lines before, line at `offset`, lines after): up to `context` raw log lines either side."""
+    back = max(4096, context * 256)
+    while True:
+        lo = max(0, offset - back)
+        before = b''.join(iter_log_range(filepath, lo, offset)).split(b'\n')[:-1]
+        if len(before) > context or lo == 0:
+            break
+        back *= 4
+    after = []
+    tail = b''
+    for block in iter_log_range(filepath, offset):
+        after.extend((tail + block).split(b'\n'))
+        tail = after.pop()
+        if len(after) > context:
+            break
+    if tail:
+        after.append(tail)
+    before = [line.decode('utf-8', 'replace') for line in before[len(before) - context:]]
+    after = [line.decode('utf-8', 'replace') for line in after[:context + 1]]
+    return before, after[0] if after else '', after[1:]
+
+
+def event_window(filepath: str, events: dict, meta: dict, number: int) -> dict:
+    """Columns of the event's stream within the stored window, parsed from that byte range only,
+    with 'sample' holding the sample indices of the whole-log parse.
+    """
+    stream = str(events['stream'][number])
+    sink = _stream_sink(stream, meta)
+    blocks = iter_log_range(filepath, int(events['window_offset'][number]), int(events['window_end_offset'][number]))
+    scan_blocks(blocks, [sink])
+    data = {name: to_numpy(col) for name, col in sink.streams()[stream].items()}
+    data['sample'] = int(events['window_sample'][number]) + np.arange(len(data['time']))
+    return data
+
+
+def event_figure(filepath: str, events: dict, meta: dict, number: int, rules: dict, title: str):
+    """Zoomed plot of an event: the series and, for :abs/:slope rules, the measured quantity with its threshold."""
+    import matplotlib.pyplot as plt
+
+    rule = rules[str(events['rule'][number])]
+    data = event_window(filepath, events, meta, number)
+    values = data[rule.series]
+    measured = rule.measure(event_seconds(data['time'], STREAM_KINDS[rule.stream]), values)
+    panels = [(f"{rule.stream}.{rule.series}", values)]
+    if rule.modifiers:
+        panels.append((f"{rule.stream}.{rule.series}:{':'.join(rule.modifiers)}", measured))
+
+    fig, axes = plt.subplots(len(panels), 1, figsize=(12, 3.5 * len(panels) + 1), sharex=True)
+    axes = np.atleast_1d(axes)
+    for i, (ax, (label, series)) in enumerate(zip(axes, panels)):
+        ax.plot(data['sample'], series, linewidth=0.8, color='steelblue', label=label)
+        ax.axvspan(events['sample'][number], events['end_sample'][number], color='crimson', alpha=0.2,
+                   label="event")
+        if i == len(panels) - 1:
+            ax.axhline(rule.value, color='crimson', linewidth=0.8, linestyle='--', label=f"threshold {rule.value:g}")
+        ax.set_ylabel(label)
+        ax.legend()
+        ax.grid(True, alpha=0.4)
+    axes[0].set_title(f"{title} — event {number}: {rule.name} at sample {events['sample'][number]}")
+    axes[-1].set_xlabel("Sample index")
+    fig.tight_layout()
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Detect events in an IVI log, index them by byte offset and jump straight to one."
+    )
+    parser.add_argument('logfile', help="Path to the log file")
+    parser.add_argument(
+        '--rule', nargs='+', default=None, metavar='SPEC',
+        help="Detection rules, [name=]stream.series[:abs][:slope]<op><value>[@seconds], e.g. "
+             "hard_braking=probe.7<-3@0.3 (default: the stored index's rules, else "
+             f"{' '.join(DEFAULT_RULES)})"
+    )
+    parser.add_argument(
+        '--pad', type=float, default=None,
+        help=f"Seconds around each event kept for --plot (default: {EVENT_PAD})"
+    )
+    parser.add_argument(
+        '--redetect', action='store_true',
+        help="Scan the log again even if the stored index is up to date"
+    )
+    parser.add_argument(
+        '--index', default=None,
+        help="Event index file (default: next to the parse cache in --cache-dir)"
+    )
+    parser.add_argument(
+        '--plot', type=int, default=None, metavar='EVENT',
+        help="Plot a zoomed view of event number EVENT from the index"
+    )
+    parser.add_argument(
+        '--dump', type=int, default=None, metavar='EVENT',
+        help="Print the raw log lines around event number EVENT"
+    )
+    parser.add_argument(
+        '--context', type=int, default=DUMP_CONTEXT,
+        help=f"Lines shown before and after the event by --dump (default: {DUMP_CONTEXT})"
+    )
+    parser.add_argument(
+        '--output', default=None,
+        help="Save the --plot figure to file instead of displaying (e.g. event.png)"
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help="Parse with N worker processes (0 = all cores, default: 1)"
+    )
+    parser.add_argument(
+        '--cache-dir', default=CACHE_DIR,
+        help=f"Directory for the event index (default: {CACHE_DIR})"
+    )
+    args = parser.parse_args()
+
+    path = args.index or events_path(args.logfile, args.cache_dir)
+    stored = load_events(path, args.logfile)
+    loaded = None if args.redetect else stored
+    # Read the stored rules before a changed --pad or --redetect invalidates the index
+    specs = args.rule if args.rule is not None else (stored[1]['rules'] if stored else list(DEFAULT_RULES))
+    if loaded is not None:
+        events, meta = loaded
+        if (args.rule is not None and [spec.strip() for spec in args.rule] != meta['rules']) or \
+                (args.pad is not None and args.pad != meta['pad']):
+            loaded = None
+    try:
+        rules = parse_rules(specs)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if loaded is None:
+        stats = ScanStats()
+        events, meta = build_events(args.logfile, rules, EVENT_PAD if args.pad is None else args.pad,
+                                    jobs=args.jobs, path=path, stats=stats)
+        print(stats.report())
+        print(f"{len(events['offset'])} events indexed in {path}")
+    rules = {rule.name: rule for rule in rules}
+
+    for number in (args.plot, args.dump):
+        if number is not None and not 0 <= number < len(events['offset']):
+            print(f"Error: no event {number}, the index holds {len(events['offset'])}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.dump is not None:
+        before, line, after = raw_lines(args.logfile, int(events['offset'][args.dump]), args.context)
+        for text in before:
+            print(f"   {text}")
+        print(f">> {line}")
+        for text in after:
+            print(f"   {text}")
+
+    if args.plot is not None:
+        from ivi_backend import use_headless_backend
+        if args.output:
+            use_headless_backend()
+        fig = event_figure(args.logfile, events, meta, args.plot, rules, os.path.basename(args.logfile))
+        if args.output:
+            fig.savefig(args.output, dpi=150)
+            print(f"Plot saved to {args.output}")
+        else:
+            import matplotlib.pyplot as plt
+            plt.show()
+
+    if args.plot is None and args.dump is None:
+        print(f"{'#':>5s}  {'rule':20s} {'stream':6s} {'sample':>9s} {'time':>20s} {'duration':>9s} "
+              f"{'peak':>12s} {'offset':>12s}")
+        for i in range(len(events['offset'])):
+            print(f"{i:5d}  {events['rule'][i]:20s} {events['stream'][i]:6s} {events['sample'][i]:9d} "
+                  f"{events['time'][i]:20.3f} {events['duration_s'][i]:8.3f}s {events['peak'][i]:12.6f} "
+                  f"{events['offset'][i]:12d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Columnar export of parsed IVI log records.
+
+An ExportSink wraps one of the engine's column sinks and, every FLUSH_LINES
+matching lines, appends what it collected to the export file as one more row
+group (Parquet), record batch (Arrow IPC) or dataset extension (HDF5), then
+starts the sink afresh. The export never holds more than one batch in memory.
+The format follows the file extension:
+  .parquet           Parquet (pyarrow)
+  .arrow, .feather   Arrow IPC file, memory-mappable with pyarrow.memory_map (pyarrow)
+  .h5, .hdf5         one resizable dataset per column (h5py)
+Columns per record type; timestamps keep the engine's float64 with NaN where missing:
+  imu    sensor_id (int8), timestamp_ns, x, y, z; accel and gyro rows interleaved in log order
+  probe  timestamp_s, field_<index> per requested probe field
+  pvat   itow_ms, one column per requested key, typed per its name:type spec
+"""
+
+import math
+import os
+import sys
+
+import numpy as np
+
+from ivi_log_engine import ACCEL_SENSOR_ID, GYRO_SENSOR_ID, ScanStats, new_column, scan_log, to_numpy
+from ivi_log_index import scan_window
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except Exception:
+    pyarrow = None
+    PYARROW_AVAILABLE = False
+
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except Exception:
+    h5py = None
+    H5PY_AVAILABLE = False
+
+# Matching lines fed to the wrapped sink between two writes
+FLUSH_LINES = 262144
+
+# Largest log byte range a worker parses with jobs > 1; at most `jobs` such chunks are held at once
+EXPORT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# File extension -> export format
+EXPORT_FORMATS = {
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.h5': 'hdf5',
+    '.hdf5': 'hdf5',
+}
+
+# Name of the timestamp column per record type
+TIME_COLUMNS = {'imu': 'timestamp_ns', 'probe': 'timestamp_s', 'pvat': 'itow_ms'}
+
+IMU_SENSOR_IDS = {'accel': ACCEL_SENSOR_ID, 'gyro': GYRO_SENSOR_ID}
+
+
+def export_format(path: str) -> str:
+    """Export format of an output path; raises ValueError for unknown extensions or missing libraries."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{ext}', expected one of {', '.join(EXPORT_FORMATS)}")
+    fmt = EXPORT_FORMATS[ext]
+    if fmt in ('parquet', 'arrow') and not PYARROW_AVAILABLE:
+        raise ValueError(f"pyarrow is required to export {ext} files (pip install pyarrow)")
+    if fmt == 'hdf5' and not H5PY_AVAILABLE:
+        raise ValueError(f"h5py is required to export {ext} files (pip install h5py)")
+    return fmt
+
+
+class LineOrderSink:
+    """Wraps an engine sink and numbers every sample it keeps with the line it was parsed from,
+    so samples split across streams (accel/gyro) can be written back in log order.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.KIND = sink.KIND
+        self.MARKER = sink.MARKER
+        self.IGNORECASE = sink.IGNORECASE
+        self.lines = 0
+        self.order = {name: new_column('q') for name in sink.streams()}
+        # The wrapped sink appends to the same time columns for as long as it is fed
+        self.columns = [(self.order[name], data['time']) for name, data in sink.streams().items()]
+
+    def feed(self, line: str) -> None:
+        self.sink.feed(line)
+        for order, times in self.columns:
+            for _ in range(len(times) - len(order)):
+                order.append(self.lines)
+        self.lines += 1
+
+    def spawn(self) -> 'LineOrderSink':
+        """Empty sink with the same configuration, for parsing another chunk."""
+        return LineOrderSink(self.sink.spawn())
+
+    def streams(self) -> dict:
+        return self.sink.streams()
+
+
+def export_columns(sink) -> dict:
+    """{column name: NumPy array} of everything a sink collected, in export column order.
+    IMU rows of a LineOrderSink come out in log order, otherwise grouped by sensor.
+    """
+    time_column = TIME_COLUMNS[sink.KIND]
+    if sink.KIND == 'imu':
+        streams = sink.streams()
+        parts = [(IMU_SENSOR_IDS[name], data) for name, data in streams.items()]
+        columns = {
+            'sensor_id': np.concatenate([np.full(len(data['time']), sensor_id, dtype=np.int8)
+                                         for sensor_id, data in parts]),
+            time_column: np.concatenate([to_numpy(data['time']) for _, data in parts]),
+        }
+        for axis in ('x', 'y', 'z'):
+            columns[axis] = np.concatenate([to_numpy(data[axis]) for _, data in parts])
+        if isinstance(sink, LineOrderSink):
+            rows = np.argsort(np.concatenate([to_numpy(sink.order[name]) for name in streams]), kind='stable')
+            columns = {name: values[rows] for name, values in columns.items()}
+        return columns
+    (data,) = sink.streams().values()
+    columns = {time_column: to_numpy(data['time'])}
+    for name, col in data.items():
+        if name != 'time':
+            columns[f'field_{name}' if sink.KIND == 'probe' else name] = to_numpy(col)
+    return columns
+
+
+class _ArrowWriter:
+    """Appends batches to a Parquet or Arrow IPC file."""
+
+    def __init__(self, path: str, fmt: str, columns: dict, metadata: dict):
+        schema = pyarrow.schema([(name, pyarrow.from_numpy_dtype(values.dtype)) for name, values in columns.items()],
+                                metadata=metadata)
+        self.schema = schema
+        if fmt == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(path, schema)
+
+    def write(self, columns: dict) -> None:
+        self.writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(v) for v in columns.values()],
+                                                          schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class _Hdf5Writer:
+    """Appends batches to one chunked, resizable dataset per column."""
+
+    def __init__(self, path: str, columns: dict, metadata: dict):
+        self.file = h5py.File(path, 'w')
+        self.file.attrs.update(metadata)
+        for name, values in columns.items():
+            self.file.create_dataset(name, shape=(0,), maxshape=(None,), dtype=values.dtype, chunks=(65536,))
+        self.rows = 0
+
+    def write(self, columns: dict) -> None:
+        n = len(next(iter(columns.values())))
+        for name, values in columns.items():
+            dataset = self.file[name]
+            dataset.resize((self.rows + n,))
+            dataset[self.rows:] = values
+        self.rows += n
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _open_writer(path: str, fmt: str, columns: dict, metadata: dict):
+    if fmt == 'hdf5':
+        return _Hdf5Writer(path, columns, metadata)
+    return _ArrowWriter(path, fmt, columns, metadata)
+
+
+def write_columns(path: str, columns: dict, metadata: dict = None) -> None:
+    """Write a finished table of {name: NumPy column} in the format of the path's extension."""
+    writer = _open_writer(path + '.tmp', export_format(path), columns, metadata or {})
+    try:
+        writer.write(columns)
+    finally:
+        writer.close()
+    os.replace(path + '.tmp', path)
+
+
+class ExportSink:
+    """Wraps an engine sink, appending its columns to an export file in batches instead of keeping them.
+    Samples whose timestamp lies outside [start, end] are skipped. `process`, if given, maps
+    each batch of columns to the columns written (e.g. an ivi_dsp.TableFilter); batches reach
+    it in log order. The file is written to a temporary name and only moved to `path` by close().
+    """
+
+    def __init__(self, sink, path: str, start: float = None, end: float = None, metadata: dict = None,
+                 process=None):
+        # IMU samples are kept per sensor; number them by line to write them back in log order
+        self.sink = LineOrderSink(sink) if sink.KIND == 'imu' else sink
+        self.KIND = sink.KIND
+        self.MARKER = sink.MARKER
+        self.IGNORECASE = sink.IGNORECASE
+        self.path = path
+        self.format = export_format(path)
+        self.start = -math.inf if start is None else start
+        self.end = math.inf if end is None else end
+        self.metadata = {'kind': sink.KIND, **(metadata or {})}
+        self.process = process
+        self.writer = None
+        self.rows = 0
+        self.pending = 0
+
+    def feed(self, line: str) -> None:
+        self.sink.feed(line)
+        self.pending += 1
+        if self.pending >= FLUSH_LINES:
+            self.flush()
+
+    def _write(self, sink) -> None:
+        columns = export_columns(sink)
+        if self.start > -math.inf or self.end < math.inf:
+            times = columns[TIME_COLUMNS[self.KIND]]
+            keep = (times >= self.start) & (times <= self.end)
+            columns = {name: values[keep] for name, values in columns.items()}
+        if self.process is not None:
+            columns = self.process(columns)
+        if self.writer is None:
+            self.writer = _open_writer(self.path + '.tmp', self.format, columns, self.metadata)
+        n = len(next(iter(columns.values())))
+        if n:
+            self.writer.write(columns)
+            self.rows += n
+
+    def flush(self) -> None:
+        """Append what the wrapped sink collected to the file and start it afresh."""
+        self._write(self.sink)
+        self.sink = self.sink.spawn()
+        self.pending = 0
+
+    def spawn(self):
+        """Plain sink for parsing another chunk in a worker; merge() writes its columns."""
+        return self.sink.spawn()
+
+    def merge(self, other) -> None:
+        """Append the samples a worker parsed from the following chunk of the log."""
+        self.flush()
+        self._write(other)
+
+    def keep_window(self, start: float, end: float) -> None:
+        """The window is applied while writing; see __init__."""
+        self.flush()
+
+    def close(self) -> int:
+        """Write what is left, finish the file and return the number of rows exported."""
+        self.flush()
+        self.writer.close()
+        os.replace(self.path + '.tmp', self.path)
+        return self.rows
+
+    def abort(self) -> None:
+        """Drop a partially written export."""
+        if self.writer is not None:
+            self.writer.close()
+            os.remove(self.path + '.tmp')
+            self.writer = None
+
+
+def export_log(filepath: str, sink, path: str, start: float = None, end: float = None, jobs: int = 1,
+               cache_dir: str = None, stats: ScanStats = None, process=None) -> int:
+    """Scan the log into ExportSink(sink, path) and return the number of rows written.
+    With start/end set (timestamps of sink.KIND), only that time window is read from the log;
+    cache_dir is only used for the time index then, parse results are never cached.
+    With jobs > 1 the log is parsed in chunks of at most EXPORT_CHUNK_SIZE bytes, at most `jobs`
+    of them in flight, each written in file order as soon as the chunks before it are.
+    """
+    export = ExportSink(sink, path, start, end, metadata={'source': os.path.abspath(filepath)}, process=process)
+    try:
+        if start is not None or end is not None:
+            scan_window(filepath, [export], sink.KIND, start, end, jobs=jobs, cache_dir=cache_dir, stats=stats,
+                        chunk_size=EXPORT_CHUNK_SIZE)
+        else:
+            scan_log(filepath, [export], jobs=jobs, stats=stats, chunk_size=EXPORT_CHUNK_SIZE)
+    except BaseException:
+        export.abort()
+        raise
+    return export.close()
+
+
+def main():
+    """Print the schema and row count of an export file."""
+    if len(sys.argv) != 2:
+        print(f"Usage: {os.path.basename(sys.argv[0])} EXPORT_FILE", file=sys.stderr)
+        sys.exit(1)
+    path = sys.argv[1]
+    try:
+        fmt = export_format(path)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if fmt == 'hdf5':
+        with h5py.File(path, 'r') as f:
+            print(dict(f.attrs))
+            for name, dataset in f.items():
+                print(f"  {name}: {dataset.dtype} x {dataset.shape[0]}")
+        return
+    if fmt == 'parquet':
+        table = pyarrow.parquet.read_table(path, memory_map=True)
+    else:
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+    print(table.schema)
+    print(f"{table.num_rows} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Live follow mode for the IVI log plot scripts.
+
+Tails a log that adb logcat or a serial capture is still writing, parses new
+lines incrementally and keeps the last N samples of every stream in fixed-size
+ring buffers. The figure is drawn once; afterwards only the line artists are
+redrawn and blitted, with a full redraw only when the Y range has to grow.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from ivi_log_engine import compression_of, scan_blocks
+
+# Largest chunk read from the log per poll, bounds memory if we fall behind
+FOLLOW_READ_SIZE = 1024 * 1024
+FOLLOW_POLL_INTERVAL = 0.02  # s
+FOLLOW_FPS = 25
+FOLLOW_WINDOW = 2000         # samples kept per stream
+
+
+def follow_blocks(filepath: str, poll_interval: float = FOLLOW_POLL_INTERVAL, from_start: bool = False):
+    """Yield raw blocks of complete new lines as they are appended to the log.
+    Yields an empty block when nothing new arrived, so callers can keep their UI alive.
+    Starts from the current end of the file unless from_start is set, skipping the rest of
+    a line still being written there; a truncated file, or one replaced by a new file
+    (rotated: different inode or device), is followed again from its beginning.
+    """
+    f = open(filepath, 'rb')
+    try:
+        skip_partial = False
+        if not from_start:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                skip_partial = f.read(1) != b'\n'
+        identity = os.fstat(f.fileno())
+        tail = b''
+        while True:
+            block = f.read(FOLLOW_READ_SIZE)
+            if not block:
+                try:
+                    st = os.stat(filepath)
+                    if (st.st_ino, st.st_dev) != (identity.st_ino, identity.st_dev) or st.st_size < f.tell():
+                        f.close()
+                        f = open(filepath, 'rb')
+                        identity = os.fstat(f.fileno())
+                        tail = b''
+                        skip_partial = False
+                except OSError:
+                    pass
+                yield b''
+                time.sleep(poll_interval)
+                continue
+            if skip_partial:
+                newline = block.find(b'\n')
+                if newline < 0:
+                    continue
+                block = block[newline + 1:]
+                skip_partial = False
+            block = tail + block
+            cut = block.rfind(b'\n') + 1
+            block, tail = block[:cut], block[cut:]
+            yield block
+    finally:
+        f.close()
+
+
+class RingBuffer:
+    """Fixed-size buffer of the last `capacity` rows of a multi-column stream.
+    Every row is written twice, `capacity` apart, so the window in order is always
+    one contiguous slice and view() never copies.
+    """
+
+    def __init__(self, capacity: int, columns: int):
+        self.capacity = capacity
+        self.data = np.zeros((2 * capacity, columns))
+        self.head = 0   # index of the oldest row in the window
+        self.size = 0
+        self.total = 0  # rows ever appended
+
+    def extend(self, rows: np.ndarray) -> None:
+        rows = rows[-self.capacity:]
+        n = len(rows)
+        if n == 0:
+            return
+        self.total += n
+        pos = (self.head + self.size) % self.capacity
+        first = min(n, self.capacity - pos)
+        for offset in (0, self.capacity):
+            self.data[offset + pos:offset + pos + first] = rows[:first]
+            self.data[offset:offset + n - first] = rows[first:]
+        overflow = max(0, self.size + n - self.capacity)
+        self.size = min(self.capacity, self.size + n)
+        self.head = (self.head + overflow) % self.capacity
+
+    def view(self) -> np.ndarray:
+        return self.data[self.head:self.head + self.size]
+
+
+class LivePlot:
+    """Blitted live figure; one panel per column of each named stream.
+    `streams` maps stream name to a list of (ylabel, color) panel specs.
+    """
+
+    def __init__(self, title: str, streams: dict, capacity: int = FOLLOW_WINDOW):
+        import matplotlib.pyplot as plt
+
+        self.plt = plt
+        self.buffers = {name: RingBuffer(capacity, len(panels)) for name, panels in streams.items()}
+        self.lines = {}
+        n_panels = sum(len(panels) for panels in streams.values())
+        self.fig, axes = plt.subplots(n_panels, 1, figsize=(12, 2 * n_panels + 1), sharex=True)
+        axes = np.atleast_1d(axes)
+        self.fig.suptitle(title)
+        panel_axes = iter(axes)
+        for name, panels in streams.items():
+            self.lines[name] = []
+            for ylabel, color in panels:
+                ax = next(panel_axes)
+                line, = ax.plot([], [], linewidth=0.8, color=color, animated=True)
+                ax.axhline(0, color='gray', linewidth=0.5, linestyle='--')
+                ax.set_ylabel(ylabel)
+                ax.set_xlim(0, capacity - 1)
+                ax.set_ylim(-1, 1)
+                ax.grid(True, alpha=0.4)
+                self.lines[name].append(line)
+        axes[-1].set_xlabel(f"Last {capacity} samples")
+        self.x = np.arange(capacity)
+        self.fig.tight_layout()
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        plt.show(block=False)
+        plt.pause(0.1)
+
+    def _on_draw(self, event) -> None:
+        """Full redraws (resize, rescale) invalidate the cached background."""
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self) -> None:
+        for lines in self.lines.values():
+            for line in lines:
+                line.axes.draw_artist(line)
+
+    def extend(self, name: str, rows: np.ndarray) -> None:
+        self.buffers[name].extend(rows)
+
+    def is_open(self) -> bool:
+        return self.plt.fignum_exists(self.fig.number)
+
+    def refresh(self) -> None:
+        """Blit new line data; rescale with one full redraw only if data left the Y range."""
+        rescale = False
+        for name, lines in self.lines.items():
+            window = self.buffers[name].view()
+            if not len(window):
+                continue
+            for col, line in enumerate(lines):
+                values = window[:, col]
+                line.set_data(self.x[:len(values)], values)
+                lo, hi = line.axes.get_ylim()
+                vmin, vmax = values.min(), values.max()
+                if vmin < lo or vmax > hi:
+                    margin = 0.25 * max(vmax - vmin, 1e-6)
+                    line.axes.set_ylim(min(lo, vmin - margin), max(hi, vmax + margin))
+                    rescale = True
+
+        canvas = self.fig.canvas
+        if rescale or self.background is None:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self._draw_lines()
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+
+def run_follow(filepath: str, sink, plot: LivePlot, extract, fps: float = FOLLOW_FPS,
+               from_start: bool = False) -> None:
+    """Feed new log bytes through a fresh copy of `sink` per batch and update the plot.
+    `extract(batch_sink)` returns {stream name: 2-D array of new rows}.
+    """
+    if compression_of(filepath):
+        raise ValueError(f"Cannot follow compressed log {filepath}")
+    frame_interval = 1.0 / fps
+    next_frame = 0.0
+    for block in follow_blocks(filepath, from_start=from_start):
+        if not plot.is_open():
+            break
+        if block:
+            batch = sink.spawn()
+            scan_blocks([block], [batch])
+            for name, rows in extract(batch).items():
+                plot.extend(name, rows)
+        now = time.monotonic()
+        if now >= next_frame:
+            plot.refresh()
+            next_frame = now + frame_interval
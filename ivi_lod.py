@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Level-of-detail viewer for long IVI log series.
+
+Every series gets a min/max pyramid: level k holds the minimum and maximum of
+each run of LOD_FACTOR**k samples, up to a level of at most LOD_TOP_BINS bins.
+The pyramid of a parsed log is stored next to its parse cache entry. When the
+visible x-range changes (pan, zoom, resize), the viewer picks the coarsest
+level that still gives about two points per pixel and slices out only the
+visible bins, so the points redrawn stay around the axis width in pixels
+whether the log holds a thousand samples or a hundred million.
+"""
+
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from ivi_log_cache import cache_path
+
+LOD_FACTOR = 4
+LOD_TOP_BINS = 2048
+LOD_VERSION = 1
+
+# Fewest points fetched per line, for axes that are still being laid out
+LOD_MIN_POINTS = 200
+
+
+def build_levels(values: np.ndarray, factor: int = LOD_FACTOR) -> list:
+    """[(mins, maxs)] of levels 1, 2, ...; NaN samples are ignored, all-NaN bins stay NaN."""
+    levels = []
+    mins = maxs = np.asarray(values, dtype=np.float64)
+    while len(mins) > LOD_TOP_BINS:
+        pad = -len(mins) % factor
+        if pad:
+            mins = np.concatenate((mins, np.full(pad, np.nan)))
+            maxs = np.concatenate((maxs, np.full(pad, np.nan)))
+        # Column by column: much faster than reducing along a short last axis
+        mins, maxs = mins.reshape(-1, factor), maxs.reshape(-1, factor)
+        level_mins, level_maxs = mins[:, 0].copy(), maxs[:, 0].copy()
+        for j in range(1, factor):
+            np.fmin(level_mins, mins[:, j], out=level_mins)
+            np.fmax(level_maxs, maxs[:, j], out=level_maxs)
+        mins, maxs = level_mins, level_maxs
+        levels.append((mins, maxs))
+    return levels
+
+
+class Pyramid:
+    """Min/max pyramid of an evenly spaced series, sample i sitting at x = x0 + i * step."""
+
+    def __init__(self, values: np.ndarray, x0: float = 0.0, step: float = 1.0, factor: int = LOD_FACTOR,
+                 levels: list = None):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.x0 = x0
+        self.step = step
+        self.factor = factor
+        self.levels = build_levels(self.values, factor) if levels is None else levels
+
+    def x_range(self) -> tuple:
+        return self.x0, self.x0 + max(len(self.values) - 1, 0) * self.step
+
+    def y_range(self) -> tuple:
+        mins, maxs = self.levels[-1] if self.levels else (self.values, self.values)
+        if not np.isfinite(mins).any():
+            return math.nan, math.nan
+        return float(np.nanmin(mins)), float(np.nanmax(maxs))
+
+    def level_for(self, samples: int, n_points: int) -> int:
+        """Coarsest level drawing `samples` samples in at most n_points points (2 per bin above level 0)."""
+        if samples <= n_points:
+            return 0
+        level = 1
+        while level < len(self.levels) and 2 * samples / self.factor ** level > n_points:
+            level += 1
+        return min(level, len(self.levels))
+
+    def fetch(self, x_lo: float, x_hi: float, n_points: int) -> tuple:
+        """(x, y, level) covering [x_lo, x_hi] in about n_points points."""
+        n = len(self.values)
+        lo = max(0, math.floor((x_lo - self.x0) / self.step) - 1)
+        hi = min(n, math.ceil((x_hi - self.x0) / self.step) + 2)
+        if hi <= lo:
+            return np.empty(0), np.empty(0), 0
+        level = self.level_for(hi - lo, n_points)
+        if level == 0:
+            return self.x0 + np.arange(lo, hi) * self.step, self.values[lo:hi], 0
+        size = self.factor ** level
+        mins, maxs = self.levels[level - 1]
+        b0, b1 = lo // size, min(len(mins), -(-hi // size))
+        centers = self.x0 + ((np.arange(b0, b1) + 0.5) * size - 0.5) * self.step
+        return np.repeat(centers, 2), np.column_stack((mins[b0:b1], maxs[b0:b1])).ravel(), level
+
+
+def lod_path(filepath: str, sinks: list, cache_dir: str) -> str:
+    """Pyramid file stored next to the parse cache entry of this log and sink configuration."""
+    return cache_path(filepath, sinks, cache_dir)[:-len('.npz')] + '.lod.npz'
+
+
+def _meta(filepath: str, series: dict, factor: int) -> dict:
+    st = os.stat(filepath)
+    return {'version': LOD_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'factor': factor,
+            'lengths': {str(name): len(values) for name, values in series.items()}}
+
+
+def load_pyramids(series: dict, filepath: str, path: str = None, factor: int = LOD_FACTOR) -> dict:
+    """{name: Pyramid} of {name: values} sample-index series parsed from `filepath`.
+    With `path` set, pyramids stored there for the same log state are reused; otherwise
+    they are built and stored.
+    """
+    meta = _meta(filepath, series, factor)
+    if path and os.path.exists(path):
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                if json.loads(str(npz['meta'])) == meta:
+                    return {name: Pyramid(values, factor=factor,
+                                          levels=[(npz[f'{name}/{k}/min'], npz[f'{name}/{k}/max'])
+                                                  for k in range(int(npz[f'{name}/levels']))])
+                            for name, values in series.items()}
+        except (OSError, ValueError, KeyError):
+            pass
+    pyramids = {name: Pyramid(values, factor=factor) for name, values in series.items()}
+    if path:
+        arrays = {'meta': np.array(json.dumps(meta))}
+        for name, pyramid in pyramids.items():
+            arrays[f'{name}/levels'] = np.array(len(pyramid.levels))
+            for k, (mins, maxs) in enumerate(pyramid.levels):
+                arrays[f'{name}/{k}/min'] = mins
+                arrays[f'{name}/{k}/max'] = maxs
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.savez(path + '.temp.npz', **arrays)
+            os.replace(path + '.temp.npz', path)
+        except OSError as e:
+            print(f"Warning: could not write pyramid {path}: {e}", file=sys.stderr)
+    return pyramids
+
+
+def series_pyramid(ts: np.ndarray, values: np.ndarray) -> Pyramid:
+    """Pyramid of a series at evenly spaced positions `ts` (e.g. resampled sample indices)."""
+    return place(Pyramid(values), ts)
+
+
+def place(pyramid: Pyramid, ts: np.ndarray) -> Pyramid:
+    """Put the pyramid's samples at positions `ts` (e.g. timestamps of an evenly sampled series):
+    from ts[0], at their mean spacing."""
+    pyramid.x0 = float(ts[0]) if len(ts) else 0.0
+    pyramid.step = float(ts[-1] - ts[0]) / (len(ts) - 1) if len(ts) > 1 and ts[-1] > ts[0] else 1.0
+    return pyramid
+
+
+class LodViewer:
+    """Interactive figure whose lines are re-fetched from their pyramids whenever the x-range changes.
+    `panels` is a list of (ylabel, [(label, pyramid, color), ...]); a label of None keeps the line
+    out of the legend.
+    """
+
+    def __init__(self, panels: list, title: str, xlabel: str = "Sample index", figsize: tuple = (12, 8)):
+        import matplotlib.pyplot as plt
+
+        self.fig, axes = plt.subplots(len(panels), 1, figsize=figsize, sharex=True)
+        self.axes = np.atleast_1d(axes)
+        self.lines = []
+        x_lo, x_hi = math.inf, -math.inf
+        for ax, (ylabel, series) in zip(self.axes, panels):
+            y_lo, y_hi = math.inf, -math.inf
+            for label, pyramid, color in series:
+                line, = ax.plot([], [], linewidth=0.6, color=color, label=label)
+                self.lines.append((line, pyramid))
+                lo, hi = pyramid.x_range()
+                x_lo, x_hi = min(x_lo, lo), max(x_hi, hi)
+                lo, hi = pyramid.y_range()
+                if np.isfinite(lo):
+                    y_lo, y_hi = min(y_lo, lo), max(y_hi, hi)
+            if y_lo <= y_hi:
+                margin = 0.05 * (y_hi - y_lo) or 1.0
+                ax.set_ylim(y_lo - margin, y_hi + margin)
+            if any(label for label, _, _ in series):
+                ax.legend(loc='upper right')
+            ax.set_ylabel(ylabel)
+            ax.grid(True, alpha=0.4)
+        self.axes[0].set_title(title)
+        self.axes[-1].set_xlabel(xlabel)
+        self.status = self.fig.text(0.995, 0.005, '', ha='right', va='bottom', fontsize=7, color='gray')
+        self.fig.tight_layout()
+
+        self.view = None
+        self.fetch_ms = 0.0
+        for ax in self.axes:
+            ax.callbacks.connect('xlim_changed', self.update)
+        self.fig.canvas.mpl_connect('resize_event', lambda event: self.update(force=True))
+        self.axes[0].set_xlim(x_lo, x_hi if x_hi > x_lo else x_lo + 1)
+
+    def update(self, ax=None, force: bool = False) -> None:
+        """Fetch the visible slice of every line at the level matching the axis width."""
+        lo, hi = self.axes[0].get_xlim()
+        if not force and (lo, hi) == self.view:
+            return
+        self.view = (lo, hi)
+        started = time.perf_counter()
+        n_points = max(LOD_MIN_POINTS, 2 * int(self.axes[0].bbox.width))
+        levels = set()
+        for line, pyramid in self.lines:
+            x, y, level = pyramid.fetch(lo, hi, n_points)
+            line.set_data(x, y)
+            levels.add(level)
+        self.fetch_ms = (time.perf_counter() - started) * 1000
+        self.status.set_text(f"level {'/'.join(map(str, sorted(levels)))}, fetched in {self.fetch_ms:.1f} ms")
+        self.fig.canvas.draw_idle()
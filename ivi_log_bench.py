@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Parser benchmark for the IVI log plot scripts.
+
+Writes seeded synthetic logs for every record format, at a configurable size
+and share of unrelated logcat noise lines, with occasional nan/inf values:
+  Sensor: 1, Received data :: -1.378231:0.513437:9.759488, 5134924768143
+  onEventSendProbeData() : [100] 1777029439,35638178,139758437,52.080002,...,1
+  sensormanager: [UBX-NAV-PVAT iTOW=100200 ... vehRoll=0.14072 vehPitch=4.02714 vehHeading=56.2498 ...]
+then times each script's parse_log() on its log in a fresh process: lines/s,
+MB/s and peak RSS. Cold start is tracked as well: the cumulative import time of
+each script under `python -X importtime`, which must not pull in matplotlib.
+Results are written as JSON; --compare flags parsers that got slower than in an
+earlier result file, e.g. one saved on the previous commit. --import-only skips
+the parse runs, as a quick start-up check for automation.
+"""
+
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from ivi_log_engine import ScanStats
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except Exception:
+    resource = None
+    RESOURCE_AVAILABLE = False
+
+# Bump when the generators change, so stale benchmark logs are written again
+GENERATOR_VERSION = 1
+RESULTS_VERSION = 1
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), 'ivi_log_bench')
+WRITE_BATCH_LINES = 10000
+
+# Share of records with a NaN/Inf value, which the parsers must drop
+INVALID_RATIO = 0.02
+# Slowdown in lines/s tolerated by --compare before it reports a regression
+REGRESSION_TOLERANCE = 0.10
+# Import times are in the tens of ms and noisier: allowed growth, relative and absolute (ms)
+IMPORT_TOLERANCE = 0.25
+IMPORT_SLACK_MS = 5.0
+# Fresh interpreters started per import measurement; the fastest is reported
+IMPORT_REPEAT = 10
+# Modules the scripts must not import at start-up
+STARTUP_FORBIDDEN = ('matplotlib',)
+
+NOISE_TAGS = ('ActivityManager', 'chatty', 'WifiHAL', 'BtGatt', 'AudioFlinger', 'CarService', 'SurfaceFlinger')
+NOISE_MESSAGES = (
+    'Start proc {n}:com.example.app{k}/u0a{k} for service',
+    'uid=1000(system) identical {k} lines',
+    'Received data on handle 0x{n:04x} len={k}',
+    'onEventSendProbeData queue depth {k}',
+    'setVolume stream={k} index={n}',
+    'Sensor: {k} registered, rate {n} us',
+    'frame {n} took {k} ms, dropped',
+)
+
+
+def _clock(state: dict) -> str:
+    """Logcat date/time prefix, advancing the fake wall clock by a few ms per line."""
+    state['ms'] += 3
+    s, ms = divmod(state['ms'], 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"10-18 {h % 24:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+def _maybe_invalid(rng: random.Random, values: list) -> list:
+    if rng.random() < INVALID_RATIO:
+        values[rng.randrange(len(values))] = rng.choice((float('nan'), float('inf'), float('-inf')))
+    return values
+
+
+def imu_record(rng: random.Random, state: dict) -> str:
+    state['ns'] += 2500000
+    sensor_id = rng.choice((1, 4, 1, 4, 2, 3))
+    x, y, z = _maybe_invalid(rng, [rng.gauss(0, 2), rng.gauss(0, 2), rng.gauss(9.81, 0.5)])
+    return (f"{_clock(state)}  1203  1377 I sensors-hal: "
+            f"Sensor: {sensor_id}, Received data :: {x:.6f}:{y:.6f}:{z:.6f}, {state['ns']}")
+
+
+def probe_record(rng: random.Random, state: dict) -> str:
+    state['epoch'] += 1
+    state['speed'] = max(0.0, state['speed'] + rng.gauss(0, 0.5))
+    fields = _maybe_invalid(rng, [
+        rng.gauss(52.0, 0.1),        # altitude
+        state['speed'],              # speed
+        rng.uniform(0, 360),         # heading
+        rng.gauss(0, 1),             # acceleration
+        rng.gauss(0, 1),             # linear acceleration
+    ])
+    name = rng.choice(('onEventSendProbeData', 'onEventSendProbeData', 'OnEventSendProbeData'))
+    values = ','.join(f"{v:.6f}" for v in fields)
+    return (f"{_clock(state)}  2210  2290 D ProbeService: {name}() : [100] "
+            f"{state['epoch']},{rng.randint(35000000, 36000000)},{rng.randint(139000000, 140000000)},"
+            f"{values},{rng.randint(0, 12)},1")
+
+
+def pvat_record(rng: random.Random, state: dict) -> str:
+    state['itow'] += 200
+    roll, pitch, heading = _maybe_invalid(rng, [rng.gauss(0, 2), rng.gauss(0, 3), rng.uniform(0, 360)])
+    return (f"{_clock(state)}  3021  3050 I sensormanager: [UBX-NAV-PVAT iTOW={state['itow']} version=0 "
+            f"valid=55 year=2026 month=10 day=18 hour=12 min=0 sec=0 tAcc=20 nano=0 fixType=3 flags=1 "
+            f"numSV={rng.randint(6, 20)} lon={rng.uniform(139, 140):.7f} lat={rng.uniform(35, 36):.7f} "
+            f"height={rng.gauss(52000, 100):.0f} hMSL={rng.gauss(12000, 100):.0f} hAcc=800 vAcc=1200 "
+            f"velN={rng.gauss(0, 500):.0f} velE={rng.gauss(0, 500):.0f} velD={rng.gauss(0, 50):.0f} "
+            f"gSpeed={rng.randint(0, 3000)} vehRoll={roll:.5f} vehPitch={pitch:.5f} vehHeading={heading:.4f} "
+            f"motHeading={rng.uniform(0, 360):.4f} accRoll=0.5 accPitch=0.5 accHeading=1.2]")
+
+
+def noise_record(rng: random.Random, state: dict) -> str:
+    message = rng.choice(NOISE_MESSAGES).format(n=rng.randrange(65536), k=rng.randrange(1000))
+    return f"{_clock(state)}  {rng.randint(100, 9999):5d}  {rng.randint(100, 9999):5d} I {rng.choice(NOISE_TAGS)}: {message}"
+
+
+GENERATORS = {
+    'imu': imu_record,
+    'probe': probe_record,
+    'pvat': pvat_record,
+}
+
+
+def write_log(path: str, fmt: str, size_bytes: int, noise: float, seed: int) -> int:
+    """Write a synthetic log of about size_bytes; a `noise` share of lines are unrelated logcat lines.
+    Returns the number of lines written. The same arguments always write the same bytes.
+    """
+    rng = random.Random(seed)
+    record = GENERATORS[fmt]
+    state = {'ms': 0, 'ns': 5134924768143, 'epoch': 1777029439, 'itow': 100000, 'speed': 10.0}
+    written = 0
+    lines = 0
+    temp_path = path + '.temp'
+    with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+        while written < size_bytes:
+            batch = '\n'.join(
+                noise_record(rng, state) if rng.random() < noise else record(rng, state)
+                for _ in range(WRITE_BATCH_LINES)
+            ) + '\n'
+            f.write(batch)
+            written += len(batch)
+            lines += WRITE_BATCH_LINES
+    os.replace(temp_path, path)
+    return lines
+
+
+def bench_log(workdir: str, fmt: str, size_mb: float, noise: float, seed: int) -> str:
+    """Path of the benchmark log for these parameters, generated on first use."""
+    name = f"bench_v{GENERATOR_VERSION}_{fmt}_{size_mb:g}MB_noise{noise:g}_seed{seed}.log"
+    path = os.path.join(workdir, name)
+    if not os.path.exists(path):
+        os.makedirs(workdir, exist_ok=True)
+        print(f"Generating {path} ...", file=sys.stderr)
+        write_log(path, fmt, int(size_mb * 1024 ** 2), noise, seed)
+    return path
+
+
+def _imu_samples(result) -> int:
+    accel, gyro = result
+    return len(accel['x']) + len(gyro['x'])
+
+
+def _probe_samples(result) -> int:
+    return len(next(iter(result.values()))[1])
+
+
+def _pvat_samples(result) -> int:
+    return len(result[0])
+
+
+# Parser module -> (log format, extra parse_log() arguments, samples in its result)
+BENCHMARKS = {
+    'linear_ivi_sensor': ('imu', (), _imu_samples),
+    'linear_ivi_acceleration': ('probe', ([7, 6, 4, 3],), _probe_samples),
+    'linear_veh_pitchrollyaw': ('pvat', (), _pvat_samples),
+}
+
+
+def _peak_rss_mb(children: bool = False) -> float:
+    """Peak resident set size in MiB of this process or of its finished children, None if unknown.
+    ru_maxrss is in KiB on Linux and in bytes on macOS.
+    """
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_parser(task) -> dict:
+    """Time one parse_log() call; runs in a fresh process so peak RSS belongs to this parse alone."""
+    module_name, logfile, jobs = task
+    _, extra_args, count_samples = BENCHMARKS[module_name]
+    module = importlib.import_module(module_name)
+    import_rss = _peak_rss_mb()
+    stats = ScanStats()
+    started = time.perf_counter()
+    result = module.parse_log(logfile, *extra_args, jobs=jobs, stats=stats)
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': seconds,
+        'lines': stats.lines,
+        'bytes': stats.bytes,
+        'samples': count_samples(result),
+        'import_rss_mb': import_rss,
+        'peak_rss_mb': _peak_rss_mb(),
+        'workers_peak_rss_mb': _peak_rss_mb(children=True),
+    }
+
+
+def run_benchmark(module_name: str, logfile: str, jobs: int = 1, repeat: int = 3) -> dict:
+    """Best of `repeat` runs of one parser on one log, each in a freshly spawned process."""
+    runs = []
+    context = multiprocessing.get_context('spawn')
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            runs.append(pool.submit(_run_parser, (module_name, logfile, jobs)).result())
+    best = min(runs, key=lambda run: run['seconds'])
+    rss = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    return {
+        'log': os.path.basename(logfile),
+        'lines': best['lines'],
+        'bytes': best['bytes'],
+        'samples': best['samples'],
+        'seconds': best['seconds'],
+        'all_seconds': [run['seconds'] for run in runs],
+        'lines_per_s': best['lines'] / best['seconds'],
+        'mb_per_s': best['bytes'] / 1e6 / best['seconds'],
+        'import_rss_mb': best['import_rss_mb'],
+        'peak_rss_mb': max(rss) if rss else None,
+        'workers_peak_rss_mb': best['workers_peak_rss_mb'],
+    }
+
+
+def measure_import(module_name: str, repeat: int = IMPORT_REPEAT) -> dict:
+    """Best cumulative `python -X importtime` time (ms) of importing one script in a fresh
+    interpreter, and the forbidden modules (see STARTUP_FORBIDDEN) that import pulled in.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best, forbidden = None, set()
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                             capture_output=True, text=True, cwd=here, timeout=120)
+        if out.returncode != 0:
+            raise RuntimeError(f"import {module_name} failed: {out.stderr.strip().splitlines()[-1:]}")
+        for line in out.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line.split('|')
+            name = name.strip()
+            if name.split('.')[0] in STARTUP_FORBIDDEN:
+                forbidden.add(name.split('.')[0])
+            if name == module_name:
+                ms = int(cumulative) / 1000
+                best = ms if best is None else min(best, ms)
+    return {'import_ms': best, 'forbidden_imports': sorted(forbidden)}
+
+
+def git_commit() -> str:
+    """Short hash of the checked-out commit of this repository, or None."""
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(previous: dict, current: dict, tolerance: float = REGRESSION_TOLERANCE) -> list:
+    """Print lines/s of both result sets side by side; return the parsers that regressed."""
+    if previous.get('config') != current.get('config'):
+        print("Warning: benchmark configurations differ, comparison may be meaningless", file=sys.stderr)
+    regressions = []
+    for name, result in current['results'].items():
+        old = previous.get('results', {}).get(name)
+        if old is None:
+            continue
+        if 'lines_per_s' in result and 'lines_per_s' in old:
+            change = result['lines_per_s'] / old['lines_per_s'] - 1
+            flag = ''
+            if change < -tolerance:
+                flag = '  REGRESSION'
+                regressions.append(name)
+            print(f"  {name:26s} {old['lines_per_s']:>12,.0f} -> {result['lines_per_s']:>12,.0f} lines/s "
+                  f"({change:+.1%}){flag}")
+        if old.get('import_ms') is not None and result.get('import_ms') is not None:
+            flag = ''
+            if result['import_ms'] > old['import_ms'] * (1 + IMPORT_TOLERANCE) + IMPORT_SLACK_MS:
+                flag = '  REGRESSION'
+                regressions.append(name)
+            print(f"  {name:26s} {old['import_ms']:>9.1f} -> {result['import_ms']:>9.1f} ms import{flag}")
+    return list(dict.fromkeys(regressions))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark every IVI log parser on seeded synthetic logs and write JSON results."
+    )
+    parser.add_argument(
+        '--parsers', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+        help="Parsers to benchmark (default: all)"
+    )
+    parser.add_argument(
+        '--size-mb', type=float, default=100,
+        help="Size of each generated log in MiB (default: 100)"
+    )
+    parser.add_argument(
+        '--noise', type=float, default=0.5,
+        help="Share of unrelated logcat lines in the generated logs, 0..1 (default: 0.5)"
+    )
+    parser.add_argument(
+        '--seed', type=int, default=1,
+        help="Random seed of the log generators (default: 1)"
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help="Worker processes passed to parse_log() (0 = all cores, default: 1)"
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="Runs per parser, the fastest is reported (default: 3)"
+    )
+    parser.add_argument(
+        '--workdir', default=BENCH_DIR,
+        help=f"Directory for the generated logs, reused across runs (default: {BENCH_DIR})"
+    )
+    parser.add_argument(
+        '--output', default='ivi_log_bench.json',
+        help="JSON file to write the results to (default: ivi_log_bench.json)"
+    )
+    parser.add_argument(
+        '--import-only', action='store_true',
+        help="Only measure the cold-start import time of each script, without generating logs"
+    )
+    parser.add_argument(
+        '--compare', default=None,
+        help="Earlier results JSON; exit with status 1 if any parser is more than "
+             f"{REGRESSION_TOLERANCE:.0%} slower"
+    )
+    args = parser.parse_args()
+
+    if not 0 <= args.noise < 1:
+        print("Error: --noise must be in [0, 1)", file=sys.stderr)
+        sys.exit(1)
+
+    config = {'size_mb': args.size_mb, 'noise': args.noise, 'seed': args.seed, 'jobs': args.jobs,
+              'generator_version': GENERATOR_VERSION}
+    results = {}
+    startup_failures = []
+    for name in args.parsers:
+        result = {}
+        if not args.import_only:
+            fmt = BENCHMARKS[name][0]
+            logfile = bench_log(args.workdir, fmt, args.size_mb, args.noise, args.seed)
+            result = run_benchmark(name, logfile, jobs=args.jobs, repeat=args.repeat)
+            rss = f"{result['peak_rss_mb']:.0f} MiB" if result['peak_rss_mb'] is not None else "n/a"
+            print(f"{name:26s} {result['lines_per_s']:>12,.0f} lines/s  {result['mb_per_s']:7.1f} MB/s  "
+                  f"peak RSS {rss}  ({result['samples']} samples in {result['seconds']:.2f} s)")
+        result.update(measure_import(name))
+        results[name] = result
+        print(f"{name:26s} {result['import_ms']:>9.1f} ms import")
+        if result['forbidden_imports']:
+            print(f"  Error: importing {name} loads {', '.join(result['forbidden_imports'])}", file=sys.stderr)
+            startup_failures.append(name)
+
+    report = {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': config,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    failed = bool(startup_failures)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        print(f"Compared with {args.compare} (commit {previous.get('commit')}):")
+        if compare(previous, report):
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of parsed IVI log columns.
+
+Each (log, sink configuration) pair is stored as one uncompressed .npz file in
+the cache directory, keyed on the log's absolute path, size, mtime and hashes
+of its head and of the last parsed bytes. When a log has only grown since it
+was cached, just the new bytes are parsed and appended. The cache directory is
+trimmed least-recently-used first to stay under a size cap.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import argparse
+
+import numpy as np
+
+from ivi_log_engine import ScanStats, compression_of, scan_log
+
+CACHE_DIR = os.environ.get('IVI_LOG_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'ivi_logs'))
+CACHE_MAX_BYTES = int(os.environ.get('IVI_LOG_CACHE_MAX_BYTES', 4 * 1024 ** 3))
+CACHE_VERSION = 2
+
+# Bytes hashed at the head of the log and before the last parsed offset
+HASH_WINDOW = 64 * 1024
+
+
+def _hash_range(f, start: int, end: int) -> str:
+    f.seek(start)
+    return hashlib.sha1(f.read(end - start)).hexdigest()
+
+
+def _complete_end(f, size: int) -> int:
+    """Offset just past the last newline; a partial last line may still be growing."""
+    pos = size
+    while pos > 0:
+        step = min(HASH_WINDOW, pos)
+        f.seek(pos - step)
+        cut = f.read(step).rfind(b'\n')
+        if cut >= 0:
+            return pos - step + cut + 1
+        pos -= step
+    return 0
+
+
+def cache_path(filepath: str, sinks: list, cache_dir: str = None) -> str:
+    """Cache file for this log and sink configuration."""
+    key = os.path.abspath(filepath) + '|' + '|'.join(sink.cache_key() for sink in sinks)
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npz'
+    return os.path.join(cache_dir or CACHE_DIR, name)
+
+
+def _load(path: str):
+    """Return (meta, {sink_no: state}) or None if the entry is missing or unreadable."""
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            if meta.get('version') != CACHE_VERSION:
+                return None
+            states = {}
+            for key in npz.files:
+                if key == 'meta':
+                    continue
+                sink_no, name = key.split('/', 1)
+                states.setdefault(int(sink_no), {})[name] = npz[key]
+            return meta, states
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save(path: str, meta: dict, sinks: list) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {'meta': np.array(json.dumps(meta))}
+    for sink_no, sink in enumerate(sinks):
+        for name, values in sink.state().items():
+            arrays[f'{sink_no}/{name}'] = values
+    temp_path = path + '.temp.npz'
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+
+def trim_cache(cache_dir: str = None, max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """Delete least recently used cache files until the directory fits in max_bytes."""
+    cache_dir = cache_dir or CACHE_DIR
+    try:
+        entries = [e for e in os.scandir(cache_dir) if e.is_file() and e.name.endswith('.npz')]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    total = 0
+    for entry in entries:
+        total += entry.stat().st_size
+        if total > max_bytes:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def scan_log_cached(filepath: str, sinks: list, jobs: int = 1, cache_dir: str = None, stats: ScanStats = None) -> list:
+    """Like scan_log(), but reuse and extend a cached parse of the same log.
+    Compressed logs are only reused when unchanged; any change re-parses them.
+    """
+    path = cache_path(filepath, sinks, cache_dir)
+    st = os.stat(filepath)
+    compressed = compression_of(filepath) is not None
+
+    with open(filepath, 'rb') as f:
+        head_end = min(HASH_WINDOW, st.st_size)
+        head_hash = _hash_range(f, 0, head_end)
+        end = st.st_size if compressed else _complete_end(f, st.st_size)
+
+        start = 0
+        cached = _load(path)
+        if cached is not None:
+            meta, states = cached
+            offset = meta['offset']
+            unchanged = meta['size'] == st.st_size and meta['mtime_ns'] == st.st_mtime_ns
+            grown = not compressed and meta['tail_hash'] == _hash_range(f, max(0, offset - HASH_WINDOW), offset)
+            if meta['head_hash'] == head_hash and offset <= end and (unchanged or grown):
+                for sink_no, sink in enumerate(sinks):
+                    sink.load_state(states[sink_no])
+                start = offset
+            else:
+                cached = None
+
+        tail_hash = _hash_range(f, max(0, end - HASH_WINDOW), end)
+
+    if start < end:
+        scan_log(filepath, sinks, jobs=jobs, start=start, end=end, stats=stats)
+    if cached is None or start < end:
+        meta = {
+            'version': CACHE_VERSION,
+            'path': os.path.abspath(filepath),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'offset': end,
+            'head_hash': head_hash,
+            'tail_hash': tail_hash,
+        }
+        try:
+            _save(path, meta, sinks)
+            trim_cache(cache_dir)
+        except OSError as e:
+            print(f"Warning: could not write parse cache {path}: {e}", file=sys.stderr)
+    else:
+        # Mark as recently used for the LRU trim
+        os.utime(path)
+
+    # A partial last line is parsed but not cached, it may still be growing
+    if end < st.st_size:
+        scan_log(filepath, sinks, start=end, end=st.st_size, stats=stats)
+    return sinks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the parsed IVI log cache.")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=f"Cache directory (default: {CACHE_DIR})")
+    parser.add_argument('--clear', action='store_true', help="Delete all cached parses")
+    parser.add_argument(
+        '--max-bytes', type=int, default=CACHE_MAX_BYTES,
+        help=f"Trim the cache to this size, least recently used first (default: {CACHE_MAX_BYTES})"
+    )
+    args = parser.parse_args()
+
+    trim_cache(args.cache_dir, 0 if args.clear else args.max_bytes)
+    try:
+        entries = [e for e in os.scandir(args.cache_dir) if e.name.endswith('.npz')]
+    except FileNotFoundError:
+        entries = []
+    total = sum(e.stat().st_size for e in entries)
+    print(f"{args.cache_dir}: {len(entries)} cached parses, {total / 1024 ** 2:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Sparse byte-offset time index for IVI logs.
+
+The log is cut into newline-aligned blocks of about INDEX_BLOCK_SIZE bytes and,
+for every record type, the smallest and largest timestamp seen in each block is
+recorded. A time-window query then seeks straight to the blocks that can hold
+matching samples and parses only those bytes. The index is built once per log,
+stored next to the parse cache, and extended when the log grows.
+
+Timestamps are in each record type's own units:
+  imu    trailing "Received data" timestamp (ns)
+  probe  onEventSendProbeData() field 0 (epoch s)
+  pvat   UBX-NAV-PVAT iTOW (ms)
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import argparse
+
+import numpy as np
+
+from ivi_log_cache import CACHE_DIR
+from ivi_log_engine import ScanStats, compression_of, scan_log
+
+INDEX_BLOCK_SIZE = 1024 * 1024
+INDEX_VERSION = 1
+HASH_WINDOW = 64 * 1024
+
+# Timestamp of each record type, matched on raw bytes of a whole block
+TIME_PATTERNS = {
+    'imu': re.compile(rb'Received data\s*::\s*[\w\.\-\+]+:[\w\.\-\+]+:[\w\.\-\+]+,\s*(\d+)'),
+    'probe': re.compile(rb'onEventSendProbeData\(\)\s*:\s*\[\d+\]\s*([\d\.\-]+),', re.IGNORECASE),
+    'pvat': re.compile(rb'\[UBX-NAV-PVAT[^\]\n]*?iTOW=(\d+)'),
+}
+
+
+def index_path(filepath: str, cache_dir: str) -> str:
+    name = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest() + '.index.npz'
+    return os.path.join(cache_dir, name)
+
+
+def _head_hash(f) -> str:
+    f.seek(0)
+    return hashlib.sha1(f.read(HASH_WINDOW)).hexdigest()
+
+
+def _index_blocks(f, start: int, size: int):
+    """Yield (offset, {kind: (tmin, tmax)}) for newline-aligned blocks from start to size."""
+    f.seek(start)
+    pos = start
+    while pos < size:
+        block = f.read(INDEX_BLOCK_SIZE) + f.readline()
+        if not block:
+            break
+        bounds = {}
+        for kind, pattern in TIME_PATTERNS.items():
+            found = pattern.findall(block)
+            if found:
+                values = np.array(found).astype(np.float64)
+                bounds[kind] = (values.min(), values.max())
+        yield pos, bounds
+        pos += len(block)
+
+
+def build_index(filepath: str, cache_dir: str = None) -> dict:
+    """Load the time index of a log, building or extending it as needed."""
+    st = os.stat(filepath)
+    path = index_path(filepath, cache_dir) if cache_dir else None
+    with open(filepath, 'rb') as f:
+        head_hash = _head_hash(f)
+        index = None
+        if path and os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as npz:
+                    index = {key: npz[key] for key in npz.files}
+                meta = json.loads(str(index['meta']))
+                if meta['version'] != INDEX_VERSION or meta['head_hash'] != head_hash or meta['size'] > st.st_size:
+                    index = None
+                elif meta['size'] == st.st_size and meta['mtime_ns'] == st.st_mtime_ns:
+                    return index
+            except (OSError, ValueError, KeyError):
+                index = None
+
+        offsets = []
+        bounds = {kind: ([], []) for kind in TIME_PATTERNS}
+        start = 0
+        if index is not None and len(index['offsets']) > 1:
+            # The last block may have ended on a partial line; index it again
+            keep = len(index['offsets']) - 2
+            offsets = list(index['offsets'][:keep])
+            for kind, (tmin, tmax) in bounds.items():
+                tmin.extend(index[f'{kind}_min'][:keep])
+                tmax.extend(index[f'{kind}_max'][:keep])
+            start = int(index['offsets'][keep])
+
+        for offset, found in _index_blocks(f, start, st.st_size):
+            offsets.append(offset)
+            for kind, (tmin, tmax) in bounds.items():
+                lo, hi = found.get(kind, (np.nan, np.nan))
+                tmin.append(lo)
+                tmax.append(hi)
+        offsets.append(st.st_size)
+
+    meta = {'version': INDEX_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'head_hash': head_hash}
+    index = {'meta': np.array(json.dumps(meta)), 'offsets': np.array(offsets, dtype=np.int64)}
+    for kind, (tmin, tmax) in bounds.items():
+        index[f'{kind}_min'] = np.array(tmin, dtype=np.float64)
+        index[f'{kind}_max'] = np.array(tmax, dtype=np.float64)
+    if path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(path + '.temp.npz', **index)
+            os.replace(path + '.temp.npz', path)
+        except OSError as e:
+            print(f"Warning: could not write time index {path}: {e}", file=sys.stderr)
+    return index
+
+
+def find_range(index: dict, kind: str, start: float, end: float):
+    """Byte range (lo, hi) covering every block that may hold `kind` samples in [start, end]."""
+    overlap = np.flatnonzero((index[f'{kind}_max'] >= start) & (index[f'{kind}_min'] <= end))
+    if not len(overlap):
+        return None
+    offsets = index['offsets']
+    return int(offsets[overlap[0]]), int(offsets[overlap[-1] + 1])
+
+
+def scan_window(filepath: str, sinks: list, kind: str, start: float = None, end: float = None,
+                jobs: int = 1, cache_dir: str = None, stats: ScanStats = None, chunk_size: int = None) -> list:
+    """Parse only the part of the log whose `kind` timestamps fall in [start, end].
+    Compressed logs cannot be seeked, so they are parsed whole and then trimmed.
+    `chunk_size` is passed on to scan_log.
+    """
+    start = -np.inf if start is None else start
+    end = np.inf if end is None else end
+    if compression_of(filepath):
+        scan_log(filepath, sinks, stats=stats)
+        for sink in sinks:
+            sink.keep_window(start, end)
+        return sinks
+    byte_range = find_range(build_index(filepath, cache_dir), kind, start, end)
+    if byte_range is not None:
+        scan_log(filepath, sinks, jobs=jobs, start=byte_range[0], end=byte_range[1], stats=stats,
+                 chunk_size=chunk_size)
+    for sink in sinks:
+        sink.keep_window(start, end)
+    return sinks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the time index of an IVI log and print its time spans.")
+    parser.add_argument('logfile', help="Path to the log file")
+    parser.add_argument(
+        '--cache-dir', default=CACHE_DIR,
+        help=f"Directory to store the index in (default: {CACHE_DIR})"
+    )
+    args = parser.parse_args()
+
+    index = build_index(args.logfile, args.cache_dir)
+    print(f"{len(index['offsets']) - 1} blocks of ~{INDEX_BLOCK_SIZE // 1024} KiB")
+    for kind in TIME_PATTERNS:
+        tmin, tmax = index[f'{kind}_min'], index[f'{kind}_max']
+        if np.isnan(tmin).all():
+            print(f"  {kind}: no timestamps")
+        else:
+            print(f"  {kind}: {np.nanmin(tmin):.0f} .. {np.nanmax(tmax):.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Time-aligned merge of the IMU, probe and UBX-NAV-PVAT streams of an IVI log.
+
+Each script plots against its own sample counter because the streams arrive
+at different rates. This join stage puts all of them on one table, on one
+clock. Probe field 0 is UTC epoch seconds and iTOW is GPS time of week (ms,
+unwrapped at the weekly rollover), so PVAT is put on UTC with the GPS epoch,
+week and leap seconds. The IMU timestamps count from the unit's boot, so that
+clock is anchored by the median difference to the probe/PVAT samples next to
+its samples in the log (byte offsets kept while parsing). Times are seconds
+since the earliest sample of any stream, plus an optional per-stream offset as
+a manual correction. Each stream is then matched onto the rows of a base
+stream (or a regular grid) by one sorted merge of the two timelines:
+  nearest   closest sample within the tolerance
+  previous  last sample at or before the row, within the tolerance
+  linear    interpolation between the bracketing samples, both within the tolerance
+Rows without a match get NaN.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+from ivi_log_cache import CACHE_DIR, scan_log_cached
+from ivi_log_engine import (PVAT_FIELDS, ImuSink, OffsetSink, ProbeSink, PvatSink, ScanStats, parse_field_spec,
+                            scan_log, to_numpy, unique_field_specs)
+
+# Seconds per unit of the timestamp column of each stream
+TIME_SCALES = {'imu': 1e-9, 'probe': 1.0, 'pvat': 1e-3}
+
+MERGE_METHODS = ('nearest', 'previous', 'linear')
+MERGE_DEFAULT = 'linear'
+# Largest distance (s) between a row and the sample(s) it is matched with
+MERGE_TOLERANCE = 1.0
+
+# Streams a table can be based on; 'grid' is a regular clock at --rate
+MERGE_BASES = ('accel', 'gyro', 'probe', 'pvat', 'grid')
+MERGE_STREAMS = ('accel', 'gyro', 'probe', 'pvat')
+
+# Record type (clock) of each stream
+STREAM_KINDS = {'accel': 'imu', 'gyro': 'imu', 'probe': 'probe', 'pvat': 'pvat'}
+
+# Plot axis label of each record type's own clock, in seconds
+CLOCK_LABELS = {'imu': "IMU clock (s)", 'probe': "UTC epoch (s)", 'pvat': "GPS time of week (s)"}
+
+# Default probe fields of linear_ivi_acceleration (linear accel, accel, speed, altitude)
+MERGE_PROBE_FIELDS = (7, 6, 4, 3)
+
+# GPS time started at 1980-01-06 00:00:00 UTC (Unix time below) and is ahead of UTC by the
+# leap seconds inserted since; iTOW restarts every week
+GPS_EPOCH_UNIX = 315964800
+GPS_LEAP_SECONDS = 18
+GPS_WEEK_MS = 604800000
+
+
+def unwrap_itow(itow_ms: np.ndarray) -> np.ndarray:
+    """iTOW (ms) made monotonic across GPS week rollovers: a backward jump of more than half
+    a week starts the next week (NaN stays NaN)."""
+    itow = np.array(itow_ms, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(itow))
+    if len(valid) > 1:
+        weeks = np.cumsum(np.diff(itow[valid]) < -GPS_WEEK_MS / 2)
+        itow[valid[1:]] += weeks * GPS_WEEK_MS
+    return itow
+
+
+def native_seconds(times: np.ndarray, kind: str) -> np.ndarray:
+    """Timestamps of a stream in seconds on its own clock: IMU boot time, probe UTC epoch, or
+    PVAT GPS time since the start of the week of its first sample."""
+    if kind == 'pvat':
+        times = unwrap_itow(times)
+    return np.asarray(times, dtype=np.float64) * TIME_SCALES[kind]
+
+
+def time_axis(times: np.ndarray, kind: str, ts: np.ndarray) -> tuple:
+    """(x, label) to plot a stream against: its timestamps in seconds on its own clock, the
+    one --start/--end are given in, or the sample index `ts` if any sample lacks a timestamp."""
+    seconds = native_seconds(times, kind)
+    if len(seconds) and np.isfinite(seconds).all():
+        return seconds, CLOCK_LABELS[kind]
+    return ts, "Sample index"
+
+
+def stream_seconds(times: np.ndarray, kind: str, offset: float = 0.0) -> np.ndarray:
+    """Timestamps of a stream in seconds since its first valid sample, plus `offset` (NaN stays NaN)."""
+    seconds = native_seconds(times, kind)
+    valid = np.isfinite(seconds)
+    return seconds - seconds[valid][0] + offset if valid.any() else seconds
+
+
+def _first(seconds: np.ndarray) -> float:
+    valid = np.isfinite(seconds)
+    return seconds[valid][0] if valid.any() else np.nan
+
+
+def clock_shift(seconds: np.ndarray, positions: np.ndarray, ref_seconds: np.ndarray,
+                ref_positions: np.ndarray) -> float:
+    """Median of reference minus own time over each sample and the reference sample closest to
+    it in the log, i.e. what to add to move a stream onto the reference clock; NaN without pairs.
+    Positions are byte offsets of the samples' lines, ascending in log order.
+    """
+    own = np.isfinite(seconds)
+    ref = np.isfinite(ref_seconds)
+    t, pos = seconds[own], positions[own]
+    ref_t, ref_pos = ref_seconds[ref], ref_positions[ref]
+    if not len(t) or not len(ref_t):
+        return np.nan
+    prev = np.maximum(merge_positions(ref_pos, pos), 0)
+    nxt = np.minimum(prev + 1, len(ref_pos) - 1)
+    pick = np.where(np.abs(ref_pos[nxt] - pos) < np.abs(pos - ref_pos[prev]), nxt, prev)
+    return float(np.median(ref_t[pick] - t))
+
+
+def common_clock(times: dict, positions: dict = None, offsets: dict = None) -> tuple:
+    """({stream: seconds since the earliest sample}, clock) with the streams of `times`
+    ({stream: raw timestamps}, streams as in STREAM_KINDS) on one clock.
+    The reference is UTC when there are probe timestamps, else GPS time, else the IMU boot
+    clock. PVAT goes onto UTC in the GPS week of the probe samples; the IMU clock is shifted
+    by clock_shift() against the samples already on the reference, which needs `positions`
+    ({stream: byte offsets}, see OffsetSink). A stream that cannot be placed starts at the
+    common origin as before and is listed in clock['unanchored']. offsets = {stream: seconds}
+    are added last, as a manual correction. clock = {'reference', 'origin' (reference
+    seconds of time 0), 'unanchored'}.
+    """
+    native = {name: native_seconds(t, STREAM_KINDS[name]) for name, t in times.items()}
+    positions = positions or {}
+    offsets = offsets or {}
+
+    def located(name):
+        pos = positions.get(name)
+        return pos is not None and len(pos) == len(native[name]) and not (np.asarray(pos) < 0).any()
+
+    placed = {}
+    if 'probe' in native and np.isfinite(native['probe']).any():
+        reference = 'utc'
+        placed['probe'] = native['probe']
+        if 'pvat' in native and np.isfinite(native['pvat']).any():
+            # GPS seconds of the first probe sample minus the first time of week: whole weeks
+            # apart from the few seconds or hours between the two streams' first samples
+            probe_gps = _first(native['probe']) - GPS_EPOCH_UNIX + GPS_LEAP_SECONDS
+            week_s = GPS_WEEK_MS / 1000
+            weeks = np.round((probe_gps - _first(native['pvat'])) / week_s)
+            placed['pvat'] = native['pvat'] + weeks * week_s + GPS_EPOCH_UNIX - GPS_LEAP_SECONDS
+    elif 'pvat' in native and np.isfinite(native['pvat']).any():
+        reference = 'gps'
+        placed['pvat'] = native['pvat']
+    else:
+        reference = 'imu'
+        placed.update({name: native[name] for name in native if STREAM_KINDS[name] == 'imu'})
+
+    imu = [name for name in native if STREAM_KINDS[name] == 'imu' and name not in placed]
+    refs = [name for name in placed if located(name)]
+    if imu and refs and all(located(name) for name in imu):
+        # Accel and gyro share the boot clock, so they get one shift
+        cat = np.concatenate
+        ref_pos = cat([np.asarray(positions[name]) for name in refs])
+        order = np.argsort(ref_pos, kind='stable')
+        own_pos = cat([np.asarray(positions[name]) for name in imu])
+        own_order = np.argsort(own_pos, kind='stable')
+        shift = clock_shift(cat([native[name] for name in imu])[own_order], own_pos[own_order],
+                            cat([placed[name] for name in refs])[order], ref_pos[order])
+        if np.isfinite(shift):
+            placed.update({name: native[name] + shift for name in imu})
+
+    firsts = [np.nanmin(t) for t in placed.values() if np.isfinite(t).any()]
+    origin = min(firsts) if firsts else 0.0
+    seconds = {}
+    for name, t in native.items():
+        seconds[name] = (placed[name] - origin if name in placed else t - _first(t)) + offsets.get(name, 0.0)
+    clock = {'reference': reference, 'origin': origin, 'unanchored': [name for name in native if name not in placed]}
+    return seconds, clock
+
+
+def merge_positions(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Index of the last src value <= each dst value (-1 if none); both sorted ascending.
+    The two runs are merged by a stable sort, which finds them already sorted and merges
+    them in linear time; src values come first on ties.
+    """
+    from_dst = np.concatenate((np.zeros(len(src), dtype=bool), np.ones(len(dst), dtype=bool)))
+    order = np.argsort(np.concatenate((src, dst)), kind='stable')
+    merged_from_dst = from_dst[order]
+    src_seen = np.cumsum(~merged_from_dst)
+    return src_seen[merged_from_dst] - 1
+
+
+def align(src_times: np.ndarray, src_values: np.ndarray, dst_times: np.ndarray,
+          method: str = MERGE_DEFAULT, tolerance: float = MERGE_TOLERANCE) -> np.ndarray:
+    """Values of a source series at the destination times, as float64 with NaN where nothing matches.
+    src_values may be 1-D or (n, k). Neither timeline needs to be sorted; source samples
+    without a valid timestamp are ignored.
+    """
+    if method not in MERGE_METHODS:
+        raise ValueError(f"Unknown merge method '{method}', expected one of {', '.join(MERGE_METHODS)}")
+    src_times = np.asarray(src_times, dtype=np.float64)
+    dst_times = np.asarray(dst_times, dtype=np.float64)
+    src_values = np.asarray(src_values, dtype=np.float64)
+    valid = np.isfinite(src_times)
+    src_order = np.argsort(src_times[valid], kind='stable')
+    src_t = src_times[valid][src_order]
+    src_v = src_values[valid][src_order]
+    out = np.full((len(dst_times),) + src_values.shape[1:], np.nan)
+
+    dst_valid = np.flatnonzero(np.isfinite(dst_times))
+    dst_order = dst_valid[np.argsort(dst_times[dst_valid], kind='stable')]
+    dst_t = dst_times[dst_order]
+    if not len(src_t) or not len(dst_t):
+        return out
+
+    prev = merge_positions(src_t, dst_t)
+    nxt = prev + 1
+    has_prev = prev >= 0
+    has_next = nxt < len(src_t)
+    prev_gap = np.where(has_prev, dst_t - src_t[np.maximum(prev, 0)], np.inf)
+    next_gap = np.where(has_next, src_t[np.minimum(nxt, len(src_t) - 1)] - dst_t, np.inf)
+
+    if method == 'previous':
+        ok = has_prev & (prev_gap <= tolerance)
+        out[dst_order[ok]] = src_v[prev[ok]]
+    elif method == 'nearest':
+        use_next = next_gap < prev_gap
+        pick = np.where(use_next, nxt, prev)
+        ok = np.minimum(prev_gap, next_gap) <= tolerance
+        out[dst_order[ok]] = src_v[pick[ok]]
+    else:
+        exact = prev_gap == 0
+        out[dst_order[exact]] = src_v[prev[exact]]
+        ok = ~exact & has_prev & has_next & (prev_gap <= tolerance) & (next_gap <= tolerance)
+        p, n = prev[ok], nxt[ok]
+        weight = (dst_t[ok] - src_t[p]) / (src_t[n] - src_t[p])
+        if src_v.ndim > 1:
+            weight = weight[:, None]
+        out[dst_order[ok]] = src_v[p] + weight * (src_v[n] - src_v[p])
+    return out
+
+
+def stream_tables(imu: ImuSink, probe: ProbeSink, pvat: PvatSink, offsets: dict = None,
+                  positions: dict = None) -> tuple:
+    """({stream: (seconds, {column name: values})}, clock) of the parsed streams on the clock
+    of common_clock(); positions are the OffsetSink byte offsets of the samples."""
+    accel, gyro = imu.result()
+    _, *columns = pvat.result()
+    names = [parse_field_spec(spec)[0] for spec in pvat.specs()]
+    data = {
+        'accel': {f'accel_{axis}': accel[axis] for axis in ('x', 'y', 'z')},
+        'gyro': {f'gyro_{axis}': gyro[axis] for axis in ('x', 'y', 'z')},
+        'probe': {f'probe_field_{idx}': values for idx, (_, values) in probe.result().items()},
+        'pvat': dict(zip(names, columns)),
+    }
+    times = {'accel': accel['time'], 'gyro': gyro['time'], 'probe': to_numpy(probe.time),
+             'pvat': to_numpy(pvat.time)}
+    seconds, clock = common_clock(times, positions, offsets)
+    return {name: (seconds[name], data[name]) for name in data}, clock
+
+
+def merge_streams(tables: dict, base: str = 'accel', method: str = MERGE_DEFAULT,
+                  tolerance: float = MERGE_TOLERANCE, rate: float = None) -> dict:
+    """One table {column: values} with a 'time_s' column and the columns of every stream.
+    Rows are the samples of the `base` stream, whose columns are kept as they are,
+    or a regular grid at `rate` Hz over the span of all streams for base 'grid'.
+    """
+    if base == 'grid':
+        spans = [(np.nanmin(t), np.nanmax(t)) for t, _ in tables.values() if np.isfinite(t).any()]
+        if not spans:
+            return {'time_s': np.empty(0)}
+        start, end = min(lo for lo, _ in spans), max(hi for _, hi in spans)
+        time_s = start + np.arange(int(np.floor((end - start) * rate)) + 1) / rate
+    else:
+        time_s = tables[base][0]
+
+    merged = {'time_s': time_s}
+    for name, (times, columns) in tables.items():
+        if name == base:
+            merged.update({col: np.asarray(values, dtype=np.float64) for col, values in columns.items()})
+            continue
+        if not columns:
+            continue
+        values = align(times, np.column_stack(list(columns.values())), time_s, method, tolerance)
+        for i, col in enumerate(columns):
+            merged[col] = values[:, i]
+    return merged
+
+
+def parse_offsets(specs: list) -> dict:
+    """{stream: seconds} from "stream=seconds" specs; raises ValueError on bad specs."""
+    offsets = {}
+    for spec in specs:
+        name, sep, value = spec.partition('=')
+        if not sep or name not in MERGE_STREAMS:
+            raise ValueError(f"Invalid offset '{spec}', expected <{'|'.join(MERGE_STREAMS)}>=<seconds>")
+        try:
+            offsets[name] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid offset '{spec}', {value!r} is not a number of seconds") from None
+    return offsets
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Align the IMU, probe and UBX-NAV-PVAT streams of an IVI log into one synchronised table."
+    )
+    parser.add_argument('logfile', help="Path to the log file")
+    parser.add_argument(
+        '--base', choices=MERGE_BASES, default='accel',
+        help="Stream whose samples are the table rows, or 'grid' for a regular clock (default: accel)"
+    )
+    parser.add_argument(
+        '--rate', type=float, default=10.0,
+        help="Rows per second of --base grid (default: 10)"
+    )
+    parser.add_argument(
+        '--method', choices=MERGE_METHODS, default=MERGE_DEFAULT,
+        help=f"How other streams are matched to the rows (default: {MERGE_DEFAULT})"
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=MERGE_TOLERANCE,
+        help=f"Largest time distance in seconds of a match (default: {MERGE_TOLERANCE})"
+    )
+    parser.add_argument(
+        '--offset', nargs='+', default=[],
+        help="Correct a stream's clock by hand after the automatic alignment, e.g. probe=-0.4 pvat=1.2 (seconds)"
+    )
+    parser.add_argument(
+        '--probe-fields', type=int, nargs='+', default=list(MERGE_PROBE_FIELDS),
+        help=f"Zero-based probe field indices (default: {' '.join(map(str, MERGE_PROBE_FIELDS))})"
+    )
+    parser.add_argument(
+        '--pvat-fields', nargs='+', default=list(PVAT_FIELDS),
+        help=f"UBX-NAV-PVAT keys, as name or name:int (default: {' '.join(PVAT_FIELDS)})"
+    )
+    parser.add_argument(
+        '--output', default=None,
+        help="Write the table to a file (format by extension: .parquet, .arrow/.feather, .h5/.hdf5)"
+    )
+    parser.add_argument(
+        '--plot', nargs='+', default=None, metavar='COLUMN',
+        help="Plot these table columns on the common time axis, one panel each"
+    )
+    parser.add_argument(
+        '--plot-output', default=None,
+        help="Save the --plot figure to file instead of displaying (e.g. merged.png)"
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help="Parse with N worker processes (0 = all cores, default: 1)"
+    )
+    parser.add_argument(
+        '--cache-dir', default=CACHE_DIR,
+        help=f"Directory for cached parse results (default: {CACHE_DIR})"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="Always parse the log from scratch and do not write the cache"
+    )
+    args = parser.parse_args()
+
+    try:
+        args.pvat_fields = unique_field_specs(args.pvat_fields)
+        offsets = parse_offsets(args.offset)
+        if args.output:
+            # Imported here: pyarrow/h5py would add to the start-up of every other run
+            from ivi_export import export_format
+            export_format(args.output)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.base == 'grid' and args.rate <= 0:
+        print("Error: --rate must be positive", file=sys.stderr)
+        sys.exit(1)
+
+    stats = ScanStats()
+    sinks = [OffsetSink(ImuSink()), OffsetSink(ProbeSink(args.probe_fields)), OffsetSink(PvatSink(args.pvat_fields))]
+    if args.no_cache:
+        scan_log(args.logfile, sinks, jobs=args.jobs, stats=stats)
+    else:
+        scan_log_cached(args.logfile, sinks, jobs=args.jobs, cache_dir=args.cache_dir, stats=stats)
+    if stats.lines:
+        print(stats.report())
+
+    positions = {name: pos for sink in sinks for name, pos in sink.positions().items()}
+    tables, clock = stream_tables(*(sink.sink for sink in sinks), offsets, positions)
+    table = merge_streams(tables, args.base, args.method, args.tolerance, args.rate)
+    rows = len(table['time_s'])
+    if not rows:
+        print("No matching log lines found.", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Clock: {clock['reference']}, time 0 = {clock['origin']:.3f} s")
+    for name in clock['unanchored']:
+        if len(tables[name][0]):
+            print(f"Warning: {name} could not be placed on the {clock['reference']} clock, "
+                  f"it starts at time 0", file=sys.stderr)
+    print(f"{rows} rows on the {args.base} timeline, {args.method} match within {args.tolerance} s:")
+    for name, values in table.items():
+        if name != 'time_s':
+            print(f"  {name:20s} {np.count_nonzero(np.isfinite(values)) / rows:7.1%} matched")
+
+    if args.output:
+        from ivi_export import write_columns
+        write_columns(args.output, table, {'source': os.path.abspath(args.logfile), 'base': args.base,
+                                           'method': args.method, 'tolerance_s': str(args.tolerance),
+                                           'clock': clock['reference'], 'time_origin_s': repr(clock['origin'])})
+        print(f"Table saved to {args.output}")
+
+    if args.plot:
+        unknown = [name for name in args.plot if name not in table]
+        if unknown:
+            print(f"Error: unknown column(s) {', '.join(unknown)}; available: {', '.join(table)}", file=sys.stderr)
+            sys.exit(1)
+        from ivi_backend import use_headless_backend
+        from ivi_decimate import DECIMATE_DEFAULT, decimate, plot_points
+        if args.plot_output:
+            use_headless_backend()
+        import matplotlib.pyplot as plt
+
+        n_points = plot_points(12, 150)
+        fig, axes = plt.subplots(len(args.plot), 1, figsize=(12, max(4, 2.5 * len(args.plot))), sharex=True)
+        axes = np.atleast_1d(axes)
+        for ax, name in zip(axes, args.plot):
+            finite = np.isfinite(table['time_s']) & np.isfinite(table[name])
+            ax.plot(*decimate(table['time_s'][finite], table[name][finite], DECIMATE_DEFAULT, n_points),
+                    linewidth=0.7, color='steelblue')
+            ax.set_ylabel(name)
+            ax.grid(True, alpha=0.4)
+        axes[0].set_title(f"{os.path.basename(args.logfile)} — {args.method} merge on {args.base}")
+        axes[-1].set_xlabel("Time (s)")
+        fig.tight_layout()
+        if args.plot_output:
+            fig.savefig(args.plot_output, dpi=150)
+            print(f"Plot saved to {args.plot_output}")
+        else:
+            plt.show()
+
+
+if __name__ == '__main__':
+    main()
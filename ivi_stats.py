@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Streaming statistics for --stats-only runs of the IVI log plot scripts.
+
+Instead of keeping every sample, a StatsSink wraps one of the engine's column
+sinks and every FLUSH_LINES matching lines drains what it collected into
+per-series accumulators: count, min/max, mean/variance (Welford, merged per
+batch with Chan's parallel update) and a relative-error quantile sketch for
+p50/p95/p99. Memory stays constant however long the log is, and accumulators
+of parallel chunks merge exactly like the sinks they replace.
+"""
+
+import math
+
+import numpy as np
+
+from ivi_log_engine import ScanStats, scan_log, to_numpy
+from ivi_log_index import scan_window
+
+# Matching lines fed to the wrapped sink between two drains into the accumulators
+FLUSH_LINES = 65536
+
+# Quantile sketch relative accuracy; |values| below SKETCH_MIN_VALUE count as zero
+SKETCH_ACCURACY = 0.01
+SKETCH_MIN_VALUE = 1e-9
+
+QUANTILES = (0.50, 0.95, 0.99)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch).
+    Values fall into logarithmic buckets gamma**(i-1) < |x| <= gamma**i, so any
+    quantile is returned within SKETCH_ACCURACY of its true value, and the number
+    of buckets depends only on the range of magnitudes, never on the sample count.
+    """
+
+    def __init__(self, accuracy: float = SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+
+    def _add(self, store: dict, magnitudes: np.ndarray) -> None:
+        if not len(magnitudes):
+            return
+        buckets, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64),
+                                    return_counts=True)
+        for bucket, count in zip(buckets.tolist(), counts.tolist()):
+            store[bucket] = store.get(bucket, 0) + count
+
+    def update(self, values: np.ndarray) -> None:
+        self._add(self.positive, values[values > SKETCH_MIN_VALUE])
+        self._add(self.negative, -values[values < -SKETCH_MIN_VALUE])
+        self.zero += int(np.count_nonzero(np.abs(values) <= SKETCH_MIN_VALUE))
+        self.count += len(values)
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        for own, new in ((self.positive, other.positive), (self.negative, other.negative)):
+            for bucket, count in new.items():
+                own[bucket] = own.get(bucket, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+
+    def _value(self, bucket: int) -> float:
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """Approximate q-quantile (0 <= q <= 1), NaN if empty."""
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return -self._value(bucket)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(max(self.positive))
+
+
+class RunningStats:
+    """Count, min, max, mean, variance and quantiles of a series seen in batches."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def _combine(self, count: int, mean: float, m2: float) -> None:
+        """Chan et al. pairwise update of (count, mean, M2) with another partition's moments."""
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def update(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        values = np.asarray(values, dtype=np.float64)
+        mean = values.mean()
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()))
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.sketch.update(values)
+
+    def merge(self, other: 'RunningStats') -> None:
+        if not other.count:
+            return
+        self._combine(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation, NaN below two samples."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def quantile(self, q: float) -> float:
+        """Approximate q-quantile, clamped to the exact min/max."""
+        return min(max(self.sketch.quantile(q), self.min), self.max) if self.count else math.nan
+
+    def describe(self, digits: int = 6) -> str:
+        """One line: "N samples, Min=.. Max=.. Mean=.. Std=.. P50=.. P95=.. P99=.."."""
+        if not self.count:
+            return "no samples"
+        quantiles = '  '.join(f"P{q * 100:.0f}={self.quantile(q):.{digits}f}" for q in QUANTILES)
+        return (f"{self.count} samples, Min={self.min:.{digits}f}  Max={self.max:.{digits}f}  "
+                f"Mean={self.mean:.{digits}f}  Std={self.std:.{digits}f}  {quantiles}")
+
+
+class StatsSink:
+    """Wraps an engine sink, keeping RunningStats per stream and series instead of columns.
+    Samples whose timestamp lies outside [start, end] are skipped.
+    """
+
+    def __init__(self, sink, start: float = None, end: float = None):
+        self.sink = sink
+        self.KIND = sink.KIND
+        self.MARKER = sink.MARKER
+        self.IGNORECASE = sink.IGNORECASE
+        self.start = -math.inf if start is None else start
+        self.end = math.inf if end is None else end
+        self.stats = {}
+        self.pending = 0
+
+    def feed(self, line: str) -> None:
+        self.sink.feed(line)
+        self.pending += 1
+        if self.pending >= FLUSH_LINES:
+            self.flush()
+
+    def flush(self) -> None:
+        """Move what the wrapped sink collected into the accumulators and start it afresh."""
+        for stream, columns in self.sink.streams().items():
+            times = to_numpy(columns['time'])
+            keep = None
+            if self.start > -math.inf or self.end < math.inf:
+                keep = (times >= self.start) & (times <= self.end)
+            series = self.stats.setdefault(stream, {})
+            for name, col in columns.items():
+                if name == 'time':
+                    continue
+                values = to_numpy(col)
+                series.setdefault(name, RunningStats()).update(values if keep is None else values[keep])
+        self.sink = self.sink.spawn()
+        self.pending = 0
+
+    def spawn(self) -> 'StatsSink':
+        """Empty sink with the same configuration, for parsing another chunk."""
+        return StatsSink(self.sink.spawn(), self.start, self.end)
+
+    def merge(self, other: 'StatsSink') -> None:
+        """Merge the accumulators of another chunk."""
+        self.flush()
+        other.flush()
+        for stream, series in other.stats.items():
+            own = self.stats.setdefault(stream, {})
+            for name, stats in series.items():
+                own.setdefault(name, RunningStats()).merge(stats)
+
+    def keep_window(self, start: float, end: float) -> None:
+        """The window is applied while draining; see __init__."""
+        self.flush()
+
+    def result(self) -> dict:
+        """{stream: {series: RunningStats}} over everything scanned."""
+        self.flush()
+        return self.stats
+
+
+def summarize_log(filepath: str, sink, start: float = None, end: float = None, jobs: int = 1,
+                  cache_dir: str = None, stats: ScanStats = None) -> dict:
+    """Scan the log into StatsSink(sink) and return its {stream: {series: RunningStats}}.
+    With start/end set (timestamps of sink.KIND), only that time window is read from the log;
+    cache_dir is only used for the time index then, parse results are never cached.
+    """
+    summary = StatsSink(sink, start, end)
+    if start is not None or end is not None:
+        scan_window(filepath, [summary], sink.KIND, start, end, jobs=jobs, cache_dir=cache_dir, stats=stats)
+    else:
+        scan_log(filepath, [summary], jobs=jobs, stats=stats)
+    return summary.result()
@@ -5,18 +5,21 @@ from log lines like:
   onEventSendProbeData() : [100] 1777029439,35638178,139758437,52.080002,61.310459,315.115601,-0.185930,0.062851,4.372782,1
 """
 
-import math
-import re
 import sys
 import argparse
-import matplotlib.pyplot as plt
+import numpy as np
 
-# Matches the data portion after the bracket, e.g. "[100] val0,val1,...,val9"
-# Also accepts nan/inf/-inf in fields
-LOG_PATTERN = re.compile(
-    r'onEventSendProbeData\(\)\s*:\s*\[\d+\]\s*([\w\d\-\.]+(?:,[\w\d\-\.]+)+)',
-    re.IGNORECASE
-)
+from ivi_backend import use_headless_backend
+from ivi_decimate import DECIMATE_DEFAULT, DECIMATE_METHODS, decimate, plot_points
+from ivi_dsp import (SPECTROGRAM_NPERSEG, Pipeline, Resample, TableFilter, apply_chunked, parse_filter_spec,
+                     sample_rate, spectrogram_figure)
+from ivi_follow import FOLLOW_WINDOW, LivePlot, run_follow
+from ivi_lod import LodViewer, load_pyramids, lod_path, place, series_pyramid
+from ivi_log_cache import CACHE_DIR, scan_log_cached
+from ivi_log_engine import ProbeSink, ScanStats, scan_log, to_numpy
+from ivi_log_index import scan_window
+from ivi_merge import TIME_SCALES, stream_seconds, time_axis
+from ivi_stats import summarize_log
 
 # Zero-based field indices
 FIELD_INDEX = 7          # linear acceleration
@@ -25,49 +28,132 @@ ALTITUDE_FIELD_INDEX = 3 # altitude
 SPEED_FIELD_INDEX = 4    # speed
 
 
-def parse_log(filepath: str, field_indices: list):
+def parse_log(filepath: str, field_indices: list, jobs: int = 1, cache_dir: str = None, start: float = None, end: float = None,
+              stats: ScanStats = None, with_time: bool = False):
     """Parse log and extract multiple fields synchronously.
     Only keeps samples where ALL requested fields are valid (no NaN/Inf/parse errors).
     Returns dict of {index: (timestamps, values)} with aligned sample indices.
+    With cache_dir set, a cached parse of the same log is reused or extended.
+    With start/end set (probe field 0, epoch s), only that time window is read from the log.
+    With with_time set, returns (results, field 0 timestamp of each sample) instead.
     """
-    results = {idx: ([], []) for idx in field_indices}
-    sample_count = 0
-
-    with open(filepath, 'r', errors='replace') as f:
-        for lineno, line in enumerate(f, start=1):
-            m = LOG_PATTERN.search(line)
-            if not m:
-                continue
-            fields = m.group(1).split(',')
-
-            # Parse all requested fields for this line
-            parsed = {}
-            valid = True
-            for idx in field_indices:
-                if len(fields) <= idx:
-                    valid = False
-                    break
-                try:
-                    value = float(fields[idx])
-                except ValueError:
-                    valid = False
-                    break
-                if math.isnan(value) or math.isinf(value):
-                    valid = False
-                    break
-                parsed[idx] = value
-
-            if not valid:
-                continue
-
-            # All fields valid — store them with the same sample index
-            for idx in field_indices:
-                ts_list, val_list = results[idx]
-                ts_list.append(sample_count)
-                val_list.append(parsed[idx])
-            sample_count += 1
-
-    return results
+    probe = ProbeSink(field_indices)
+    if start is not None or end is not None:
+        scan_window(filepath, [probe], 'probe', start, end, jobs=jobs, cache_dir=cache_dir, stats=stats)
+    elif cache_dir:
+        scan_log_cached(filepath, [probe], jobs=jobs, cache_dir=cache_dir, stats=stats)
+    else:
+        scan_log(filepath, [probe], jobs=jobs, stats=stats)
+    if with_time:
+        return probe.result(), to_numpy(probe.time)
+    return probe.result()
+
+
+def stats_rows(results: dict, field_index: int, accel_index: int, speed_index: int, altitude_index: int) -> list:
+    """(label, field, samples, min, max, mean) of each plotted probe field that has samples."""
+    rows = []
+    for label, idx in (("Lin Accel", field_index), ("Accel", accel_index), ("Speed", speed_index),
+                       ("Altitude", altitude_index)):
+        vals = results[idx][1]
+        if len(vals):
+            rows.append((label, f"field {idx}", len(vals), vals.min(), vals.max(), vals.mean()))
+    return rows
+
+
+def plot_figure(results: dict, field_index: int, accel_index: int, speed_index: int, altitude_index: int,
+                title: str, method: str = DECIMATE_DEFAULT, filtered: dict = None, xlabel: str = "Sample index"):
+    """Linear acceleration, acceleration, speed and altitude panels of the parse_log() results.
+    With filtered = {index: (timestamps, values)}, e.g. from filter_results(), each panel shows
+    the filtered series over the raw one. `xlabel` names what the timestamps are (see
+    ivi_merge.time_axis()).
+    """
+    import matplotlib.pyplot as plt
+
+    panels = ((field_index, 'steelblue', "Linear Acceleration", "Lin Accel"),
+              (accel_index, 'crimson', "Acceleration", "Accel"),
+              (speed_index, 'darkorange', "Speed", "Speed"),
+              (altitude_index, 'forestgreen', "Altitude", "Altitude"))
+
+    # ~2 points per horizontal pixel of the 12-inch-wide figures saved at dpi=150
+    n_points = plot_points(12, 150)
+
+    fig, axes = plt.subplots(4, 1, figsize=(12, 12), sharex=True)
+    for i, (ax, (idx, color, ylabel, label)) in enumerate(zip(axes, panels)):
+        ts, vals = results[idx]
+        if filtered is None:
+            ax.plot(*decimate(ts, vals, method, n_points), linewidth=0.8, color=color, label=f'{label} (field {idx})')
+        else:
+            ax.plot(*decimate(ts, vals, method, n_points), linewidth=0.6, color='silver',
+                    label=f'{label} (field {idx}, raw)')
+            ax.plot(*decimate(*filtered[idx], method, n_points), linewidth=0.8, color=color,
+                    label=f'{label} (field {idx}, filtered)')
+        # Zero line on the signed quantities; altitude is far from it
+        if i < len(panels) - 1:
+            ax.axhline(0, color='gray', linewidth=0.6, linestyle='--')
+        ax.set_ylabel(ylabel)
+        ax.legend()
+        ax.grid(True, alpha=0.4)
+    axes[0].set_title(title)
+    axes[-1].set_xlabel(xlabel)
+
+    fig.tight_layout()
+    return fig
+
+
+def lod_viewer(results: dict, field_index: int, accel_index: int, speed_index: int, altitude_index: int,
+               title: str, pyramids: dict, filtered: dict = None, xlabel: str = "Sample index") -> LodViewer:
+    """LodViewer of the four panels of plot_figure(); `pyramids` holds the raw fields by index,
+    placed here at the timestamps of `results`."""
+    panels = []
+    for idx, color, ylabel, label in ((field_index, 'steelblue', "Linear Acceleration", "Lin Accel"),
+                                      (accel_index, 'crimson', "Acceleration", "Accel"),
+                                      (speed_index, 'darkorange', "Speed", "Speed"),
+                                      (altitude_index, 'forestgreen', "Altitude", "Altitude")):
+        raw = place(pyramids[idx], results[idx][0])
+        if filtered is None:
+            series = [(f'{label} (field {idx})', raw, color)]
+        else:
+            series = [(f'{label} (field {idx}, raw)', raw, 'silver'),
+                      (f'{label} (field {idx}, filtered)', series_pyramid(*filtered[idx]), color)]
+        panels.append((ylabel, series))
+    return LodViewer(panels, title, xlabel, figsize=(12, 12))
+
+
+def filter_results(results: dict, specs: list, fs: float, resample: int = 1) -> dict:
+    """{index: (timestamps, values)} of the parse_log() results run chunk by chunk through the
+    ivi_dsp filters `specs` at `fs` Hz and block-mean resampling; timestamps are the mean raw
+    timestamp (or sample index) of each resampled sample.
+    """
+    filtered = {}
+    for idx, (ts, vals) in results.items():
+        values = apply_chunked(Pipeline(specs, fs, resample), vals)
+        filtered[idx] = (apply_chunked(Resample(resample), ts) if resample > 1 else ts, values)
+    return filtered
+
+
+def spectrogram_plot(results: dict, field_index: int, accel_index: int, speed_index: int, altitude_index: int,
+                     title: str, fs: float, nperseg: int = SPECTROGRAM_NPERSEG):
+    """Welch spectrogram panels of the linear acceleration, acceleration, speed and altitude at `fs` Hz."""
+    return spectrogram_figure([(f"{label} ({idx})", results[idx][1])
+                               for label, idx in (("Lin Accel", field_index), ("Accel", accel_index),
+                                                  ("Speed", speed_index), ("Altitude", altitude_index))],
+                              fs, f"{title} — spectrogram ({fs:.1f} Hz)", nperseg)
+
+
+def follow(logfile: str, title: str, window: int, field_index: int, accel_index: int,
+           speed_index: int, altitude_index: int):
+    """Live plot of the probe fields while the log is being written."""
+    field_indices = [field_index, accel_index, speed_index, altitude_index]
+    plot = LivePlot(f"{title} — live", {
+        'probe': [(f"Linear Acceleration ({field_index})", 'steelblue'), (f"Acceleration ({accel_index})", 'crimson'),
+                  (f"Speed ({speed_index})", 'darkorange'), (f"Altitude ({altitude_index})", 'forestgreen')],
+    }, capacity=window)
+
+    def extract(batch):
+        results = batch.result()
+        return {'probe': np.column_stack([results[idx][1] for idx in field_indices])}
+
+    run_follow(logfile, ProbeSink(field_indices), plot, extract)
 
 
 def main():
@@ -99,6 +185,73 @@ def main():
         '--title', default="Linear Acceleration",
         help="Plot title"
     )
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help="Parse with N worker processes (0 = all cores, default: 1)"
+    )
+    parser.add_argument(
+        '--cache-dir', default=CACHE_DIR,
+        help=f"Directory for cached parse results (default: {CACHE_DIR})"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="Always parse the log from scratch and do not write the cache"
+    )
+    parser.add_argument(
+        '--follow', action='store_true',
+        help="Tail a log that is still being written and plot the latest samples live"
+    )
+    parser.add_argument(
+        '--window', type=int, default=FOLLOW_WINDOW,
+        help=f"Samples shown per panel in --follow mode (default: {FOLLOW_WINDOW})"
+    )
+    parser.add_argument(
+        '--decimate', choices=DECIMATE_METHODS, default=DECIMATE_DEFAULT,
+        help=f"Reduce each series to ~2 points per pixel before plotting (default: {DECIMATE_DEFAULT})"
+    )
+    parser.add_argument(
+        '--filter', nargs='+', default=[], metavar='SPEC',
+        help="Filters applied in order and plotted over the raw data (or added as field_<index>_filtered "
+             "export columns): ma:N, lowpass:HZ[:ORDER], highpass:HZ[:ORDER]"
+    )
+    parser.add_argument(
+        '--resample', type=int, default=1,
+        help="Keep the mean of every N samples after filtering (default: 1, no resampling)"
+    )
+    parser.add_argument(
+        '--spectrogram', action='store_true',
+        help="Also plot Welch spectrograms of the four fields"
+    )
+    parser.add_argument(
+        '--nperseg', type=int, default=SPECTROGRAM_NPERSEG,
+        help=f"Samples per spectrogram segment (default: {SPECTROGRAM_NPERSEG})"
+    )
+    parser.add_argument(
+        '--fs', type=float, default=None,
+        help="Sample rate in Hz for filters and spectrograms (default: from the probe timestamps)"
+    )
+    parser.add_argument(
+        '--lod', action='store_true',
+        help="Open an interactive viewer that redraws only the visible range from a min/max pyramid "
+             "(stored with the parse cache)"
+    )
+    parser.add_argument(
+        '--export', default=None,
+        help="Write the parsed columns to a file instead of plotting, in batches while parsing "
+             "(format by extension: .parquet, .arrow/.feather, .h5/.hdf5)"
+    )
+    parser.add_argument(
+        '--stats-only', action='store_true',
+        help="Print min/max/mean/std and p50/p95/p99 per field in constant memory, without plotting"
+    )
+    parser.add_argument(
+        '--start', type=float, default=None,
+        help="Only plot samples at or after this timestamp (probe field 0, epoch s)"
+    )
+    parser.add_argument(
+        '--end', type=float, default=None,
+        help="Only plot samples at or before this timestamp (probe field 0, epoch s)"
+    )
     args = parser.parse_args()
 
     field_index = args.field
@@ -106,62 +259,120 @@ def main():
     altitude_index = args.altitude_field
     accel_index = args.accel_field
 
-    results = parse_log(args.logfile, [field_index, speed_index, altitude_index, accel_index])
-    lin_accel_ts, lin_accel_vals = results[field_index]
-    speed_ts, speed_vals = results[speed_index]
-    alt_ts, alt_vals = results[altitude_index]
-    accel_ts, accel_vals = results[accel_index]
+    try:
+        for spec in args.filter:
+            parse_filter_spec(spec)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.lod and args.output:
+        print("Error: --lod opens an interactive viewer and cannot be combined with --output", file=sys.stderr)
+        sys.exit(1)
+
+    if args.resample < 1 or args.nperseg < 2:
+        print("Error: --resample must be at least 1 and --nperseg at least 2", file=sys.stderr)
+        sys.exit(1)
+
+    if args.follow:
+        follow(args.logfile, args.title, args.window, field_index, accel_index, speed_index, altitude_index)
+        return
 
-    if not lin_accel_vals and not speed_vals and not alt_vals and not accel_vals:
+    stats = ScanStats()
+    if args.export:
+        # Imported here: pyarrow/h5py would add to the start-up of every other run
+        from ivi_export import TIME_COLUMNS, export_log
+        field_indices = [field_index, speed_index, altitude_index, accel_index]
+        process = None
+        if args.filter or args.resample > 1:
+            process = TableFilter(args.filter, [f'field_{idx}' for idx in dict.fromkeys(field_indices)],
+                                  TIME_COLUMNS['probe'], TIME_SCALES['probe'], args.resample, args.fs)
+        try:
+            rows = export_log(args.logfile, ProbeSink(field_indices), args.export, start=args.start, end=args.end,
+                              jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir, stats=stats,
+                              process=process)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(stats.report())
+        if not rows:
+            print("No matching log lines found.", file=sys.stderr)
+            sys.exit(1)
+        print(f"Exported {rows} rows to {args.export}")
+        return
+
+    if args.stats_only:
+        summary = summarize_log(args.logfile, ProbeSink([field_index, speed_index, altitude_index, accel_index]),
+                                start=args.start, end=args.end, jobs=args.jobs,
+                                cache_dir=None if args.no_cache else args.cache_dir, stats=stats)['probe']
+        print(stats.report())
+        if not summary[field_index].count:
+            print("No matching log lines found.", file=sys.stderr)
+            sys.exit(1)
+        for label, idx in (("Lin Accel", field_index), ("Accel", accel_index), ("Speed", speed_index),
+                           ("Altitude", altitude_index)):
+            print(f"{label:9s} (field {idx}): {summary[idx].describe()}")
+        return
+
+    results, times = parse_log(args.logfile, [field_index, speed_index, altitude_index, accel_index],
+                               jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir,
+                               start=args.start, end=args.end, stats=stats, with_time=True)
+    if stats.lines:
+        print(stats.report())
+
+    if not any(len(vals) for _, vals in results.values()):
         print("No matching log lines found.", file=sys.stderr)
         sys.exit(1)
 
-    if lin_accel_vals:
-        print(f"Lin Accel (field {field_index}): {len(lin_accel_vals)} samples, Min={min(lin_accel_vals):.6f}  Max={max(lin_accel_vals):.6f}  Mean={sum(lin_accel_vals)/len(lin_accel_vals):.6f}")
-    if accel_vals:
-        print(f"Accel     (field {accel_index}): {len(accel_vals)} samples, Min={min(accel_vals):.6f}  Max={max(accel_vals):.6f}  Mean={sum(accel_vals)/len(accel_vals):.6f}")
-    if speed_vals:
-        print(f"Speed     (field {speed_index}): {len(speed_vals)} samples, Min={min(speed_vals):.6f}  Max={max(speed_vals):.6f}  Mean={sum(speed_vals)/len(speed_vals):.6f}")
-    if alt_vals:
-        print(f"Altitude  (field {altitude_index}): {len(alt_vals)} samples, Min={min(alt_vals):.6f}  Max={max(alt_vals):.6f}  Mean={sum(alt_vals)/len(alt_vals):.6f}")
-
-    fig, (ax1, ax2, ax3, ax4) = plt.subplots(4, 1, figsize=(12, 12), sharex=True)
-
-    # Linear acceleration plot
-    ax1.plot(lin_accel_ts, lin_accel_vals, linewidth=0.8, color='steelblue', label=f'Lin Accel (field {field_index})')
-    ax1.axhline(0, color='gray', linewidth=0.6, linestyle='--')
-    ax1.set_ylabel("Linear Acceleration")
-    ax1.set_title(args.title)
-    ax1.legend()
-    ax1.grid(True, alpha=0.4)
-
-    # Acceleration plot
-    ax2.plot(accel_ts, accel_vals, linewidth=0.8, color='crimson', label=f'Accel (field {accel_index})')
-    ax2.axhline(0, color='gray', linewidth=0.6, linestyle='--')
-    ax2.set_ylabel("Acceleration")
-    ax2.legend()
-    ax2.grid(True, alpha=0.4)
-
-    # Speed plot
-    ax3.plot(speed_ts, speed_vals, linewidth=0.8, color='darkorange', label=f'Speed (field {speed_index})')
-    ax3.axhline(0, color='gray', linewidth=0.6, linestyle='--')
-    ax3.set_ylabel("Speed")
-    ax3.legend()
-    ax3.grid(True, alpha=0.4)
-
-    # Altitude plot
-    ax4.plot(alt_ts, alt_vals, linewidth=0.8, color='forestgreen', label=f'Altitude (field {altitude_index})')
-    ax4.set_xlabel("Sample index")
-    ax4.set_ylabel("Altitude")
-    ax4.legend()
-    ax4.grid(True, alpha=0.4)
+    for label, field, n, vmin, vmax, mean in stats_rows(results, field_index, accel_index, speed_index, altitude_index):
+        print(f"{label:9s} ({field}): {n} samples, Min={vmin:.6f}  Max={vmax:.6f}  Mean={mean:.6f}")
+    # Plot against field 0, the clock --start/--end are given in
+    x, xlabel = time_axis(times, 'probe', results[field_index][0])
+    results = {idx: (x, vals) for idx, (_, vals) in results.items()}
 
-    fig.tight_layout()
+    fs = args.fs
+    if args.filter or args.resample > 1 or args.spectrogram:
+        fs = fs or sample_rate(stream_seconds(times, 'probe'))
+        if not fs > 0:
+            print("Error: Cannot tell the sample rate from the timestamps, pass --fs", file=sys.stderr)
+            sys.exit(1)
+    filtered = None
+    if args.filter or args.resample > 1:
+        filtered = filter_results(results, args.filter, fs, args.resample)
+        print("Filtered:")
+        for label, field, n, vmin, vmax, mean in stats_rows(filtered, field_index, accel_index, speed_index,
+                                                            altitude_index):
+            print(f"{label:9s} ({field}): {n} samples, Min={vmin:.6f}  Max={vmax:.6f}  Mean={mean:.6f}")
+
+    if args.lod:
+        import matplotlib.pyplot as plt
+        # Windowed parses are not cached, neither are their pyramids
+        cached = not args.no_cache and args.start is None and args.end is None
+        path = lod_path(args.logfile, [ProbeSink([field_index, speed_index, altitude_index, accel_index])],
+                        args.cache_dir) if cached else None
+        pyramids = load_pyramids({idx: vals for idx, (_, vals) in results.items()}, args.logfile, path)
+        viewer = lod_viewer(results, field_index, accel_index, speed_index, altitude_index, args.title,
+                            pyramids, filtered, xlabel)
+        plt.show()
+        return
+
+    if args.output:
+        use_headless_backend()
+    fig = plot_figure(results, field_index, accel_index, speed_index, altitude_index, args.title, args.decimate,
+                      filtered, xlabel)
+    spectrogram = None
+    if args.spectrogram:
+        spectrogram = spectrogram_plot(filtered or results, field_index, accel_index, speed_index, altitude_index,
+                                       args.title, fs / args.resample, args.nperseg)
 
     if args.output:
         fig.savefig(args.output, dpi=150)
         print(f"Plot saved to {args.output}")
+        if spectrogram is not None:
+            path = args.output.replace('.png', '_spectrogram.png')
+            spectrogram.savefig(path, dpi=150)
+            print(f"Spectrogram saved to {path}")
     else:
+        import matplotlib.pyplot as plt
         plt.show()
 
 
@@ -5,71 +5,219 @@ Plot accelerometer (Sensor: 1) and gyroscope (Sensor: 4) X, Y, Z values from log
   Sensor: 4, Received data :: 0.001234:-0.002345:0.003456, 5134924768143
 """
 
-import math
-import re
 import sys
 import argparse
-import matplotlib.pyplot as plt
-
-# Matches "Sensor: <id>, Received data :: <x>:<y>:<z>, <timestamp>"
-# Requires a comma after z (not colon/space), so timestamp is ignored
-LOG_PATTERN = re.compile(
-    r'Sensor:\s*(\d+)\b,\s*Received data\s*::\s*([\w\d\.\-\+eE]+):([\w\d\.\-\+eE]+):([\w\d\.\-\+eE]+),'
-)
-
-ACCEL_SENSOR_ID = 1
-GYRO_SENSOR_ID = 4
-
-
-def parse_log(filepath: str):
-    """Parse log and extract X, Y, Z for accelerometer and gyroscope."""
-    accel = {'ts': [], 'x': [], 'y': [], 'z': []}
-    gyro = {'ts': [], 'x': [], 'y': [], 'z': []}
-    accel_count = 0
-    gyro_count = 0
-
-    with open(filepath, 'r', errors='replace') as f:
-        for lineno, line in enumerate(f, start=1):
-            for m in LOG_PATTERN.finditer(line):
-                sensor_id = int(m.group(1))
-                if sensor_id not in (ACCEL_SENSOR_ID, GYRO_SENSOR_ID):
-                    continue
-
-                try:
-                    x = float(m.group(2))
-                    y = float(m.group(3))
-                    z = float(m.group(4))
-                except ValueError:
-                    continue
-
-                if any(math.isnan(v) or math.isinf(v) for v in (x, y, z)):
-                    continue
-
-                if sensor_id == ACCEL_SENSOR_ID:
-                    accel['ts'].append(accel_count)
-                    accel['x'].append(x)
-                    accel['y'].append(y)
-                    accel['z'].append(z)
-                    accel_count += 1
-                elif sensor_id == GYRO_SENSOR_ID:
-                    gyro['ts'].append(gyro_count)
-                    gyro['x'].append(x)
-                    gyro['y'].append(y)
-                    gyro['z'].append(z)
-                    gyro_count += 1
-
-    return accel, gyro
+import numpy as np
+
+from ivi_backend import use_headless_backend
+from ivi_compensation import ATTITUDE_ACCURACY_FIELDS, ATTITUDE_FIELDS, compensate
+from ivi_decimate import DECIMATE_DEFAULT, DECIMATE_METHODS, decimate, plot_points
+from ivi_dsp import (SPECTROGRAM_NPERSEG, Pipeline, Resample, TableFilter, apply_chunked, parse_filter_spec,
+                     sample_rate, spectrogram_figure)
+from ivi_follow import FOLLOW_WINDOW, LivePlot, run_follow
+from ivi_lod import LodViewer, load_pyramids, lod_path, place, series_pyramid
+from ivi_log_cache import CACHE_DIR, scan_log_cached
+from ivi_log_engine import ImuSink, OffsetSink, ProbeSink, PvatSink, ScanStats, scan_log, to_numpy
+from ivi_log_index import scan_window
+from ivi_merge import TIME_SCALES, parse_offsets, stream_seconds, time_axis
+from ivi_stats import summarize_log
+
+# onEventSendProbeData() field holding the vehicle speed (m/s), for --compensate
+SPEED_FIELD_INDEX = 4
+
+
+def parse_log(filepath: str, jobs: int = 1, cache_dir: str = None, start: float = None, end: float = None,
+              stats: ScanStats = None):
+    """Parse log and extract X, Y, Z for accelerometer and gyroscope.
+    With cache_dir set, a cached parse of the same log is reused or extended.
+    With start/end set (IMU timestamp, ns as logged), only that time window is read from the log.
+    """
+    imu = ImuSink()
+    if start is not None or end is not None:
+        scan_window(filepath, [imu], 'imu', start, end, jobs=jobs, cache_dir=cache_dir, stats=stats)
+    elif cache_dir:
+        scan_log_cached(filepath, [imu], jobs=jobs, cache_dir=cache_dir, stats=stats)
+    else:
+        scan_log(filepath, [imu], jobs=jobs, stats=stats)
+    return imu.result()
+
+
+def compensate_log(filepath: str, speed_field: int = SPEED_FIELD_INDEX, jobs: int = 1, cache_dir: str = None,
+                   start: float = None, end: float = None, stats: ScanStats = None, offsets: dict = None):
+    """Parse IMU, probe speed and UBX-NAV-PVAT attitude (with its accuracies) in one pass and
+    remove the IMU biases.
+    Returns (accel, gyro, corrected accel, corrected gyro) like parse_log().
+    The whole log is parsed, so the bias estimate has its full history; start/end
+    (IMU timestamp, ns as logged) only trim the returned samples. The streams are aligned on
+    absolute time (ivi_merge.common_clock); offsets = {stream: seconds} correct that by hand,
+    see ivi_merge.parse_offsets().
+    """
+    sinks = [OffsetSink(ImuSink()), OffsetSink(ProbeSink([speed_field])),
+             OffsetSink(PvatSink(ATTITUDE_FIELDS + ATTITUDE_ACCURACY_FIELDS))]
+    if cache_dir:
+        scan_log_cached(filepath, sinks, jobs=jobs, cache_dir=cache_dir, stats=stats)
+    else:
+        scan_log(filepath, sinks, jobs=jobs, stats=stats)
+    imu, probe, pvat = (sink.sink for sink in sinks)
+    accel, gyro = imu.result()
+    _, *fields = pvat.result()
+    positions = {name: pos for sink in sinks for name, pos in sink.positions().items()}
+    corrected = compensate(accel, gyro, to_numpy(probe.time), probe.result()[speed_field][1],
+                           to_numpy(pvat.time), fields[:3], offsets, fields[3:], positions)
+    if start is None and end is None:
+        return (accel, gyro) + corrected
+
+    start = -np.inf if start is None else start
+    end = np.inf if end is None else end
+    trimmed = []
+    for data in (accel, gyro) + corrected:
+        keep = (data['time'] >= start) & (data['time'] <= end)
+        trimmed.append({'ts': np.arange(np.count_nonzero(keep)),
+                        **{name: col[keep] for name, col in data.items() if name != 'ts'}})
+    return tuple(trimmed)
+
+
+def filter_streams(streams: tuple, specs: list, resample: int = 1, fs: float = None) -> tuple:
+    """(accel, gyro) run chunk by chunk through the ivi_dsp filters `specs` and block-mean
+    resampling; same layout as parse_log(), 'ts' being the mean raw sample index of each sample.
+    The sample rate of each stream is taken from its timestamps unless `fs` is given.
+    """
+    filtered = []
+    for data in streams:
+        if not len(data['x']):
+            filtered.append(data)
+            continue
+        rate = fs or sample_rate(stream_seconds(data['time'], 'imu'))
+        xyz = apply_chunked(Pipeline(specs, rate, resample), np.column_stack((data['x'], data['y'], data['z'])))
+        out = {'ts': data['ts'], 'time': data['time']}
+        if resample > 1:
+            out = {name: apply_chunked(Resample(resample), col) for name, col in out.items()}
+        out.update({'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2], 'fs': rate / resample})
+        filtered.append(out)
+    return tuple(filtered)
+
+
+def spectrogram_figures(accel: dict, gyro: dict, title: str, nperseg: int = SPECTROGRAM_NPERSEG,
+                        fs: float = None) -> dict:
+    """Welch spectrogram figures of the X/Y/Z axes, {'accel_spectrogram': fig, 'gyro_spectrogram': fig}."""
+    figures = {}
+    for name, label, short, data in (('accel', "Accelerometer (Sensor 1)", "Accel", accel),
+                                     ('gyro', "Gyroscope (Sensor 4)", "Gyro", gyro)):
+        if len(data['x']) < nperseg:
+            continue
+        rate = data.get('fs') or fs or sample_rate(stream_seconds(data['time'], 'imu'))
+        if not rate > 0:
+            continue
+        figures[f'{name}_spectrogram'] = spectrogram_figure(
+            [(f"{short} {axis.upper()}", data[axis]) for axis in ('x', 'y', 'z')], rate,
+            f"{title} — {label} spectrogram ({rate:.1f} Hz)", nperseg)
+    return figures
+
+
+def stats_rows(name, data) -> list:
+    """(stream, axis, samples, min, max, mean) for each axis; empty if the stream has no samples."""
+    n = len(data['x'])
+    if n == 0:
+        return []
+    return [(name, axis, n, data[axis].min(), data[axis].max(), data[axis].mean()) for axis in ('x', 'y', 'z')]
 
 
 def print_stats(name, data):
-    n = len(data['x'])
-    if n == 0:
+    rows = stats_rows(name, data)
+    if not rows:
         print(f"  {name}: no samples")
         return
-    print(f"  {name}: {n} samples")
-    for axis in ('x', 'y', 'z'):
-        vals = data[axis]
-        print(f"    {axis}: Min={min(vals):.6f}  Max={max(vals):.6f}  Mean={sum(vals)/len(vals):.6f}")
+    print(f"  {name}: {rows[0][2]} samples")
+    for _, axis, _, vmin, vmax, mean in rows:
+        print(f"    {axis}: Min={vmin:.6f}  Max={vmax:.6f}  Mean={mean:.6f}")
+
+
+def plot_figures(accel: dict, gyro: dict, title: str, method: str = DECIMATE_DEFAULT, overlay: tuple = None,
+                 overlay_label: str = "bias-corrected") -> dict:
+    """Accelerometer and gyroscope X/Y/Z figures, {'accel': fig, 'gyro': fig}, for streams with samples.
+    With overlay = (accel, gyro), e.g. from compensate() or filter_streams(), each panel shows
+    that series over the raw one. Samples are plotted against the IMU clock, or the sample index
+    if a timestamp is missing.
+    """
+    import matplotlib.pyplot as plt
+
+    # ~2 points per horizontal pixel of the 12-inch-wide figures saved at dpi=150
+    n_points = plot_points(12, 150)
+    figures = {}
+    streams = (
+        ('accel', "Accelerometer (Sensor 1)", "Accel", "m/s²", accel),
+        ('gyro', "Gyroscope (Sensor 4)", "Gyro", "rad/s", gyro),
+    )
+
+    for i, (name, label, short, unit, data) in enumerate(streams):
+        if not len(data['x']):
+            continue
+        x, xlabel = time_axis(data['time'], 'imu', data['ts'])
+        fig, axes = plt.subplots(3, 1, figsize=(12, 8), sharex=True)
+        fig.suptitle(f"{title} — {label}")
+        for ax, axis, color in zip(axes, ('x', 'y', 'z'), ('steelblue', 'darkorange', 'forestgreen')):
+            if overlay is None:
+                ax.plot(*decimate(x, data[axis], method, n_points), linewidth=0.6, color=color)
+            else:
+                overlay_x, _ = time_axis(overlay[i]['time'], 'imu', overlay[i]['ts'])
+                ax.plot(*decimate(x, data[axis], method, n_points), linewidth=0.6, color='silver',
+                        label="raw")
+                ax.plot(*decimate(overlay_x, overlay[i][axis], method, n_points), linewidth=0.6,
+                        color=color, label=overlay_label)
+                ax.legend(loc='upper right')
+            ax.axhline(0, color='gray', linewidth=0.5, linestyle='--')
+            ax.set_ylabel(f"{short} {axis.upper()} ({unit})")
+            ax.grid(True, alpha=0.4)
+        axes[-1].set_xlabel(xlabel)
+
+        fig.tight_layout()
+        figures[name] = fig
+
+    return figures
+
+
+def lod_viewers(accel: dict, gyro: dict, title: str, pyramids: dict, overlay: tuple = None,
+                overlay_label: str = "bias-corrected") -> list:
+    """LodViewer figures of the accelerometer and gyroscope X/Y/Z, like plot_figures(); `pyramids`
+    holds the raw series as '<stream>_<axis>', placed here on the IMU clock like plot_figures().
+    Keep the viewers referenced while they are shown.
+    """
+    viewers = []
+    streams = (
+        ('accel', "Accelerometer (Sensor 1)", "Accel", "m/s²", accel),
+        ('gyro', "Gyroscope (Sensor 4)", "Gyro", "rad/s", gyro),
+    )
+    for i, (name, label, short, unit, data) in enumerate(streams):
+        if not len(data['x']):
+            continue
+        x, xlabel = time_axis(data['time'], 'imu', data['ts'])
+        panels = []
+        for axis, color in zip(('x', 'y', 'z'), ('steelblue', 'darkorange', 'forestgreen')):
+            raw = place(pyramids[f'{name}_{axis}'], x)
+            if overlay is None:
+                series = [(None, raw, color)]
+            else:
+                overlay_x, _ = time_axis(overlay[i]['time'], 'imu', overlay[i]['ts'])
+                series = [("raw", raw, 'silver'),
+                          (overlay_label, series_pyramid(overlay_x, overlay[i][axis]), color)]
+            panels.append((f"{short} {axis.upper()} ({unit})", series))
+        viewers.append(LodViewer(panels, f"{title} — {label}", xlabel=xlabel))
+    return viewers
+
+
+def follow(logfile: str, title: str, window: int):
+    """Live plot of accelerometer and gyroscope X/Y/Z while the log is being written."""
+    plot = LivePlot(f"{title} — live", {
+        'accel': [("Accel X (m/s²)", 'steelblue'), ("Accel Y (m/s²)", 'darkorange'), ("Accel Z (m/s²)", 'forestgreen')],
+        'gyro': [("Gyro X (rad/s)", 'steelblue'), ("Gyro Y (rad/s)", 'darkorange'), ("Gyro Z (rad/s)", 'forestgreen')],
+    }, capacity=window)
+
+    def extract(batch):
+        accel, gyro = batch.result()
+        return {name: np.column_stack((data['x'], data['y'], data['z']))
+                for name, data in (('accel', accel), ('gyro', gyro))}
+
+    run_follow(logfile, ImuSink(), plot, extract)
 
 
 def main():
@@ -85,75 +233,209 @@ def main():
         '--title', default="IVI Sensor Data",
         help="Plot title"
     )
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help="Parse with N worker processes (0 = all cores, default: 1)"
+    )
+    parser.add_argument(
+        '--cache-dir', default=CACHE_DIR,
+        help=f"Directory for cached parse results (default: {CACHE_DIR})"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="Always parse the log from scratch and do not write the cache"
+    )
+    parser.add_argument(
+        '--follow', action='store_true',
+        help="Tail a log that is still being written and plot the latest samples live"
+    )
+    parser.add_argument(
+        '--window', type=int, default=FOLLOW_WINDOW,
+        help=f"Samples shown per panel in --follow mode (default: {FOLLOW_WINDOW})"
+    )
+    parser.add_argument(
+        '--decimate', choices=DECIMATE_METHODS, default=DECIMATE_DEFAULT,
+        help=f"Reduce each series to ~2 points per pixel before plotting (default: {DECIMATE_DEFAULT})"
+    )
+    parser.add_argument(
+        '--compensate', action='store_true',
+        help="Remove gravity and the IMU biases learnt at standstill (IMUBiasRemover) and plot "
+             "the corrected series next to the raw ones"
+    )
+    parser.add_argument(
+        '--speed-field', type=int, default=SPEED_FIELD_INDEX,
+        help=f"Zero-based probe field index for speed, gating --compensate (default: {SPEED_FIELD_INDEX})"
+    )
+    parser.add_argument(
+        '--offset', nargs='+', default=[],
+        help="Correct a stream's clock for --compensate after the automatic alignment, e.g. probe=-0.4 "
+             "pvat=1.2 (seconds), as ivi_merge --offset"
+    )
+    parser.add_argument(
+        '--filter', nargs='+', default=[], metavar='SPEC',
+        help="Filters applied in order and plotted over the raw data (or added as <axis>_filtered "
+             "export columns): ma:N, lowpass:HZ[:ORDER], highpass:HZ[:ORDER]"
+    )
+    parser.add_argument(
+        '--resample', type=int, default=1,
+        help="Keep the mean of every N samples after filtering (default: 1, no resampling)"
+    )
+    parser.add_argument(
+        '--spectrogram', action='store_true',
+        help="Also plot Welch spectrograms of the X/Y/Z axes"
+    )
+    parser.add_argument(
+        '--nperseg', type=int, default=SPECTROGRAM_NPERSEG,
+        help=f"Samples per spectrogram segment (default: {SPECTROGRAM_NPERSEG})"
+    )
+    parser.add_argument(
+        '--fs', type=float, default=None,
+        help="Sample rate in Hz for filters and spectrograms (default: from the IMU timestamps)"
+    )
+    parser.add_argument(
+        '--lod', action='store_true',
+        help="Open an interactive viewer that redraws only the visible range from a min/max pyramid "
+             "(stored with the parse cache)"
+    )
+    parser.add_argument(
+        '--export', default=None,
+        help="Write the parsed columns to a file instead of plotting, in batches while parsing "
+             "(format by extension: .parquet, .arrow/.feather, .h5/.hdf5)"
+    )
+    parser.add_argument(
+        '--stats-only', action='store_true',
+        help="Print min/max/mean/std and p50/p95/p99 per axis in constant memory, without plotting"
+    )
+    parser.add_argument(
+        '--start', type=float, default=None,
+        help="Only plot samples at or after this timestamp (IMU timestamp, ns as logged; the plots' "
+             "time axis is the same clock in s)"
+    )
+    parser.add_argument(
+        '--end', type=float, default=None,
+        help="Only plot samples at or before this timestamp (IMU timestamp, ns as logged; the plots' "
+             "time axis is the same clock in s)"
+    )
     args = parser.parse_args()
 
-    accel, gyro = parse_log(args.logfile)
+    try:
+        for spec in args.filter:
+            parse_filter_spec(spec)
+        offsets = parse_offsets(args.offset)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.lod and args.output:
+        print("Error: --lod opens an interactive viewer and cannot be combined with --output", file=sys.stderr)
+        sys.exit(1)
+
+    if args.resample < 1 or args.nperseg < 2:
+        print("Error: --resample must be at least 1 and --nperseg at least 2", file=sys.stderr)
+        sys.exit(1)
+
+    if args.follow:
+        follow(args.logfile, args.title, args.window)
+        return
+
+    stats = ScanStats()
+    if args.export:
+        # Imported here: pyarrow/h5py would add to the start-up of every other run
+        from ivi_export import export_log
+        process = None
+        if args.filter or args.resample > 1:
+            process = TableFilter(args.filter, ['x', 'y', 'z'], 'timestamp_ns', TIME_SCALES['imu'],
+                                  args.resample, args.fs, group='sensor_id')
+        try:
+            rows = export_log(args.logfile, ImuSink(), args.export, start=args.start, end=args.end,
+                              jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir, stats=stats,
+                              process=process)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(stats.report())
+        if not rows:
+            print("No matching sensor log lines found.", file=sys.stderr)
+            sys.exit(1)
+        print(f"Exported {rows} rows to {args.export}")
+        return
 
-    if not accel['x'] and not gyro['x']:
+    if args.stats_only:
+        summary = summarize_log(args.logfile, ImuSink(), start=args.start, end=args.end, jobs=args.jobs,
+                                cache_dir=None if args.no_cache else args.cache_dir, stats=stats)
+        print(stats.report())
+        if not any(series['x'].count for series in summary.values()):
+            print("No matching sensor log lines found.", file=sys.stderr)
+            sys.exit(1)
+        for name, stream in (("Accelerometer (Sensor 1)", 'accel'), ("Gyroscope (Sensor 4)", 'gyro')):
+            print(f"  {name}:")
+            for axis in ('x', 'y', 'z'):
+                print(f"    {axis}: {summary[stream][axis].describe()}")
+        return
+
+    corrected = None
+    if args.compensate:
+        accel, gyro, *corrected = compensate_log(args.logfile, args.speed_field, jobs=args.jobs,
+                                                 cache_dir=None if args.no_cache else args.cache_dir,
+                                                 start=args.start, end=args.end, stats=stats, offsets=offsets)
+    else:
+        accel, gyro = parse_log(args.logfile, jobs=args.jobs,
+                                cache_dir=None if args.no_cache else args.cache_dir,
+                                start=args.start, end=args.end, stats=stats)
+    if stats.lines:
+        print(stats.report())
+
+    if not len(accel['x']) and not len(gyro['x']):
         print("No matching sensor log lines found.", file=sys.stderr)
         sys.exit(1)
 
     print(f"Parsed sensor data:")
     print_stats("Accelerometer (Sensor 1)", accel)
     print_stats("Gyroscope (Sensor 4)", gyro)
+    if corrected:
+        print(f"Bias-corrected sensor data:")
+        print_stats("Accelerometer (Sensor 1)", corrected[0])
+        print_stats("Gyroscope (Sensor 4)", corrected[1])
+
+    overlay, overlay_label = corrected, "bias-corrected"
+    if args.filter or args.resample > 1:
+        try:
+            overlay = filter_streams(corrected or (accel, gyro), args.filter, args.resample, args.fs)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        overlay_label = "bias-corrected, filtered" if corrected else "filtered"
+        print(f"Filtered sensor data:")
+        print_stats("Accelerometer (Sensor 1)", overlay[0])
+        print_stats("Gyroscope (Sensor 4)", overlay[1])
+
+    if args.lod:
+        import matplotlib.pyplot as plt
+        series = {f'{name}_{axis}': data[axis] for name, data in (('accel', accel), ('gyro', gyro))
+                  for axis in ('x', 'y', 'z')}
+        # Windowed parses are not cached, neither are their pyramids
+        cached = not args.no_cache and args.start is None and args.end is None
+        pyramids = load_pyramids(series, args.logfile,
+                                 lod_path(args.logfile, [ImuSink()], args.cache_dir) if cached else None)
+        viewers = lod_viewers(accel, gyro, args.title, pyramids, overlay, overlay_label)
+        plt.show()
+        return
 
-    # Figure 1: Accelerometer
-    if accel['x']:
-        fig1, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 8), sharex=True)
-        fig1.suptitle(f"{args.title} — Accelerometer (Sensor 1)")
-
-        ax1.plot(accel['ts'], accel['x'], linewidth=0.6, color='steelblue')
-        ax1.axhline(0, color='gray', linewidth=0.5, linestyle='--')
-        ax1.set_ylabel("Accel X (m/s²)")
-        ax1.grid(True, alpha=0.4)
-
-        ax2.plot(accel['ts'], accel['y'], linewidth=0.6, color='darkorange')
-        ax2.axhline(0, color='gray', linewidth=0.5, linestyle='--')
-        ax2.set_ylabel("Accel Y (m/s²)")
-        ax2.grid(True, alpha=0.4)
-
-        ax3.plot(accel['ts'], accel['z'], linewidth=0.6, color='forestgreen')
-        ax3.axhline(0, color='gray', linewidth=0.5, linestyle='--')
-        ax3.set_ylabel("Accel Z (m/s²)")
-        ax3.set_xlabel("Sample index")
-        ax3.grid(True, alpha=0.4)
-
-        fig1.tight_layout()
-
-        if args.output:
-            accel_path = args.output.replace('.png', '_accel.png')
-            fig1.savefig(accel_path, dpi=150)
-            print(f"Accelerometer plot saved to {accel_path}")
-
-    # Figure 2: Gyroscope
-    if gyro['x']:
-        fig2, (ax4, ax5, ax6) = plt.subplots(3, 1, figsize=(12, 8), sharex=True)
-        fig2.suptitle(f"{args.title} — Gyroscope (Sensor 4)")
-
-        ax4.plot(gyro['ts'], gyro['x'], linewidth=0.6, color='steelblue')
-        ax4.axhline(0, color='gray', linewidth=0.5, linestyle='--')
-        ax4.set_ylabel("Gyro X (rad/s)")
-        ax4.grid(True, alpha=0.4)
-
-        ax5.plot(gyro['ts'], gyro['y'], linewidth=0.6, color='darkorange')
-        ax5.axhline(0, color='gray', linewidth=0.5, linestyle='--')
-        ax5.set_ylabel("Gyro Y (rad/s)")
-        ax5.grid(True, alpha=0.4)
-
-        ax6.plot(gyro['ts'], gyro['z'], linewidth=0.6, color='forestgreen')
-        ax6.axhline(0, color='gray', linewidth=0.5, linestyle='--')
-        ax6.set_ylabel("Gyro Z (rad/s)")
-        ax6.set_xlabel("Sample index")
-        ax6.grid(True, alpha=0.4)
-
-        fig2.tight_layout()
-
-        if args.output:
-            gyro_path = args.output.replace('.png', '_gyro.png')
-            fig2.savefig(gyro_path, dpi=150)
-            print(f"Gyroscope plot saved to {gyro_path}")
+    if args.output:
+        use_headless_backend()
+    figures = plot_figures(accel, gyro, args.title, args.decimate, overlay, overlay_label)
+    if args.spectrogram:
+        figures.update(spectrogram_figures(*(overlay or (accel, gyro)), args.title, args.nperseg, args.fs))
+    if args.output:
+        for name, label in (('accel', "Accelerometer"), ('gyro', "Gyroscope"),
+                            ('accel_spectrogram', "Accelerometer spectrogram"),
+                            ('gyro_spectrogram', "Gyroscope spectrogram")):
+            if name in figures:
+                path = args.output.replace('.png', f'_{name}.png')
+                figures[name].savefig(path, dpi=150)
+                print(f"{label} plot saved to {path}")
 
     if not args.output:
+        import matplotlib.pyplot as plt
         plt.show()
 
 
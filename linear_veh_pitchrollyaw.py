@@ -2,70 +2,103 @@
 """
 Plot vehRoll, vehPitch, and vehHeading from UBX-NAV-PVAT log lines like:
   sensormanager: ...[UBX-NAV-PVAT ... vehRoll=0.14072 vehPitch=4.02714 vehHeading=56.2498 ...]
+Any other payload keys (gSpeed, lat, lon, ...) can be plotted with --fields.
 """
 
-import math
-import re
 import sys
 import argparse
-import matplotlib.pyplot as plt
+import numpy as np
 
-# Matches UBX-NAV-PVAT lines and captures the key=value payload
-LOG_PATTERN = re.compile(r'\[UBX-NAV-PVAT\s+(.*?)\]')
+from ivi_backend import use_headless_backend
+from ivi_decimate import DECIMATE_DEFAULT, DECIMATE_METHODS, decimate, plot_points
+from ivi_follow import FOLLOW_WINDOW, LivePlot, run_follow
+from ivi_lod import LodViewer, load_pyramids, lod_path, place
+from ivi_log_cache import CACHE_DIR, scan_log_cached
+from ivi_log_engine import (PVAT_FIELDS, PvatSink, ScanStats, parse_field_spec, scan_log, to_numpy,
+                            unique_field_specs)
+from ivi_log_index import scan_window
+from ivi_merge import time_axis
+from ivi_stats import summarize_log
 
-# Extract specific fields
-FIELD_PATTERNS = {
-    'vehRoll': re.compile(r'vehRoll=([\-\d\.eEnNaAiIfF]+)'),
-    'vehPitch': re.compile(r'vehPitch=([\-\d\.eEnNaAiIfF]+)'),
-    'vehHeading': re.compile(r'vehHeading=([\-\d\.eEnNaAiIfF]+)'),
+# Y label and color of the default fields; other fields are labelled with their key
+FIELD_STYLES = {
+    'vehRoll': ("Roll (deg)", 'steelblue'),
+    'vehPitch': ("Pitch (deg)", 'crimson'),
+    'vehHeading': ("Heading (deg)", 'darkorange'),
 }
+FIELD_COLORS = ('steelblue', 'crimson', 'darkorange', 'forestgreen', 'purple', 'saddlebrown')
 
 
-def parse_log(filepath: str):
-    """Parse log and extract vehRoll, vehPitch, vehHeading synchronously.
+def field_style(name: str, position: int):
+    return FIELD_STYLES.get(name, (name, FIELD_COLORS[position % len(FIELD_COLORS)]))
+
+
+def parse_log(filepath: str, fields: list = PVAT_FIELDS, jobs: int = 1, cache_dir: str = None,
+              start: float = None, end: float = None, stats: ScanStats = None, with_time: bool = False):
+    """Parse log and extract the requested PVAT fields (default vehRoll, vehPitch, vehHeading) synchronously.
     Only keeps samples where ALL fields are valid.
+    Returns (sample_index, *columns) with one column per field.
+    With cache_dir set, a cached parse of the same log is reused or extended.
+    With start/end set (UBX-NAV-PVAT iTOW, ms), only that time window is read from the log.
+    With with_time set, returns (results, iTOW of each sample) instead.
     """
-    timestamps = []
-    roll_vals = []
-    pitch_vals = []
-    heading_vals = []
-    sample_count = 0
-
-    with open(filepath, 'r', errors='replace') as f:
-        for lineno, line in enumerate(f, start=1):
-            m = LOG_PATTERN.search(line)
-            if not m:
-                continue
-            payload = m.group(1)
-
-            # Extract all three fields
-            parsed = {}
-            valid = True
-            for name, pat in FIELD_PATTERNS.items():
-                fm = pat.search(payload)
-                if not fm:
-                    valid = False
-                    break
-                try:
-                    value = float(fm.group(1))
-                except ValueError:
-                    valid = False
-                    break
-                if math.isnan(value) or math.isinf(value):
-                    valid = False
-                    break
-                parsed[name] = value
-
-            if not valid:
-                continue
-
-            timestamps.append(sample_count)
-            roll_vals.append(parsed['vehRoll'])
-            pitch_vals.append(parsed['vehPitch'])
-            heading_vals.append(parsed['vehHeading'])
-            sample_count += 1
-
-    return timestamps, roll_vals, pitch_vals, heading_vals
+    pvat = PvatSink(fields)
+    if start is not None or end is not None:
+        scan_window(filepath, [pvat], 'pvat', start, end, jobs=jobs, cache_dir=cache_dir, stats=stats)
+    elif cache_dir:
+        scan_log_cached(filepath, [pvat], jobs=jobs, cache_dir=cache_dir, stats=stats)
+    else:
+        scan_log(filepath, [pvat], jobs=jobs, stats=stats)
+    if with_time:
+        return pvat.result(), to_numpy(pvat.time)
+    return pvat.result()
+
+
+def stats_rows(names: list, columns: list) -> list:
+    """(stream, field, samples, min, max, mean) of each PVAT field; empty if there are no samples."""
+    return [('UBX-NAV-PVAT', name, len(vals), vals.min(), vals.max(), vals.mean())
+            for name, vals in zip(names, columns) if len(vals)]
+
+
+def plot_figure(timestamps: np.ndarray, columns: list, names: list, title: str, method: str = DECIMATE_DEFAULT,
+                xlabel: str = "Sample index"):
+    """One panel per PVAT field of the parse_log() results, against `timestamps` (see
+    ivi_merge.time_axis())."""
+    import matplotlib.pyplot as plt
+
+    # ~2 points per horizontal pixel of the 12-inch-wide figures saved at dpi=150
+    n_points = plot_points(12, 150)
+
+    fig, axes = plt.subplots(len(names), 1, figsize=(12, 10 if len(names) <= 3 else 3 * len(names)), sharex=True)
+    axes = np.atleast_1d(axes)
+
+    for i, (ax, name, vals) in enumerate(zip(axes, names, columns)):
+        ylabel, color = field_style(name, i)
+        ax.plot(*decimate(timestamps, vals, method, n_points), linewidth=0.8, color=color, label=name)
+        if vals.min() < 0 < vals.max():
+            ax.axhline(0, color='gray', linewidth=0.6, linestyle='--')
+        ax.set_ylabel(ylabel)
+        ax.legend()
+        ax.grid(True, alpha=0.4)
+    axes[0].set_title(title)
+    axes[-1].set_xlabel(xlabel)
+
+    fig.tight_layout()
+    return fig
+
+
+def follow(logfile: str, title: str, window: int, fields: list):
+    """Live plot of the requested PVAT fields while the log is being written."""
+    names = [parse_field_spec(spec)[0] for spec in fields]
+    plot = LivePlot(f"{title} — live", {
+        'pvat': [field_style(name, i) for i, name in enumerate(names)],
+    }, capacity=window)
+
+    def extract(batch):
+        _, *columns = batch.result()
+        return {'pvat': np.column_stack(columns)}
+
+    run_follow(logfile, PvatSink(fields), plot, extract)
 
 
 def main():
@@ -73,6 +106,10 @@ def main():
         description="Plot vehRoll, vehPitch, vehHeading from UBX-NAV-PVAT log lines."
     )
     parser.add_argument('logfile', help="Path to the log file")
+    parser.add_argument(
+        '--fields', nargs='+', default=list(PVAT_FIELDS),
+        help=f"UBX-NAV-PVAT keys to plot, as name or name:int (default: {' '.join(PVAT_FIELDS)})"
+    )
     parser.add_argument(
         '--output', default=None,
         help="Save plot to file instead of displaying (e.g. output.png)"
@@ -81,49 +118,137 @@ def main():
         '--title', default="Vehicle Pitch/Roll/Yaw (UBX-NAV-PVAT)",
         help="Plot title"
     )
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help="Parse with N worker processes (0 = all cores, default: 1)"
+    )
+    parser.add_argument(
+        '--cache-dir', default=CACHE_DIR,
+        help=f"Directory for cached parse results (default: {CACHE_DIR})"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="Always parse the log from scratch and do not write the cache"
+    )
+    parser.add_argument(
+        '--follow', action='store_true',
+        help="Tail a log that is still being written and plot the latest samples live"
+    )
+    parser.add_argument(
+        '--window', type=int, default=FOLLOW_WINDOW,
+        help=f"Samples shown per panel in --follow mode (default: {FOLLOW_WINDOW})"
+    )
+    parser.add_argument(
+        '--decimate', choices=DECIMATE_METHODS, default=DECIMATE_DEFAULT,
+        help=f"Reduce each series to ~2 points per pixel before plotting (default: {DECIMATE_DEFAULT})"
+    )
+    parser.add_argument(
+        '--lod', action='store_true',
+        help="Open an interactive viewer that redraws only the visible range from a min/max pyramid "
+             "(stored with the parse cache)"
+    )
+    parser.add_argument(
+        '--export', default=None,
+        help="Write the parsed columns to a file instead of plotting, in batches while parsing "
+             "(format by extension: .parquet, .arrow/.feather, .h5/.hdf5)"
+    )
+    parser.add_argument(
+        '--stats-only', action='store_true',
+        help="Print min/max/mean/std and p50/p95/p99 per field in constant memory, without plotting"
+    )
+    parser.add_argument(
+        '--start', type=float, default=None,
+        help="Only plot samples at or after this timestamp (UBX-NAV-PVAT iTOW, ms; the plot's time axis "
+             "is the same clock in s)"
+    )
+    parser.add_argument(
+        '--end', type=float, default=None,
+        help="Only plot samples at or before this timestamp (UBX-NAV-PVAT iTOW, ms; the plot's time axis "
+             "is the same clock in s)"
+    )
     args = parser.parse_args()
 
-    timestamps, roll_vals, pitch_vals, heading_vals = parse_log(args.logfile)
+    try:
+        args.fields = unique_field_specs(args.fields)
+        names = [parse_field_spec(spec)[0] for spec in args.fields]
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.lod and args.output:
+        print("Error: --lod opens an interactive viewer and cannot be combined with --output", file=sys.stderr)
+        sys.exit(1)
+
+    if args.follow:
+        follow(args.logfile, args.title, args.window, args.fields)
+        return
+
+    stats = ScanStats()
+    if args.export:
+        # Imported here: pyarrow/h5py would add to the start-up of every other run
+        from ivi_export import export_log
+        try:
+            rows = export_log(args.logfile, PvatSink(args.fields), args.export, start=args.start, end=args.end,
+                              jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir, stats=stats)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(stats.report())
+        if not rows:
+            print("No matching UBX-NAV-PVAT log lines found.", file=sys.stderr)
+            sys.exit(1)
+        print(f"Exported {rows} rows to {args.export}")
+        return
 
-    if not timestamps:
+    if args.stats_only:
+        summary = summarize_log(args.logfile, PvatSink(args.fields), start=args.start, end=args.end, jobs=args.jobs,
+                                cache_dir=None if args.no_cache else args.cache_dir, stats=stats)['pvat']
+        print(stats.report())
+        if not summary[names[0]].count:
+            print("No matching UBX-NAV-PVAT log lines found.", file=sys.stderr)
+            sys.exit(1)
+        for name in names:
+            print(f"  {name + ':':11s} {summary[name].describe(5)}")
+        return
+
+    (timestamps, *columns), itow = parse_log(
+        args.logfile, args.fields, jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir,
+        start=args.start, end=args.end, stats=stats, with_time=True)
+    if stats.lines:
+        print(stats.report())
+
+    if not len(timestamps):
         print("No matching UBX-NAV-PVAT log lines found.", file=sys.stderr)
         sys.exit(1)
 
     print(f"Parsed {len(timestamps)} samples.")
-    print(f"  vehRoll:    Min={min(roll_vals):.5f}  Max={max(roll_vals):.5f}  Mean={sum(roll_vals)/len(roll_vals):.5f}")
-    print(f"  vehPitch:   Min={min(pitch_vals):.5f}  Max={max(pitch_vals):.5f}  Mean={sum(pitch_vals)/len(pitch_vals):.5f}")
-    print(f"  vehHeading: Min={min(heading_vals):.5f}  Max={max(heading_vals):.5f}  Mean={sum(heading_vals)/len(heading_vals):.5f}")
-
-    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 10), sharex=True)
-
-    # vehRoll
-    ax1.plot(timestamps, roll_vals, linewidth=0.8, color='steelblue', label='vehRoll')
-    ax1.axhline(0, color='gray', linewidth=0.6, linestyle='--')
-    ax1.set_ylabel("Roll (deg)")
-    ax1.set_title(args.title)
-    ax1.legend()
-    ax1.grid(True, alpha=0.4)
-
-    # vehPitch
-    ax2.plot(timestamps, pitch_vals, linewidth=0.8, color='crimson', label='vehPitch')
-    ax2.axhline(0, color='gray', linewidth=0.6, linestyle='--')
-    ax2.set_ylabel("Pitch (deg)")
-    ax2.legend()
-    ax2.grid(True, alpha=0.4)
-
-    # vehHeading
-    ax3.plot(timestamps, heading_vals, linewidth=0.8, color='darkorange', label='vehHeading')
-    ax3.set_xlabel("Sample index")
-    ax3.set_ylabel("Heading (deg)")
-    ax3.legend()
-    ax3.grid(True, alpha=0.4)
+    for _, name, _, vmin, vmax, mean in stats_rows(names, columns):
+        print(f"  {name + ':':11s} Min={vmin:.5f}  Max={vmax:.5f}  Mean={mean:.5f}")
+    # Plot against iTOW, the clock --start/--end are given in
+    x, xlabel = time_axis(itow, 'pvat', timestamps)
 
-    fig.tight_layout()
+    if args.lod:
+        import matplotlib.pyplot as plt
+        # Windowed parses are not cached, neither are their pyramids
+        cached = not args.no_cache and args.start is None and args.end is None
+        pyramids = load_pyramids(dict(zip(names, columns)), args.logfile,
+                                 lod_path(args.logfile, [PvatSink(args.fields)], args.cache_dir) if cached else None)
+        viewer = LodViewer([(field_style(name, i)[0],
+                             [(name, place(pyramids[name], x), field_style(name, i)[1])])
+                            for i, name in enumerate(names)], args.title, xlabel,
+                           figsize=(12, 10 if len(names) <= 3 else 3 * len(names)))
+        plt.show()
+        return
+
+    if args.output:
+        use_headless_backend()
+    fig = plot_figure(x, columns, names, args.title, args.decimate, xlabel)
 
     if args.output:
         fig.savefig(args.output, dpi=150)
         print(f"Plot saved to {args.output}")
     else:
+        import matplotlib.pyplot as plt
         plt.show()
 
 
@@ -0,0 +1,177 @@
+import bisect, csv, os, sqlite3
+from typing import Any, Dict, List, Set
+
+""" Message fields, in db.csv column order """
+MSG_FIELDS = ('name', 'id', 'payload', 'period_en', 'period')
+DEFAULT_PERIOD = 100
+
+
+class MsgStore:
+    """ Messages database: SQLite in WAL mode, mirrored in memory
+
+    Messages keep the order they were added in and are addressed by position (as shown in the GUI) or by
+    their stable key. Every edit is one keyed INSERT/UPDATE/DELETE appended to the write-ahead log instead of
+    a rewrite of the whole database; the log is folded back into the database file (compacted) every
+    __CHECKPOINT_EDITS edits and on close(). Lookups by name and by CAN id go through in-memory indexes.
+    """
+    __CHECKPOINT_EDITS = 1000
+    __SCHEMA = """
+        CREATE TABLE IF NOT EXISTS msgs (
+            key INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            id TEXT NOT NULL,
+            can_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            period_en INTEGER NOT NULL DEFAULT 0,
+            period INTEGER NOT NULL DEFAULT 100
+        );
+        CREATE INDEX IF NOT EXISTS msgs_name ON msgs (name);
+        CREATE INDEX IF NOT EXISTS msgs_can_id ON msgs (can_id);
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('PRAGMA synchronous=NORMAL')
+        self.__db.executescript(self.__SCHEMA)
+        self.__edits = 0
+        self.__keys: List[int] = []
+        self.__msgs: Dict[int, Dict[str, Any]] = {}
+        self.__by_name: Dict[str, Set[int]] = {}
+        self.__by_can_id: Dict[int, Set[int]] = {}
+        for row in self.__db.execute('SELECT key, name, id, payload, period_en, period FROM msgs ORDER BY key'):
+            self.__add_to_memory(row[0], dict(zip(MSG_FIELDS, row[1:])))
+
+    @staticmethod
+    def can_id(msg_id: str) -> int:
+        """ Numeric CAN id of an id string such as '0x510'; -1 when it is not valid hex """
+        try:
+            return int(str(msg_id), 16)
+        except ValueError:
+            return -1
+
+    def __add_to_memory(self, key: int, msg: Dict[str, Any]) -> None:
+        """ Keys are handed out in increasing order, so the key list stays sorted """
+        msg['period_en'] = bool(msg['period_en'])
+        self.__keys.append(key)
+        self.__msgs[key] = msg
+        self.__index(key, msg)
+
+    def __index(self, key: int, msg: Dict[str, Any]) -> None:
+        self.__by_name.setdefault(msg['name'], set()).add(key)
+        self.__by_can_id.setdefault(self.can_id(msg['id']), set()).add(key)
+
+    def __unindex(self, key: int, msg: Dict[str, Any]) -> None:
+        for index, value in ((self.__by_name, msg['name']), (self.__by_can_id, self.can_id(msg['id']))):
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+
+    def __commit(self, edits: int = 1) -> None:
+        self.__db.commit()
+        self.__edits += edits
+        if self.__edits >= self.__CHECKPOINT_EDITS:
+            self.compact()
+
+    """ ============================================= Class interface ============================================= """
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def key(self, index: int) -> int:
+        """ Stable key of the message at position `index` """
+        return self.__keys[index]
+
+    def index(self, key: int) -> int:
+        """ Position of the message with `key` """
+        return bisect.bisect_left(self.__keys, key)
+
+    def get(self, key: int) -> Dict[str, Any]:
+        """ Fields of a message by key (a copy) """
+        return dict(self.__msgs[key])
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """ Fields of all messages in order """
+        return [self.__msgs[key] for key in self.__keys]
+
+    def find_by_name(self, name: str) -> List[int]:
+        return sorted(self.__by_name.get(name, ()))
+
+    def find_by_can_id(self, can_id: int) -> List[int]:
+        return sorted(self.__by_can_id.get(can_id, ()))
+
+    def add(self, name: str, msg_id: str, payload: str, period_en: bool = False,
+            period: int = DEFAULT_PERIOD) -> int:
+        """ Append a message; returns its key """
+        key = self.__db.execute('INSERT INTO msgs (name, id, can_id, payload, period_en, period) '
+                                'VALUES (?, ?, ?, ?, ?, ?)',
+                                (name, msg_id, self.can_id(msg_id), payload, int(period_en), int(period))).lastrowid
+        self.__commit()
+        self.__add_to_memory(key, {'name': name, 'id': msg_id, 'payload': payload, 'period_en': period_en,
+                                   'period': int(period)})
+        return key
+
+    def update(self, key: int, **fields: Any) -> None:
+        """ Change some fields (see MSG_FIELDS) of the message with `key` """
+        unknown = set(fields) - set(MSG_FIELDS)
+        if unknown:
+            raise KeyError(f'Unknown message field(s): {sorted(unknown)}')
+        msg = self.__msgs[key]
+        values = dict(fields)
+        if 'period_en' in values:
+            values['period_en'] = int(bool(values['period_en']))
+        if 'period' in values:
+            values['period'] = int(values['period'])
+        if 'id' in values:
+            values['can_id'] = self.can_id(values['id'])
+        self.__db.execute('UPDATE msgs SET {} WHERE key = ?'.format(', '.join(f'{col} = ?' for col in values)),
+                          (*values.values(), key))
+        self.__commit()
+        self.__unindex(key, msg)
+        msg.update(fields)
+        msg['period_en'] = bool(msg['period_en'])
+        self.__index(key, msg)
+
+    def remove(self, key: int) -> None:
+        """ Delete the message with `key` """
+        self.__db.execute('DELETE FROM msgs WHERE key = ?', (key,))
+        self.__commit()
+        msg = self.__msgs.pop(key)
+        self.__unindex(key, msg)
+        del self.__keys[self.index(key)]
+
+    def import_csv(self, csv_path: str) -> int:
+        """ Append all messages of a db.csv file (columns name, id, payload[, period_en, period]) in one
+        transaction; returns the number imported """
+        with open(csv_path, newline='') as f:
+            rows = [row for row in csv.DictReader(f) if row.get('id')]
+        msgs = []
+        for row in rows:
+            try:
+                period = int(float(row.get('period') or DEFAULT_PERIOD))
+            except ValueError:
+                period = DEFAULT_PERIOD
+            msgs.append((row.get('name') or '', row['id'].strip(), (row.get('payload') or '').strip(),
+                         str(row.get('period_en', '')).strip().lower() in ('true', '1'), period))
+        with self.__db:
+            keys = [self.__db.execute('INSERT INTO msgs (name, id, can_id, payload, period_en, period) '
+                                      'VALUES (?, ?, ?, ?, ?, ?)',
+                                      (name, msg_id, self.can_id(msg_id), payload, int(period_en), period)).lastrowid
+                    for name, msg_id, payload, period_en, period in msgs]
+        for key, msg in zip(keys, msgs):
+            self.__add_to_memory(key, dict(zip(MSG_FIELDS, msg)))
+        self.__commit(len(msgs))
+        return len(msgs)
+
+    def compact(self) -> None:
+        """ Fold the write-ahead log back into the database file and truncate it """
+        self.__db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.__edits = 0
+
+    def close(self) -> None:
+        self.compact()
+        self.__db.close()
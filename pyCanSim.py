@@ -0,0 +1,139 @@
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+from canRxPipeline import RxPipeline
+from canUsbTransport import CompiledFrame, UsbCanA
+from frameCache import FrameCache
+from simguiWindow import DbConfigMan, SimGui
+from simScheduler import TxScheduler
+
+DEFAULT_PERIOD_MS = 100
+
+
+class PyCanSim:
+    """ pyCanSim application: messages database, GUI and periodic transmission """
+
+    def __init__(self, send_frames_h: Optional[Callable[[List[CompiledFrame]], None]] = None,
+                 get_rx_stats_h: Optional[Callable[[], Dict[int, Dict[str, Any]]]] = None):
+        """ send_frames_h(frames) transmits a batch of compiled frames; it is called from the scheduler thread.
+        get_rx_stats_h() returns the per-id receive statistics shown in the bus monitor """
+        self.__send_frames_h = send_frames_h
+        self.__db = DbConfigMan()
+        self.__frames = FrameCache(get_msg_h=self.__db.get_msg)
+        self.__scheduler = TxScheduler(send_frames_h=self.__send_frames)
+        self.__gui = SimGui(switch_sim_en_h=self.__switch_sim_en,
+                            add_msg_h=self.__add_msg,
+                            delete_msg_h=self.__delete_msg,
+                            modify_msg_h=self.__modify_msg,
+                            get_msg_config_h=self.__db.get_msg_config,
+                            send_msg_trig_h=self.__send_msg_trig,
+                            get_rx_stats_h=get_rx_stats_h)
+
+    @staticmethod
+    def msg_period_ms(msg: Dict[str, Any]) -> float:
+        """ Transmit period of a db message, DEFAULT_PERIOD_MS when missing or invalid """
+        try:
+            period = float(msg['period'])
+        except (KeyError, TypeError, ValueError):
+            return DEFAULT_PERIOD_MS
+        return period if period > 0 else DEFAULT_PERIOD_MS
+
+    def __schedule_msg(self, key: int) -> None:
+        """ Schedule or unschedule one message according to its period_en """
+        msg = self.__db.get_msg(key)
+        if msg['period_en']:
+            self.__scheduler.set_msg(key, self.__frames.get(key), self.msg_period_ms(msg))
+        else:
+            self.__scheduler.remove_msg(key)
+
+    def __sync_scheduler(self) -> None:
+        """ Schedule exactly the db messages with period_en set """
+        keys = self.__db.get_msg_keys()
+        for key in set(self.__scheduler.keys()) - set(keys):
+            self.__scheduler.remove_msg(key)
+        for key in keys:
+            self.__schedule_msg(key)
+
+    def __send_frames(self, frames: List[CompiledFrame]) -> None:
+        if self.__send_frames_h is not None:
+            self.__send_frames_h(frames)
+
+    def __switch_sim_en(self, sim_en: bool) -> None:
+        """ Start/stop periodic transmission of the enabled messages """
+        if sim_en:
+            self.__sync_scheduler()
+            self.__scheduler.start()
+            print('Simulation started: {} periodic message(s)'.format(len(self.__scheduler.keys())))
+        else:
+            self.__scheduler.stop()
+            print('Simulation stopped')
+            self.print_stats()
+
+    def __add_msg(self, name: str, msg_id: str, payload: str) -> bool:
+        """ New messages start with periodic transmission disabled, nothing to schedule """
+        return self.__db.add_msg(name=name, msg_id=msg_id, payload=payload)
+
+    def __delete_msg(self, index: int) -> None:
+        key = self.__db.get_msg_key(index)
+        self.__db.delete_msg(index=index)
+        self.__scheduler.remove_msg(key)
+        self.__frames.invalidate(key)
+
+    def __modify_msg(self, index: int, name: str, msg_id: str, payload: str, period_en: bool) -> bool:
+        if not self.__db.modify_msg(index=index, name=name, msg_id=msg_id, payload=payload, period_en=period_en):
+            return False
+        key = self.__db.get_msg_key(index)
+        self.__frames.invalidate(key)
+        self.__schedule_msg(key)
+        return True
+
+    def __send_msg_trig(self, index: int) -> None:
+        """ Send one message right away """
+        frame = self.__frames.get(self.__db.get_msg_key(index))
+        if self.__send_frames_h is None:
+            print('No CAN transport, not sent: id=0x{:X} data={}'.format(frame.can_id, frame.data.hex(' ')))
+        else:
+            self.__send_frames([frame])
+
+    """ ============================================= Class interface ============================================= """
+
+    def print_stats(self) -> None:
+        """ Print per-message transmit, jitter and overrun statistics of the last simulation run """
+        for key, stats in sorted(self.__scheduler.get_stats().items()):
+            try:
+                name = self.__db.get_msg(key)['name']
+            except KeyError:
+                name = '?'
+            print('  {:>3} {:<20} {:7.1f} ms  sent={:<7} overruns={:<5} jitter avg={:.0f} us std={:.0f} us '
+                  'max={:.0f} us'.format(key, str(name), stats['period_ms'], stats['sent'], stats['overruns'],
+                                         stats['jitter_avg_us'], stats['jitter_std_us'], stats['jitter_max_us']))
+
+    def run(self) -> None:
+        """ Run the gui; periodic transmission stops when it is closed """
+        try:
+            self.__gui.run_gui()
+        finally:
+            self.__scheduler.stop()
+            self.__db.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3:
+        print('Usage: python pyCanSim.py [serial port of the USB-CAN-A adapter] [CAN speed in bit/s]')
+        sys.exit(1)
+    if len(sys.argv) == 1:
+        PyCanSim().run()
+        sys.exit(0)
+    try:
+        adapter = UsbCanA.open(sys.argv[1])
+        adapter.configure(int(sys.argv[2]) if len(sys.argv) == 3 else 500000)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    rx = RxPipeline(adapter.get_port())
+    rx.start()
+    try:
+        PyCanSim(send_frames_h=adapter.send_compiled, get_rx_stats_h=rx.get_stats).run()
+    finally:
+        rx.stop()
+        adapter.close()
@@ -0,0 +1,189 @@
+import heapq, itertools, math, sys, threading, time
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class PeriodicMsg:
+    """ One periodically transmitted message and its timing statistics """
+    __slots__ = ('frame', 'period_ns', 'generation', 'sent', 'overruns', 'jitter_sum_ns', 'jitter_sq_sum_ns',
+                 'jitter_max_ns')
+
+    def __init__(self, frame: Any, period_ns: int, generation: int):
+        self.frame = frame
+        self.period_ns = period_ns
+        self.generation = generation
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """ Clear jitter and overrun statistics """
+        self.sent = 0
+        self.overruns = 0
+        self.jitter_sum_ns = 0
+        self.jitter_sq_sum_ns = 0
+        self.jitter_max_ns = 0
+
+    def record(self, jitter_ns: int, missed: int) -> None:
+        """ Account one transmission, sent jitter_ns after its deadline, after missing `missed` slots """
+        self.sent += 1
+        self.overruns += missed
+        self.jitter_sum_ns += jitter_ns
+        self.jitter_sq_sum_ns += jitter_ns * jitter_ns
+        self.jitter_max_ns = max(self.jitter_max_ns, jitter_ns)
+
+    def stats(self) -> Dict[str, float]:
+        """ Transmissions, overruns (missed periods) and jitter (lateness after the deadline) in us """
+        mean = self.jitter_sum_ns / self.sent if self.sent else 0.0
+        var = self.jitter_sq_sum_ns / self.sent - mean * mean if self.sent else 0.0
+        return {'period_ms': self.period_ns / 1e6, 'sent': self.sent, 'overruns': self.overruns,
+                'jitter_avg_us': mean / 1e3, 'jitter_std_us': math.sqrt(max(var, 0.0)) / 1e3,
+                'jitter_max_us': self.jitter_max_ns / 1e3}
+
+
+class TxScheduler:
+    """ Periodic transmit scheduler on a dedicated thread
+
+    Deadlines of all periodic messages sit in one heap ordered by due time. The
+    thread sleeps until just before the earliest deadline, busy-waits the last
+    __SPIN_NS, then pops every message that is due and hands their frames to
+    send_frames_h as one batch. Each message is rescheduled at its previous
+    deadline plus its period, so the schedule never drifts; when the thread
+    falls behind by whole periods, the missed slots are counted as overruns and
+    skipped instead of being sent in a burst.
+    """
+    __SPIN_NS = 2_000_000
+    __THREAD_NAME = 'can-tx-scheduler'
+
+    def __init__(self, send_frames_h: Callable[[List[Any]], None], spin_ns: int = __SPIN_NS):
+        """ send_frames_h(frames) is called from the scheduler thread with the frames due in one tick """
+        self.__send_frames_h = send_frames_h
+        self.__spin_ns = spin_ns
+        self.__cond = threading.Condition()
+        self.__heap = []
+        self.__msgs = {}
+        self.__generations = itertools.count()
+        self.__seq = itertools.count()
+        self.__thread = None
+        self.__running = False
+
+    def __push(self, key: Hashable, msg: PeriodicMsg, due_ns: int) -> None:
+        heapq.heappush(self.__heap, (due_ns, next(self.__seq), key, msg.generation))
+        self.__cond.notify()
+
+    def __run(self) -> None:
+        """ Scheduler thread main loop """
+        while True:
+            with self.__cond:
+                while self.__running and not self.__heap:
+                    self.__cond.wait()
+                if not self.__running:
+                    return
+                due_ns = self.__heap[0][0]
+                wait_ns = due_ns - time.perf_counter_ns() - self.__spin_ns
+                if wait_ns > 0:
+                    """ Woken early by set_msg/stop or the timeout; look at the heap again """
+                    self.__cond.wait(wait_ns / 1e9)
+                    continue
+
+            while time.perf_counter_ns() < due_ns:
+                """ Give up the GIL while spinning so other threads keep running """
+                time.sleep(0)
+
+            frames = []
+            with self.__cond:
+                if not self.__running:
+                    """ stop() returned while spinning; nothing may be sent after it """
+                    return
+                now_ns = time.perf_counter_ns()
+                while self.__heap and self.__heap[0][0] <= now_ns:
+                    due_ns, _, key, generation = heapq.heappop(self.__heap)
+                    msg = self.__msgs.get(key)
+                    if msg is None or msg.generation != generation:
+                        """ Removed or rescheduled since this entry was pushed """
+                        continue
+                    missed = (now_ns - due_ns) // msg.period_ns
+                    msg.record(now_ns - due_ns - missed * msg.period_ns, missed)
+                    heapq.heappush(self.__heap, (due_ns + (missed + 1) * msg.period_ns, next(self.__seq), key,
+                                                 generation))
+                    frames.append(msg.frame)
+            if frames:
+                try:
+                    self.__send_frames_h(frames)
+                except Exception as e:
+                    print(f'TX scheduler: sending {len(frames)} frame(s) failed: {e}')
+
+    @staticmethod
+    def __set_timer_resolution(enable: bool) -> None:
+        """ Windows sleeps/waits in ~15.6 ms ticks by default; use 1 ms ticks while running """
+        if sys.platform == 'win32':
+            try:
+                import ctypes
+                winmm = ctypes.WinDLL('winmm')
+                (winmm.timeBeginPeriod if enable else winmm.timeEndPeriod)(1)
+            except (AttributeError, OSError):
+                pass
+
+    """ ============================================= Class interface ============================================= """
+
+    def set_msg(self, key: Hashable, frame: Any, period_ms: float) -> None:
+        """ Add or update a periodic message; a new period restarts its schedule from now """
+        period_ns = max(1, int(period_ms * 1e6))
+        with self.__cond:
+            msg = self.__msgs.get(key)
+            if msg is not None and msg.period_ns == period_ns:
+                msg.frame = frame
+                return
+            if msg is None:
+                msg = PeriodicMsg(frame, period_ns, next(self.__generations))
+                self.__msgs[key] = msg
+            else:
+                msg.frame, msg.period_ns, msg.generation = frame, period_ns, next(self.__generations)
+            self.__push(key, msg, time.perf_counter_ns())
+
+    def remove_msg(self, key: Hashable) -> None:
+        """ Stop transmitting a message; its pending deadline is dropped when it comes up """
+        with self.__cond:
+            self.__msgs.pop(key, None)
+
+    def clear(self) -> None:
+        """ Remove all messages """
+        with self.__cond:
+            self.__msgs.clear()
+            self.__heap.clear()
+
+    def keys(self) -> List[Hashable]:
+        with self.__cond:
+            return list(self.__msgs)
+
+    def start(self) -> None:
+        """ Start the scheduler thread; statistics start afresh """
+        with self.__cond:
+            if self.__running:
+                return
+            self.__running = True
+            now_ns = time.perf_counter_ns()
+            self.__heap.clear()
+            for key, msg in self.__msgs.items():
+                msg.reset_stats()
+                msg.generation = next(self.__generations)
+                self.__push(key, msg, now_ns)
+        self.__set_timer_resolution(True)
+        self.__thread = threading.Thread(target=self.__run, name=self.__THREAD_NAME, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """ Stop the scheduler thread and wait for it to finish the current batch """
+        with self.__cond:
+            if not self.__running:
+                return
+            self.__running = False
+            self.__cond.notify()
+        self.__thread.join()
+        self.__thread = None
+        self.__set_timer_resolution(False)
+
+    def is_running(self) -> bool:
+        return self.__running
+
+    def get_stats(self) -> Dict[Hashable, Dict[str, float]]:
+        """ Per-message statistics, see PeriodicMsg.stats() """
+        with self.__cond:
+            return {key: msg.stats() for key, msg in self.__msgs.items()}
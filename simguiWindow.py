@@ -1,7 +1,8 @@
-import os, schedule, time
+import os, time
 import pandas as pd
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, List, Optional
 from enum import Enum
+from msgStore import MsgStore
 
 try:
     import dearpygui.dearpygui as dpg
@@ -18,7 +19,8 @@ class MsgValid(Enum):
 
 class DbConfigMan:
     """ Class for messages database management """
-    __DB_FILE_PATH = r'candb\db.csv'
+    __DB_FILE_PATH = os.path.join('candb', 'db.sqlite')
+    __DB_CSV_FILE_PATH = os.path.join('candb', 'db.csv')
     __DB_H_NAME, __DB_H_ID, __DB_H_PAYLOAD, __DB_H_PERIOD_EN, __DB_H_PERIOD = \
         'name', 'id', 'payload', 'period_en', 'period'
     __DB_DF_HEADERS = [__DB_H_NAME, __DB_H_ID, __DB_H_PAYLOAD, __DB_H_PERIOD_EN, __DB_H_PERIOD]
@@ -26,35 +28,17 @@ class DbConfigMan:
     def __init__(self):
         self.__msg_config_df = None
         self.__create_db_config_file()
-        self.__load_db_config_from_file()
 
     def __create_db_config_file(self) -> None:
-        """ Create db file if does not exist """
-        if not os.path.exists(self.__DB_FILE_PATH):
-            self.__msg_config_df = pd.DataFrame(columns=self.__DB_DF_HEADERS)
-            if not os.path.exists(os.path.dirname(self.__DB_FILE_PATH)):
-                os.mkdir(os.path.dirname(self.__DB_FILE_PATH))
-            self.__msg_config_df.to_csv(self.__DB_FILE_PATH, index=False)
+        """ Open the db file; a new one is filled from the legacy csv db file if there is one """
+        is_new = not os.path.exists(self.__DB_FILE_PATH)
+        self.__store = MsgStore(self.__DB_FILE_PATH)
+        if is_new:
             print('Created db file: {}'.format(self.__DB_FILE_PATH))
-        else:
-            """ Db config file already exists, do nothing """
-            pass
-
-    def __load_db_config_from_file(self) -> None:
-        """ Load configuration from db file """
-        self.__msg_config_df = pd.read_csv(self.__DB_FILE_PATH)
-        print('Read db file:\n{}'.format(self.__msg_config_df))
-
-    def __save_db_config_to_file(self) -> None:
-        """ Save configuration to file """
-        self.__msg_config_df.to_csv(self.__DB_FILE_PATH + '.temp', index=False)
-        os.remove(self.__DB_FILE_PATH)
-        os.rename(self.__DB_FILE_PATH + '.temp', self.__DB_FILE_PATH)
-
-    def __update_db_config(self, new_config_db: pd.DataFrame) -> None:
-        """ Update msg configuration """
-        self.__msg_config_df = new_config_db
-        self.__save_db_config_to_file()
+            if os.path.exists(self.__DB_CSV_FILE_PATH):
+                imported = self.__store.import_csv(self.__DB_CSV_FILE_PATH)
+                print('Imported {} message(s) from {}'.format(imported, self.__DB_CSV_FILE_PATH))
+        print('Read db file: {} message(s)'.format(len(self.__store)))
 
     @staticmethod
     def __is_msg_valid(msg_id: str, payload: str) -> MsgValid:
@@ -96,10 +80,9 @@ class DbConfigMan:
         """ Add new message to db file """
         if MsgValid.VALID == self.__is_msg_valid(msg_id=msg_id, payload=payload):
             """ Provided message is valid """
-            new_msg_config_df = self.__msg_config_df.append(pd.DataFrame((
-                [[name, msg_id, payload, False, str(100)]]), columns=self.__DB_DF_HEADERS), ignore_index=True)
-            self.__update_db_config(new_config_db=new_msg_config_df)
-            print('Added message to db file:\n{}'.format(new_msg_config_df.iloc[[-1]]))
+            key = self.__store.add(name=name, msg_id=msg_id, payload=payload, period_en=False, period=100)
+            self.__msg_config_df = None
+            print('Added message to db file: {}'.format(self.__store.get(key)))
             return True
         else:
             """ Provided message is invalid """
@@ -107,31 +90,55 @@ class DbConfigMan:
 
     def delete_msg(self, index: int) -> None:
         """ Remove message from db file """
-        print('delete msg:', self.__msg_config_df.loc[index, 'id'])
-        new_msg_config_df = self.__msg_config_df.drop(index=index)
-        new_msg_config_df.reset_index(drop=True, inplace=True)
-        self.__update_db_config(new_config_db=new_msg_config_df)
+        key = self.__store.key(index)
+        print('delete msg:', self.__store.get(key)[self.__DB_H_ID])
+        self.__store.remove(key)
+        self.__msg_config_df = None
 
     def modify_msg(self, index: int, name: str, msg_id: str, payload: str, period_en: bool) -> bool:
         """ Modify already existing message in db filr """
         if MsgValid.VALID == self.__is_msg_valid(msg_id=msg_id, payload=payload):
-            upd_msg_config_df = self.__msg_config_df
-            upd_msg_config_df.at[index, self.__DB_H_NAME] = name
-            upd_msg_config_df.at[index, self.__DB_H_ID] = msg_id
-            upd_msg_config_df.at[index, self.__DB_H_PAYLOAD] = payload
-            upd_msg_config_df.at[index, self.__DB_H_PERIOD_EN] = period_en
-            self.__update_db_config(new_config_db=upd_msg_config_df)
-            print('Modified message in db file:\n{}'.format(upd_msg_config_df.iloc[[index]]))
+            key = self.__store.key(index)
+            self.__store.update(key, name=name, id=msg_id, payload=payload, period_en=period_en)
+            self.__msg_config_df = None
+            print('Modified message in db file: {}'.format(self.__store.get(key)))
             return True
         else:
             """ Provided message is invalid """
             print('Message not updated!')
             return False
 
+    def find_msgs(self, name: Optional[str] = None, can_id: Optional[int] = None) -> List[int]:
+        """ Indexes of the messages with the given name and/or numeric CAN id """
+        keys = None
+        if name is not None:
+            keys = set(self.__store.find_by_name(name))
+        if can_id is not None:
+            found = set(self.__store.find_by_can_id(can_id))
+            keys = found if keys is None else keys & found
+        return sorted(self.__store.index(key) for key in keys or ())
+
+    def get_msg_key(self, index: int) -> int:
+        """ Stable key of the message at `index`; keys do not shift when other messages are deleted """
+        return self.__store.key(index)
+
+    def get_msg_keys(self) -> List[int]:
+        return [self.__store.key(index) for index in range(len(self.__store))]
+
+    def get_msg(self, key: int) -> Dict[str, Any]:
+        """ Fields of the message with `key` """
+        return self.__store.get(key)
+
     def get_msg_config(self) -> pd.DataFrame:
-        """ Provide messages configuration """
+        """ Provide messages configuration; the DataFrame is rebuilt only after an edit """
+        if self.__msg_config_df is None:
+            self.__msg_config_df = pd.DataFrame(self.__store.messages(), columns=self.__DB_DF_HEADERS)
         return self.__msg_config_df
 
+    def close(self) -> None:
+        """ Compact and close the db file """
+        self.__store.close()
+
 def on_exit(self):
     print("GUI closing")
     exit(0)
@@ -146,8 +153,11 @@ class SimGui:
     __COLUMN_WIDTHS = [__TAB_W_NO, __TAB_W_NAME, __TAB_W_ID, __TAB_W_PAYLOAD, __TAB_W_MODIFY, __TAB_W_DEL, __TAB_W_EN,
                        __TAB_W_SEND]
 
+    __RX_COLUMN_NAMES = ['id', 'count', 'period [ms]', 'jitter [ms]', 'age [ms]', 'data']
+    __RX_REFRESH_S = 0.2
+
     def __init__(self, switch_sim_en_h: Callable, add_msg_h: Callable, delete_msg_h: Callable, modify_msg_h: Callable,
-                 get_msg_config_h: Callable, send_msg_trig_h: Callable):
+                 get_msg_config_h: Callable, send_msg_trig_h: Callable, get_rx_stats_h: Optional[Callable] = None):
         """ Setup external handlers """
         self.__switch_sim_en_h = switch_sim_en_h
         self.__add_msg_h = add_msg_h
@@ -155,6 +165,8 @@ class SimGui:
         self.__modify_msg_h = modify_msg_h
         self.__get_msg_config_h = get_msg_config_h
         self.__send_msg_trig_h = send_msg_trig_h
+        self.__get_rx_stats_h = get_rx_stats_h
+        self.__rx_rows = set()
 
     def __display_table(self):
         """ Display messages configuration from db file """
@@ -221,6 +233,35 @@ class SimGui:
                 pass
         self.__display_table()
 
+    def __display_rx_panel(self):
+        """ Window with the receive statistics of every CAN id seen on the bus """
+        with dpg.window(label='Bus monitor', tag='RxMonitor', width=620, height=300, pos=(360, 320)):
+            dpg.add_text('', tag='rx_totals')
+            with dpg.table(tag='rx_table', header_row=True):
+                for col_name in self.__RX_COLUMN_NAMES:
+                    dpg.add_table_column(label=col_name)
+
+    def __update_rx_panel(self):
+        """ Refresh the bus monitor; called at a fixed rate, whatever the frame rate on the bus """
+        rx_stats = self.__get_rx_stats_h()
+        if len(rx_stats) < len(self.__rx_rows):
+            """ Statistics were reset """
+            dpg.delete_item('rx_table', children_only=True, slot=1)
+            self.__rx_rows.clear()
+        for can_id in sorted(rx_stats.keys() - self.__rx_rows):
+            with dpg.table_row(parent='rx_table'):
+                dpg.add_text(f'0x{can_id:X}')
+                for col in range(1, len(self.__RX_COLUMN_NAMES)):
+                    dpg.add_text('', tag=f'rx_{can_id}_{col}')
+            self.__rx_rows.add(can_id)
+        for can_id, stats in rx_stats.items():
+            dpg.set_value(f'rx_{can_id}_1', str(stats['count']))
+            dpg.set_value(f'rx_{can_id}_2', f"{stats['period_ms']:.1f}")
+            dpg.set_value(f'rx_{can_id}_3', f"{stats['jitter_ms']:.2f}")
+            dpg.set_value(f'rx_{can_id}_4', f"{stats['age_ms']:.0f}")
+            dpg.set_value(f'rx_{can_id}_5', stats['data'].hex(' ').upper())
+        dpg.set_value('rx_totals', f'{len(rx_stats)} ids, {sum(stats["count"] for stats in rx_stats.values())} frames')
+
     def __btn_switch_sim_en_clbk(self, sender: str, sim_en: bool) -> None:
         """ Callback for start/stop simmulation buttons """
         dpg.configure_item('btn_start_sim', enabled=not sim_en)
@@ -319,7 +360,17 @@ class SimGui:
         dpg.show_viewport()
         dpg.set_primary_window('PyCANSimMain', True)
         self.__display_table()
-        dpg.start_dearpygui()
+        if not callable(self.__get_rx_stats_h):
+            dpg.start_dearpygui()
+        else:
+            self.__display_rx_panel()
+            next_refresh = 0.0
+            while dpg.is_dearpygui_running():
+                now = time.monotonic()
+                if now >= next_refresh:
+                    self.__update_rx_panel()
+                    next_refresh = now + self.__RX_REFRESH_S
+                dpg.render_dearpygui_frame()
         dpg.destroy_context()
 
 
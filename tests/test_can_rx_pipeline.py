@@ -0,0 +1,70 @@
+import os
+import time
+
+import pytest
+
+from canRxPipeline import IdStats, RxPipeline
+from canUsbTransport import encode_frame, encode_frames
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="reads the pipe through the event loop's reader callback")
+def test_statistics_over_a_pipe():
+    read_fd, write_fd = os.pipe()
+    port = os.fdopen(read_fd, 'rb', buffering=0)
+    rx = RxPipeline(port, ring_size=5)
+    rx.start()
+    try:
+        written = 0
+        for i in range(4):
+            written += os.write(write_fd, encode_frames([(0x100, bytes((i,))), (0x18FF0021, b'')]))
+            time.sleep(0.02)
+        # A frame split over two reads
+        wire = encode_frame(0x200, b'\x01\x02\x03')
+        os.write(write_fd, wire[:3])
+        time.sleep(0.02)
+        os.write(write_fd, wire[3:] + b'\x00\xff')
+        assert wait_for(lambda: rx.get_totals()['frames'] == 9)
+
+        stats = rx.get_stats()
+        assert {can_id: s['count'] for can_id, s in stats.items()} == {0x100: 4, 0x18FF0021: 4, 0x200: 1}
+        assert stats[0x100]['data'] == b'\x03' and stats[0x200]['data'] == b'\x01\x02\x03'
+        assert 15 < stats[0x100]['period_ms'] < 60
+        totals = rx.get_totals()
+        assert totals['dropped'] == 4 and totals['bytes'] == written + len(wire) + 2
+        assert [can_id for _, can_id, _ in rx.get_frames()] == [0x100, 0x18FF0021, 0x100, 0x18FF0021, 0x200]
+        assert [frame[1] for frame in rx.get_frames(2)] == [0x18FF0021, 0x200]
+    finally:
+        rx.stop()
+        os.close(write_fd)
+        port.close()
+
+
+def test_repeats_within_one_read_split_the_period():
+    stats = IdStats()
+    stats.update(1_000_000, b'\x01', count=2)
+    assert stats.period_n == 0
+    for ts_ns in (21_000_000, 41_000_000, 61_000_000):
+        stats.update(ts_ns, b'\x02', count=2)
+    result = stats.stats()
+    assert result['count'] == 8 and result['data'] == b'\x02'
+    assert result['period_ms'] == 10.0 and result['jitter_ms'] == 0.0
+
+    # Batched updates give the same mean and variance as frame by frame ones
+    batched, single = IdStats(), IdStats()
+    single.update(0, b'')
+    batched.update(0, b'')
+    for ts_ns, count in ((10, 1), (40, 3), (45, 1), (85, 2)):
+        batched.update(ts_ns, b'', count)
+        step = (ts_ns - single.last_ns) // count
+        for i in range(count):
+            single.update(single.last_ns + step, b'')
+    assert batched.period_n == single.period_n
+    assert abs(batched.period_mean_ns - single.period_mean_ns) < 1e-9
+    assert abs(batched.period_m2_ns - single.period_m2_ns) < 1e-9
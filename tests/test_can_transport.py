@@ -0,0 +1,102 @@
+import os
+import select
+import time
+
+import pytest
+
+from canUsbTransport import (CMD_FRAME_LEN, CompiledFrame, FakeUsbCanA, FrameDecoder, UsbCanA, encode_frame,
+                             encode_frames, parse_can_id, settings_frame)
+from frameCache import compile_msg
+
+FRAMES = [(can_id, bytes(range(0x10, 0x10 + dlc))) for can_id in (0x000, 0x123, 0x7FF, 0x800, 0x1FFFFFFF)
+          for dlc in range(9)]
+
+
+def test_encode_decode_round_trip():
+    decoder = FrameDecoder()
+    assert decoder.feed(encode_frames(FRAMES)) == FRAMES
+    assert decoder.errors == 0
+
+
+def test_extended_flag_keeps_small_ids_extended():
+    wire = encode_frame(0x123, b'\x01', extended=True)
+    assert len(wire) == 2 + 4 + 1 + 1 and wire[1] & 0x20
+    assert FrameDecoder().feed(wire) == [(0x123, b'\x01')]
+
+
+def test_byte_at_a_time_feed():
+    decoder = FrameDecoder()
+    frames = []
+    for byte in encode_frames(FRAMES):
+        frames += decoder.feed(bytes((byte,)))
+    assert frames == FRAMES
+
+
+def test_resync_after_garbage():
+    decoder = FrameDecoder()
+    garbage = b'\x00\x13\x55\xff'
+    stream = garbage + encode_frame(0x100, b'\x01\x02') + b'\x42' + encode_frame(0x1ABCDEF0, b'')
+    assert decoder.feed(stream) == [(0x100, b'\x01\x02'), (0x1ABCDEF0, b'')]
+
+
+def test_settings_checksum():
+    decoder = FrameDecoder()
+    good = settings_frame(500000)
+    bad = good[:-1] + bytes(((good[-1] + 1) & 0xFF,))
+    assert len(good) == CMD_FRAME_LEN
+    assert decoder.feed(bad + good + encode_frame(0x10, b'\x01')) == [(0x10, b'\x01')]
+    assert decoder.commands == [good]
+    assert decoder.errors == 1
+
+
+def test_id_string_picks_frame_type():
+    """As in canusb.c, an 8 hex digit id is extended whatever its value."""
+    assert parse_can_id('0x510') == (0x510, False)
+    assert parse_can_id('0x00000123') == (0x123, True)
+    assert parse_can_id('18FF0021') == (0x18FF0021, True)
+    frame = compile_msg('0x00000123', '0x01 0x02')
+    assert frame.extended and frame.wire == encode_frame(0x123, b'\x01\x02', extended=True)
+    assert not compile_msg('0x123', '0x01').extended
+
+
+class CountingPort:
+    """Unbuffered pty file that counts write() calls."""
+
+    def __init__(self, path):
+        self.file = open(path, 'r+b', buffering=0)
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return self.file.write(data)
+
+    def read(self, size):
+        ready, _, _ = select.select([self.file], [], [], 0.05)
+        return self.file.read(size) if ready else b''
+
+    def close(self):
+        self.file.close()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="FakeUsbCanA needs a pseudo-terminal")
+def test_fake_adapter_one_write_per_batch():
+    fake = FakeUsbCanA(echo=True)
+    port = CountingPort(fake.port)
+    adapter = UsbCanA(port)
+    try:
+        adapter.configure(500000)
+        adapter.send_frames(FRAMES)
+        adapter.send_compiled([CompiledFrame(can_id, data) for can_id, data in FRAMES[:5]])
+        assert port.writes == 3
+        assert adapter.get_stats()['writes'] == 3 and adapter.get_stats()['frames'] == len(FRAMES) + 5
+
+        echoed = []
+        deadline = time.monotonic() + 5
+        while len(echoed) < len(FRAMES) + 5 and time.monotonic() < deadline:
+            echoed += adapter.read_frames()
+        assert echoed == FRAMES + FRAMES[:5]
+        assert fake.frames == FRAMES + FRAMES[:5]
+        assert fake.commands == [settings_frame(500000)] and fake.errors == 0
+    finally:
+        adapter.close()
+        fake.close()
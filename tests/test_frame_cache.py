@@ -0,0 +1,21 @@
+from frameCache import FrameCache
+
+
+def test_invalidate_only_the_touched_key():
+    msgs = {1: {'id': '0x100', 'payload': '0x01'}, 2: {'id': '0x200', 'payload': '0x02'}}
+    lookups = []
+
+    def get_msg(key):
+        lookups.append(key)
+        return msgs[key]
+
+    cache = FrameCache(get_msg)
+    one, two = cache.get(1), cache.get(2)
+    assert cache.get(1) is one and lookups == [1, 2]
+
+    msgs[1] = {'id': '0x101', 'payload': '0x11 0x12'}
+    cache.invalidate(1)
+    assert cache.get(2) is two
+    new_one = cache.get(1)
+    assert new_one is not one and (new_one.can_id, new_one.data) == (0x101, b'\x11\x12')
+    assert lookups == [1, 2, 1] and len(cache) == 2
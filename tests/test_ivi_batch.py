@@ -0,0 +1,13 @@
+import os
+
+from ivi_batch import output_stems
+
+
+def test_output_stems_unique():
+    logs = [os.path.join('d', 'a.log'), os.path.join('d', 'a.log.gz'), os.path.join('d', 'b.log'),
+            os.path.join('r1', 'logcat.log'), os.path.join('r2', 'logcat.log')]
+    stems = output_stems(logs)
+    assert len(set(stems.values())) == len(logs)
+    assert stems[os.path.join('d', 'b.log')] == 'b'
+    assert stems[os.path.join('r1', 'logcat.log')] == 'r1_logcat'
+    assert not any(stem.startswith('.') for stem in stems.values())
@@ -0,0 +1,59 @@
+import numpy as np
+
+from ivi_compensation import compensate
+from ivi_merge import GPS_EPOCH_UNIX, GPS_LEAP_SECONDS
+
+
+def test_compensate_offsets_shift_the_speed_gate():
+    """Gyro with a constant bias; the vehicle stands still for the first 5 s of the probe clock."""
+    n = 100
+    times = np.arange(n) * 100_000_000  # 10 Hz, ns
+    gyro = {'time': times, 'x': np.ones(n), 'y': np.zeros(n), 'z': np.zeros(n)}
+    accel = {'time': times, 'x': np.zeros(n), 'y': np.zeros(n), 'z': np.zeros(n)}
+    speed_times = np.arange(10.0)
+    speed = np.where(speed_times < 5, 0.0, 10.0)
+
+    _, plain = compensate(accel, gyro, speed_times, speed)
+    _, shifted = compensate(accel, gyro, speed_times, speed, offsets={'probe': 3.0})
+
+    # Without the offset the bias is learnt from t=0; with the probe 3 s late nothing is learnt before 3 s
+    assert plain['x'][0] < 1.0
+    assert np.array_equal(shifted['x'][:30], np.ones(30))
+    assert shifted['x'][30] < 1.0
+
+
+def test_poor_accuracy_attitudes_are_skipped():
+    """Moving (no bias learnt), flat: gravity is fully removed unless the 90° roll with 5° accuracy is used."""
+    n = 100
+    times = np.arange(n) * 100_000_000
+    accel = {'time': times, 'x': np.zeros(n), 'y': np.zeros(n), 'z': np.full(n, 9.80665)}
+    gyro = {'time': times[:0], 'x': np.zeros(0), 'y': np.zeros(0), 'z': np.zeros(0)}
+    # Probe UTC and PVAT iTOW of the same moment, 1000 s into GPS week 2300
+    speed_times, speed = np.array([GPS_EPOCH_UNIX + 2300 * 604800 - GPS_LEAP_SECONDS + 1000.0]), np.array([10.0])
+    attitude_times = np.array([1_000_000.0, 1_005_000.0])
+    attitude = (np.array([0.0, 90.0]), np.zeros(2), np.zeros(2))
+    accuracy = (np.array([1.0, 5.0]), np.ones(2), np.ones(2))
+
+    corrected, _ = compensate(accel, gyro, speed_times, speed, attitude_times, attitude,
+                              attitude_accuracy=accuracy)
+    assert np.allclose(corrected['z'], 0.0) and np.allclose(corrected['y'], 0.0)
+    ungated, _ = compensate(accel, gyro, speed_times, speed, attitude_times, attitude)
+    assert not np.allclose(ungated['z'][50:], 0.0)
+
+
+def test_imu_clock_anchored_by_log_position():
+    """The IMU boot clock starts 3 s into the probe clock; its log neighbours place it there."""
+    n = 100
+    times = 1000 * 10 ** 9 + np.arange(n) * 100_000_000  # boot clock, 10 Hz
+    gyro = {'time': times, 'x': np.ones(n), 'y': np.zeros(n), 'z': np.zeros(n)}
+    accel = {'time': times[:0], 'x': np.zeros(0), 'y': np.zeros(0), 'z': np.zeros(0)}
+    speed_times = 1.7e9 + np.arange(14.0)
+    speed = np.where(speed_times - speed_times[0] < 5, 0.0, 10.0)
+    # One log line per 0.1 s of true time: probe k at line 10 k, gyro i at line 30 + i
+    positions = {'gyro': 30 + np.arange(n), 'accel': np.zeros(0, dtype=np.int64),
+                 'probe': 10 * np.arange(14)}
+
+    _, anchored = compensate(accel, gyro, speed_times, speed, positions=positions)
+    # Standing still for the first 2 s of IMU samples only (to within one log line)
+    assert anchored['x'][18] != anchored['x'][17]
+    assert np.isclose(anchored['x'][-1], anchored['x'][22])
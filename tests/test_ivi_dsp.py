@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from ivi_dsp import Pipeline, Resample, TableFilter, recursive_filter
+
+
+def reference(values, decay, gain, initial):
+    out = np.empty_like(values)
+    y = initial
+    for t, value in enumerate(values):
+        y = decay * y + gain * value
+        out[t] = y
+    return out
+
+
+@pytest.mark.parametrize('decay', [1e-9, 0.01, 0.3, 0.6, 0.99])
+def test_recursive_filter_matches_recursion(decay):
+    values = np.random.default_rng(1).normal(size=3000)
+    assert np.allclose(recursive_filter(values, decay, 1.0 - decay, 2.0),
+                       reference(values, decay, 1.0 - decay, 2.0), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('resample', [1, 3])
+def test_table_filter_keeps_row_order(resample):
+    rng = np.random.default_rng(0)
+    sensor = rng.choice([1, 4], size=200).astype(np.int64)
+    time = np.arange(200) * 10_000_000
+    x = rng.normal(size=200)
+    table = TableFilter(['ma:4'], ['x'], 'time', 1e-9, resample=resample, fs=100.0, group='sensor')
+    batches = [table({'sensor': sensor[lo:hi], 'time': time[lo:hi], 'x': x[lo:hi]})
+               for lo, hi in ((0, 70), (70, 71), (71, 200))]
+    out = {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+
+    # Log order, each block mean at the row that completed it, across groups and batches
+    completed = np.sort(np.concatenate([np.flatnonzero(sensor == key)[resample - 1::resample] for key in (1, 4)]))
+    assert np.array_equal(out['sensor'], sensor[completed])
+    if resample == 1:
+        assert np.array_equal(out['time'], time)
+    for key in (1, 4):
+        rows = sensor == key
+        expected = Pipeline(['ma:4'], 100.0).process(x[rows])
+        if resample > 1:
+            expected = Resample(resample).process(expected)
+        assert np.allclose(out['x_filtered'][out['sensor'] == key], expected)
+        assert np.allclose(out['time'][out['sensor'] == key], Resample(resample).process(time[rows]))
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from ivi_events import Rule, build_events, event_window, parse_rules
+
+
+def test_events_without_timestamps(tmp_path):
+    """IMU lines without a trailing timestamp: time is NaN, seconds fall back to sample indices."""
+    log = tmp_path / 'imu.log'
+    values = [1, 2, 12, 3, 4, 1, 1, 20, 1]
+    log.write_text(''.join(f"Sensor: 4, Received data :: 1.0:2.0:{v}.0,\n" for v in values))
+
+    events, meta = build_events(str(log), [Rule('gyro.z>5')], pad=1.0)
+
+    assert list(events['sample']) == [2, 7]
+    assert list(events['window_sample']) == [1, 6]
+    line_len = len("Sensor: 4, Received data :: 1.0:2.0:1.0,\n")
+    assert events['window_offset'][0] == line_len
+    window = event_window(str(log), events, meta, 1)
+    assert list(window['sample']) == [6, 7, 8]
+    assert np.array_equal(window['z'], [1.0, 20.0, 1.0])
+
+
+def test_duplicate_rule_names_rejected():
+    with pytest.raises(ValueError, match='Duplicate rule name'):
+        parse_rules(['spike=gyro.z>5', 'spike=gyro.x>1'])
+    assert [rule.name for rule in parse_rules(['gyro.z>5', 'spike=gyro.z>5'])] == ['gyro.z>5', 'spike']
@@ -0,0 +1,37 @@
+import os
+
+from ivi_follow import follow_blocks
+
+
+def next_lines(blocks, tries=5):
+    """Next non-empty block, or b'' after `tries` polls without data."""
+    for _ in range(tries):
+        block = next(blocks)
+        if block:
+            return block
+    return b''
+
+
+def test_follow_skips_partial_line_at_start(tmp_path):
+    log = tmp_path / 'live.log'
+    log.write_bytes(b'old 1\nold 2\nhalf of a li')
+    blocks = follow_blocks(str(log), poll_interval=0)
+    assert next(blocks) == b''
+    with open(log, 'ab') as f:
+        f.write(b'ne\nnew 1\n')
+    assert next_lines(blocks) == b'new 1\n'
+    blocks.close()
+
+
+def test_follow_reopens_rotated_file(tmp_path):
+    log = tmp_path / 'live.log'
+    log.write_bytes(b'first file\n')
+    blocks = follow_blocks(str(log), poll_interval=0)
+    assert next(blocks) == b''
+    rotated = tmp_path / 'live.log.1'
+    os.replace(log, rotated)
+    # Longer than the old file, so truncation alone would not have been noticed
+    log.write_bytes(b'second file, line 1\n')
+    assert next(blocks) == b''
+    assert next_lines(blocks) == b'second file, line 1\n'
+    blocks.close()
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+
+import ivi_log_cache
+from ivi_log_cache import cache_path, scan_log_cached
+from ivi_log_engine import ImuSink, OffsetSink, ProbeSink, PvatSink, ScanStats, scan_log
+
+
+def record(i):
+    kind = i % 4
+    if kind == 0:
+        return f"Sensor: 1, Received data :: {i * 0.01}:0.2:9.8, {i * 10_000_000}\n"
+    if kind == 1:
+        return f"onEventSendProbeData() : [{i}] {1_700_000_000 + i},0,0,0,{i * 0.5},0,0,0\n"
+    if kind == 2:
+        return f"[UBX-NAV-PVAT iTOW={i * 200} vehRoll={i % 3} vehPitch=0.5 vehHeading={i % 360}]\n"
+    return f"unrelated line {i}\n"
+
+
+def make_sinks():
+    return [OffsetSink(ImuSink()), ProbeSink([4]), PvatSink()]
+
+
+def cached_parse(log, cache_dir):
+    stats = ScanStats()
+    sinks = scan_log_cached(str(log), make_sinks(), cache_dir=str(cache_dir), stats=stats)
+    return sinks, stats
+
+
+def assert_matches_fresh_parse(sinks, log):
+    fresh = scan_log(str(log), make_sinks())
+    for sink, expected in zip(sinks, fresh):
+        state, expected_state = sink.state(), expected.state()
+        assert state.keys() == expected_state.keys()
+        for name in state:
+            assert np.array_equal(state[name], expected_state[name], equal_nan=True), name
+
+
+@pytest.fixture
+def small_windows(monkeypatch):
+    """Hash windows much smaller than the test logs, as they are for real logs."""
+    monkeypatch.setattr(ivi_log_cache, 'HASH_WINDOW', 256)
+
+
+def test_append_only_growth_parses_only_new_bytes(tmp_path, small_windows):
+    log, cache_dir = tmp_path / 'drive.log', tmp_path / 'cache'
+    lines = [record(i) for i in range(400)]
+    # The last line is still being written
+    log.write_text(''.join(lines[:200]) + lines[200][:10])
+    sinks, stats = cached_parse(log, cache_dir)
+    assert stats.bytes == log.stat().st_size
+    assert_matches_fresh_parse(sinks, log)
+    complete = len(''.join(lines[:200]))
+
+    with open(log, 'a') as f:
+        f.write(lines[200][10:] + ''.join(lines[201:]))
+    sinks, stats = cached_parse(log, cache_dir)
+    assert stats.bytes == log.stat().st_size - complete
+    assert_matches_fresh_parse(sinks, log)
+    # Appended offsets continue from the cached ones
+    assert np.array_equal(sinks[0].positions()['accel'],
+                          [len(''.join(lines[:i])) for i in range(0, 400, 4)])
+
+    entry = cache_path(str(log), make_sinks(), str(cache_dir))
+    os.utime(entry, ns=(0, 0))
+    sinks, stats = cached_parse(log, cache_dir)
+    assert stats.bytes == 0 and os.stat(entry).st_mtime_ns > 0
+    assert_matches_fresh_parse(sinks, log)
+
+
+@pytest.mark.parametrize('where', ['head', 'tail'])
+def test_rewritten_log_is_parsed_again(tmp_path, small_windows, where):
+    log, cache_dir = tmp_path / 'drive.log', tmp_path / 'cache'
+    lines = [record(i) for i in range(200)]
+    log.write_text(''.join(lines))
+    cached_parse(log, cache_dir)
+
+    # Same length, different values, then more lines: looks like growth by size alone
+    changed = 0 if where == 'head' else 198
+    lines[changed] = lines[changed].replace('9.8', '1.2').replace('0.5', '7.5')
+    assert len(''.join(lines)) == log.stat().st_size
+    lines += [record(i) for i in range(200, 240)]
+    log.write_text(''.join(lines))
+    sinks, stats = cached_parse(log, cache_dir)
+    assert stats.bytes == log.stat().st_size
+    assert_matches_fresh_parse(sinks, log)
+
+
+def test_shrunk_log_is_parsed_again(tmp_path, small_windows):
+    log, cache_dir = tmp_path / 'drive.log', tmp_path / 'cache'
+    lines = [record(i) for i in range(200)]
+    log.write_text(''.join(lines))
+    cached_parse(log, cache_dir)
+    log.write_text(''.join(lines[:150]))
+    sinks, stats = cached_parse(log, cache_dir)
+    assert stats.bytes == log.stat().st_size
+    assert_matches_fresh_parse(sinks, log)
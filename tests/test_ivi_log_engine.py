@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import ivi_log_engine
+from ivi_log_engine import (ImuSink, OffsetSink, ProbeSink, PvatSink, ScanStats, scan_log, split_ranges,
+                            unique_field_specs)
+
+
+def test_unique_field_specs_keeps_first_in_order():
+    assert unique_field_specs(['lat', 'lon', 'lat', 'height:int', 'lon:float']) == ['lat', 'lon', 'height:int']
+    with pytest.raises(ValueError, match="Field 'lat'"):
+        unique_field_specs(['lat', 'lat:int'])
+
+
+def test_pvat_sink_repeated_fields():
+    sink = PvatSink(['lat', 'lon', 'lat'])
+    sink.feed("[UBX-NAV-PVAT iTOW=1000 lat=1.5 lon=2.5]")
+    timestamps, *columns = sink.result()
+    assert sink.specs() == ['lat:float', 'lon:float']
+    assert [list(col) for col in columns] == [[1.5], [2.5]]
+
+
+def test_pvat_sink_comma_separated_payload():
+    sink = PvatSink()
+    sink.feed("sensormanager: [UBX-NAV-PVAT iTOW=100, vehRoll=1.5, vehPitch=2.0, vehHeading=3.0]")
+    sink.feed("sensormanager: [UBX-NAV-PVAT iTOW=200; vehRoll=-1e-1; vehPitch=nan; vehHeading=4]")
+    timestamps, roll, pitch, heading = sink.result()
+    assert list(sink.time) == [100.0]
+    assert (list(roll), list(pitch), list(heading)) == ([1.5], [2.0], [3.0])
+
+
+def write_mixed_log(path, lines=3000):
+    """IMU, probe and PVAT records of varying length between unrelated lines."""
+    out = []
+    for i in range(lines):
+        kind = i % 5
+        if kind == 0:
+            out.append(f"Sensor: {1 if i % 10 else 4}, Received data :: {i * 0.001}:-{i % 7}:9.8{i}, {i * 10_000_000}")
+        elif kind == 1:
+            out.append(f"onEventSendProbeData() : [{i}] {1_700_000_000 + i},0,0,0,{i % 13 * 1.5},0,0,0")
+        elif kind == 2:
+            out.append(f"[UBX-NAV-PVAT iTOW={i * 200} vehRoll={i % 3} vehPitch=-{i % 11}.5 vehHeading={i % 360}]")
+        else:
+            out.append("unrelated " + "x" * (i % 97))
+    path.write_text('\n'.join(out) + '\n')
+
+
+def parse_state(path, **kwargs):
+    sinks = [OffsetSink(ImuSink()), OffsetSink(ProbeSink([4, 0])), PvatSink()]
+    scan_log(str(path), sinks, **kwargs)
+    return [sink.state() for sink in sinks]
+
+
+def assert_same_state(left, right):
+    assert len(left) == len(right)
+    for a, b in zip(left, right):
+        assert a.keys() == b.keys()
+        for name in a:
+            assert np.array_equal(a[name], b[name], equal_nan=True), name
+
+
+def test_parallel_scan_matches_serial(tmp_path, monkeypatch):
+    log = tmp_path / 'mixed.log'
+    write_mixed_log(log)
+    serial = parse_state(log)
+    assert len(serial[0]['accel_x']) == 300 and len(serial[2]['field_vehRoll']) == 600
+
+    monkeypatch.setattr(ivi_log_engine, 'MIN_CHUNK_SIZE', 4096)
+    size = log.stat().st_size
+    data = log.read_bytes()
+    chunks = 2 * ivi_log_engine.CHUNKS_PER_JOB
+    # The even split points land inside lines, which split_ranges must move to the next line start
+    nominal = [size * i // chunks for i in range(1, chunks)]
+    assert any(data[pos - 1:pos] != b'\n' for pos in nominal)
+    ranges = split_ranges(str(log), chunks)
+    assert len(ranges) == chunks and all(data[lo - 1:lo] == b'\n' for lo, _ in ranges[1:])
+
+    stats = ScanStats()
+    assert_same_state(parse_state(log, jobs=2, stats=stats), serial)
+    assert stats.bytes == size and stats.lines == 3000
+    assert_same_state(parse_state(log, jobs=2, chunk_size=1024), serial)
+
+
+def test_serial_scan_across_read_blocks(tmp_path, monkeypatch):
+    log = tmp_path / 'mixed.log'
+    write_mixed_log(log, lines=500)
+    whole = parse_state(log)
+    # Read blocks much shorter than a line and not aligned to them
+    monkeypatch.setattr(ivi_log_engine, 'READ_BLOCK_SIZE', 37)
+    assert_same_state(parse_state(log), whole)
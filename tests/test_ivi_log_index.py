@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+import ivi_log_index
+from ivi_log_engine import ImuSink, OffsetSink, ProbeSink, PvatSink, ScanStats, scan_log
+from ivi_log_index import build_index, find_range, scan_window
+
+PROBE_EPOCH = 1_700_000_000
+
+
+def record(i):
+    """Line i of a 10 Hz drive log; IMU timestamps arrive slightly out of order."""
+    kind = i % 4
+    if kind == 0:
+        jitter = 30_000_000 if i % 12 == 0 else 0
+        return f"Sensor: 1, Received data :: {i * 0.01}:0.2:9.8, {i * 100_000_000 + jitter}\n"
+    if kind == 1:
+        return f"onEventSendProbeData() : [{i}] {PROBE_EPOCH + i / 10:.1f},0,0,0,{i * 0.5},0,0,0\n"
+    if kind == 2:
+        return f"[UBX-NAV-PVAT iTOW={i * 100} vehRoll={i % 3} vehPitch=0.5 vehHeading={i % 360}]\n"
+    return f"unrelated line {i} {'x' * (i % 50)}\n"
+
+
+SINKS = {
+    'imu': ImuSink,
+    'probe': lambda: ProbeSink([4]),
+    'pvat': PvatSink,
+}
+
+# (kind, start, end) in each record type's own units; None is open-ended
+WINDOWS = [
+    ('imu', 12.3e9, 45.6e9),
+    ('imu', 0, 0),
+    ('imu', None, 1e9),
+    ('probe', PROBE_EPOCH + 50.1, PROBE_EPOCH + 50.1),
+    ('probe', PROBE_EPOCH + 70.0, None),
+    ('probe', PROBE_EPOCH + 500, PROBE_EPOCH + 600),
+    ('pvat', 20_000, 21_000),
+    ('pvat', None, None),
+]
+
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    """Small index blocks, so a window spans and skips many of them."""
+    monkeypatch.setattr(ivi_log_index, 'INDEX_BLOCK_SIZE', 512)
+    path = tmp_path / 'drive.log'
+    path.write_text(''.join(record(i) for i in range(1000)))
+    return path
+
+
+def full_parse_and_filter(log, kind, start, end):
+    sink = SINKS[kind]()
+    scan_log(str(log), [sink])
+    sink.keep_window(-np.inf if start is None else start, np.inf if end is None else end)
+    return sink
+
+
+def matching_line_offsets(log, kind, start, end):
+    sink = OffsetSink(SINKS[kind]())
+    scan_log(str(log), [sink])
+    times, positions = sink.sink.times(), sink.positions()
+    return np.concatenate([positions[stream][(times[stream] >= start) & (times[stream] <= end)]
+                           for stream in times])
+
+
+def assert_same_state(sink, expected):
+    state, expected_state = sink.state(), expected.state()
+    assert state.keys() == expected_state.keys()
+    for name in state:
+        assert np.array_equal(state[name], expected_state[name], equal_nan=True), name
+
+
+@pytest.mark.parametrize('kind, start, end', WINDOWS)
+def test_scan_window_matches_full_parse(log, tmp_path, kind, start, end):
+    expected = full_parse_and_filter(log, kind, start, end)
+    stats = ScanStats()
+    sink = scan_window(str(log), [SINKS[kind]()], kind, start, end,
+                       cache_dir=str(tmp_path / 'cache'), stats=stats)[0]
+    assert_same_state(sink, expected)
+    if start is not None and end is not None:
+        assert stats.bytes < log.stat().st_size / 2
+
+
+@pytest.mark.parametrize('kind, start, end', [window for window in WINDOWS if None not in window[1:]])
+def test_find_range_covers_every_matching_line(log, kind, start, end):
+    index = build_index(str(log))
+    assert len(index['offsets']) > 50
+    lines = matching_line_offsets(log, kind, start, end)
+    byte_range = find_range(index, kind, start, end)
+    if not len(lines):
+        assert byte_range is None or byte_range[1] - byte_range[0] <= 2 * 512 + 200
+        return
+    lo, hi = byte_range
+    assert lo in index['offsets'] and hi in index['offsets']
+    assert lo <= lines.min() and lines.max() < hi
+
+
+def test_index_extended_when_log_grows(log, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    build_index(str(log), cache_dir)
+    with open(log, 'a') as f:
+        f.write(''.join(record(i) for i in range(1000, 1400)))
+    for kind, start, end in (('imu', 95e9, 105e9), ('pvat', 130_000, None)):
+        sink = scan_window(str(log), [SINKS[kind]()], kind, start, end, cache_dir=cache_dir)[0]
+        assert_same_state(sink, full_parse_and_filter(log, kind, start, end))
+    assert np.array_equal(build_index(str(log), cache_dir)['offsets'], build_index(str(log))['offsets'])
@@ -0,0 +1,74 @@
+import numpy as np
+
+from ivi_log_engine import ImuSink, OffsetSink, ProbeSink, PvatSink, scan_log
+from ivi_merge import (GPS_EPOCH_UNIX, GPS_LEAP_SECONDS, GPS_WEEK_MS, common_clock, stream_tables, time_axis,
+                       unwrap_itow)
+
+WEEK_S = GPS_WEEK_MS // 1000
+# 60 s before a GPS week rollover, in UTC
+START_UTC = GPS_EPOCH_UNIX + 2300 * WEEK_S - GPS_LEAP_SECONDS - 60
+BOOT_UTC = START_UTC - 1000.0
+
+
+def write_log(path):
+    """Two minutes of IMU at 10 Hz, probe at 1 Hz and PVAT at 5 Hz from a GPS fix 30 s in, in time order."""
+    records = []
+    for i in range(1200):
+        t = START_UTC + i / 10
+        records.append((t, f"Sensor: 1, Received data :: 0.1:0.2:9.8, {int(round((t - BOOT_UTC) * 1e9))}\n"))
+    for i in range(120):
+        t = START_UTC + i
+        records.append((t, f"onEventSendProbeData() : [100] {t:.3f},0,0,0,{i},0,0,0\n"))
+    for i in range(450):
+        t = START_UTC + 30 + i / 5
+        itow = int(round((t - GPS_EPOCH_UNIX + GPS_LEAP_SECONDS) * 1000)) % GPS_WEEK_MS
+        records.append((t, f"[UBX-NAV-PVAT iTOW={itow} vehRoll=1 vehPitch=2 vehHeading={t - START_UTC:.1f}]\n"))
+    records.sort(key=lambda record: record[0])
+    path.write_text(''.join(line for _, line in records))
+
+
+def test_unwrap_itow_at_week_rollover():
+    itow = np.array([GPS_WEEK_MS - 400, GPS_WEEK_MS - 200, np.nan, 0, 200])
+    unwrapped = unwrap_itow(itow)
+    assert np.array_equal(unwrapped[[0, 1, 3, 4]], [GPS_WEEK_MS - 400, GPS_WEEK_MS - 200, GPS_WEEK_MS,
+                                                    GPS_WEEK_MS + 200])
+
+
+def test_streams_on_absolute_time(tmp_path):
+    log = tmp_path / 'drive.log'
+    write_log(log)
+    sinks = [OffsetSink(ImuSink()), OffsetSink(ProbeSink([4])), OffsetSink(PvatSink())]
+    scan_log(str(log), sinks)
+    positions = {name: pos for sink in sinks for name, pos in sink.positions().items()}
+    tables, clock = stream_tables(*(sink.sink for sink in sinks), positions=positions)
+
+    assert clock['reference'] == 'utc' and clock['unanchored'] == []
+    assert abs(clock['origin'] - START_UTC) < 0.1
+    probe_s, _ = tables['probe']
+    assert np.allclose(probe_s + clock['origin'] - START_UTC, np.arange(120))
+    # PVAT starts 30 s in and runs on through the week rollover
+    pvat_s, pvat = tables['pvat']
+    assert np.allclose(pvat_s + clock['origin'] - START_UTC, 30 + np.arange(450) / 5)
+    assert np.allclose(pvat_s + clock['origin'] - START_UTC, pvat['vehHeading'], atol=0.05)
+    # The IMU boot clock is anchored to its neighbours in the log
+    accel_s, _ = tables['accel']
+    # to within the spacing of the records around it
+    assert np.allclose(accel_s + clock['origin'] - START_UTC, np.arange(1200) / 10, atol=0.1)
+
+
+def test_offsets_correct_the_aligned_clock():
+    seconds, clock = common_clock({'probe': np.array([100.0, 101.0]), 'pvat': np.array([np.nan])},
+                                  offsets={'probe': 0.5})
+    assert clock['reference'] == 'utc'
+    assert np.allclose(seconds['probe'], [0.5, 1.5])
+
+
+def test_time_axis_on_the_stream_clock():
+    ts = np.arange(3)
+    x, label = time_axis(np.array([5e9, 5.01e9, 5.02e9]), 'imu', ts)
+    assert np.allclose(x, [5.0, 5.01, 5.02]) and label == "IMU clock (s)"
+    x, label = time_axis(np.array([GPS_WEEK_MS - 200, 0, 200]), 'pvat', ts)
+    assert np.allclose(x, [GPS_WEEK_MS / 1000 - 0.2, GPS_WEEK_MS / 1000, GPS_WEEK_MS / 1000 + 0.2])
+    # One missing timestamp and the sample index has to do
+    x, label = time_axis(np.array([1.7e9, np.nan, 1.7e9 + 2]), 'probe', ts)
+    assert x is ts and label == "Sample index"
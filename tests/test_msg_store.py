@@ -0,0 +1,41 @@
+from msgStore import MsgStore
+
+
+def test_import_and_indexes(tmp_path):
+    csv_path = tmp_path / 'db.csv'
+    csv_path.write_text("name,id,payload,period_en,period\n"
+                        "speed,0x510,0x01 0x02,True,20\n"
+                        "gear,0x511,0x03,false,\n"
+                        "speed,0x512,0x04,1,50\n"
+                        ",,,,\n")
+    store = MsgStore(str(tmp_path / 'msgs.db'))
+    assert store.import_csv(str(csv_path)) == 3
+    assert len(store) == 3
+    first, second, third = (store.key(i) for i in range(3))
+    assert store.get(first) == {'name': 'speed', 'id': '0x510', 'payload': '0x01 0x02', 'period_en': True,
+                                'period': 20}
+    assert store.get(second)['period'] == 100 and not store.get(second)['period_en']
+    assert store.find_by_name('speed') == [first, third]
+    assert store.find_by_can_id(0x511) == [second]
+    store.close()
+
+
+def test_keys_stable_after_remove_and_reopen(tmp_path):
+    path = str(tmp_path / 'msgs.db')
+    store = MsgStore(path)
+    keys = [store.add(f'm{i}', f'0x{0x100 + i:X}', '0x00') for i in range(4)]
+    store.remove(keys[1])
+    assert [store.key(i) for i in range(len(store))] == [keys[0], keys[2], keys[3]]
+    assert store.index(keys[2]) == 1
+    store.update(keys[2], name='renamed', id='0x7FF', period_en=True)
+    assert store.find_by_name('m2') == [] and store.find_by_name('renamed') == [keys[2]]
+    assert store.find_by_can_id(0x102) == [] and store.find_by_can_id(0x7FF) == [keys[2]]
+    assert store.find_by_can_id(0x101) == []
+    store.close()
+
+    reopened = MsgStore(path)
+    assert [reopened.key(i) for i in range(len(reopened))] == [keys[0], keys[2], keys[3]]
+    assert reopened.get(keys[2]) == {'name': 'renamed', 'id': '0x7FF', 'payload': '0x00', 'period_en': True,
+                                     'period': 100}
+    assert reopened.add('new', '0x200', '0x00') > keys[3]
+    reopened.close()
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from simScheduler import TxScheduler
+
+
+class Recorder:
+    """send_frames_h that records (perf_counter_ns, frame) per sent frame; the first call can stall."""
+
+    def __init__(self, stall_s: float = 0.0):
+        self.sent = []
+        self.stall_s = stall_s
+        self.lock = threading.Lock()
+
+    def __call__(self, frames):
+        now = time.perf_counter_ns()
+        with self.lock:
+            self.sent.extend((now, frame) for frame in frames)
+        if self.stall_s:
+            time.sleep(self.stall_s)
+            self.stall_s = 0.0
+
+    def times(self, frame):
+        with self.lock:
+            return [t for t, f in self.sent if f == frame]
+
+
+def test_period_without_drift():
+    recorder = Recorder()
+    scheduler = TxScheduler(recorder)
+    scheduler.set_msg('a', 'A', 10)
+    scheduler.start()
+    time.sleep(0.5)
+    scheduler.stop()
+    times = recorder.times('A')
+    assert 45 <= len(times) <= 52
+    # Deadlines are kept on the original grid: the n-th send is n periods after the first
+    last = len(times) - 1
+    assert abs((times[-1] - times[0]) - last * 10_000_000) < 3_000_000
+    stats = scheduler.get_stats()['a']
+    assert stats['sent'] == len(times) and stats['overruns'] == 0
+
+
+def test_overruns_after_a_stall():
+    recorder = Recorder(stall_s=0.055)
+    scheduler = TxScheduler(recorder)
+    scheduler.set_msg('a', 'A', 10)
+    scheduler.start()
+    time.sleep(0.2)
+    scheduler.stop()
+    stats = scheduler.get_stats()['a']
+    # Slots missed during the 55 ms stall are counted, not sent in a burst
+    assert 4 <= stats['overruns'] <= 6
+    # ... so sent and skipped slots still add up to the 20 periods that passed
+    assert 18 <= stats['sent'] + stats['overruns'] <= 22
+
+
+def test_rescheduled_and_removed_messages_drop_stale_deadlines():
+    recorder = Recorder()
+    scheduler = TxScheduler(recorder)
+    scheduler.set_msg('a', 'A', 50)
+    scheduler.set_msg('b', 'B', 10)
+    scheduler.start()
+    time.sleep(0.02)
+    # New period: the pending 50 ms deadline of 'a' must not fire alongside the new schedule
+    scheduler.set_msg('a', 'A', 30)
+    scheduler.remove_msg('b')
+    removed_at = time.perf_counter_ns()
+    time.sleep(0.3)
+    scheduler.stop()
+    times = recorder.times('A')
+    assert min(b - a for a, b in zip(times, times[1:])) > 20_000_000
+    assert not [t for t in recorder.times('B') if t > removed_at]
+    assert scheduler.keys() == ['a']
+
+
+def test_nothing_sent_after_stop():
+    recorder = Recorder()
+    scheduler = TxScheduler(recorder)
+    scheduler.set_msg('a', 'A', 1)
+    scheduler.start()
+    time.sleep(0.05)
+    scheduler.stop()
+    sent = len(recorder.sent)
+    time.sleep(0.02)
+    assert len(recorder.sent) == sent and not scheduler.is_running()
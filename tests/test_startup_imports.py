@@ -0,0 +1,44 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+from ivi_log_bench import (BENCHMARKS, IMPORT_SLACK_MS, IMPORT_TOLERANCE, STARTUP_FORBIDDEN, compare,
+                           measure_import)
+
+SCRIPTS = sorted(BENCHMARKS) + ['ivi_batch', 'ivi_events', 'ivi_merge']
+
+# Cold-start import times of the parser scripts, refreshed with
+#   python ivi_log_bench.py --import-only --output tests/import_baseline.json
+IMPORT_BASELINE = os.path.join(os.path.dirname(__file__), 'import_baseline.json')
+# Fresh interpreters per measurement; the fastest counts
+IMPORT_REPEAT = 3
+
+
+@pytest.mark.parametrize('module_name', SCRIPTS)
+def test_startup_does_not_import_forbidden_modules(module_name):
+    """Plotting libraries are imported lazily, so --stats-only/--export runs do not pay for them."""
+    assert measure_import(module_name, repeat=1)['forbidden_imports'] == []
+
+
+@pytest.mark.skipif(importlib.util.find_spec('matplotlib') is None, reason="matplotlib not installed")
+def test_forbidden_imports_are_detected():
+    assert measure_import('matplotlib.pyplot', repeat=1)['forbidden_imports'] == list(STARTUP_FORBIDDEN)
+
+
+@pytest.mark.parametrize('module_name', sorted(BENCHMARKS))
+def test_cold_start_within_baseline(module_name):
+    """python -X importtime of each parser stays within the ivi_log_bench --compare tolerance of the baseline."""
+    with open(IMPORT_BASELINE, encoding='utf-8') as f:
+        baseline = json.load(f)['results'][module_name]['import_ms']
+    import_ms = measure_import(module_name, repeat=IMPORT_REPEAT)['import_ms']
+    assert import_ms <= baseline * (1 + IMPORT_TOLERANCE) + IMPORT_SLACK_MS, \
+        f"importing {module_name} took {import_ms:.1f} ms, baseline {baseline:.1f} ms"
+
+
+def test_compare_flags_import_regressions(capsys):
+    previous = {'results': {'linear_ivi_sensor': {'import_ms': 100.0}}}
+    current = {'results': {'linear_ivi_sensor': {'import_ms': 100.0 * (1 + IMPORT_TOLERANCE) + IMPORT_SLACK_MS + 1}}}
+    assert compare(previous, current) == ['linear_ivi_sensor']
+    assert compare(previous, previous) == []